@@ -1,17 +1,52 @@
-import { Injectable } from '@nestjs/common';
+import { Injectable, OnModuleDestroy } from '@nestjs/common';
 import { InjectQueue } from '@nestjs/bull';
-import { Queue, JobOptions } from 'bull';
+import { ConfigService } from '@nestjs/config';
+import * as Bull from 'bull';
+import { Job, JobOptions, Queue } from 'bull';
 import { 
   DocumentProcessingJob, 
   DocumentAnalysisJob, 
   CertificateGenerationJob 
 } from '../dtos/document-job.dto';
+import { DOCUMENT_QUEUE_NAME, getRedisOptions, getShardQueueNames } from '../queue.config';
 
 @Injectable()
-export class DocumentQueueProducer {
+export class DocumentQueueProducer implements OnModuleDestroy {
+  // Sub-queues the worker moves jobs to by processing type; empty without QUEUE_SHARDS
+  private shardQueues: Queue[];
+
   constructor(
-    @InjectQueue('document-processing') private documentQueue: Queue,
-  ) {}
+    @InjectQueue(DOCUMENT_QUEUE_NAME) private documentQueue: Queue,
+    configService: ConfigService,
+  ) {
+    this.shardQueues = getShardQueueNames(configService).map(
+      name => new Bull(name, { redis: getRedisOptions(configService) }),
+    );
+  }
+
+  async onModuleDestroy() {
+    await Promise.all(this.shardQueues.map(queue => queue.close()));
+  }
+
+  /**
+   * The document queue followed by its shard queues
+   */
+  private get allQueues(): Queue[] {
+    return [this.documentQueue, ...this.shardQueues];
+  }
+
+  /**
+   * Find a job on the document queue or, once the worker has routed it, on its shard queue
+   */
+  private async findJob(jobId: string) {
+    for (const queue of this.allQueues) {
+      const job = await queue.getJob(jobId);
+      if (job) {
+        return job;
+      }
+    }
+    return null;
+  }
 
   /**
    * Add a document processing job to the queue
@@ -65,7 +100,7 @@ export class DocumentQueueProducer {
    * Get job progress and status
    */
   async getJobStatus(jobId: string) {
-    const job = await this.documentQueue.getJob(jobId);
+    const job = await this.findJob(jobId);
     if (!job) {
       return null;
     }
@@ -92,13 +127,17 @@ export class DocumentQueueProducer {
    * Get all active jobs for an organization
    */
   async getActiveJobsByOrganization(organizationId: string) {
-    // Get active jobs
-    const activeJobs = await this.documentQueue.getActive();
-    const waitingJobs = await this.documentQueue.getWaiting();
-    const delayedJobs = await this.documentQueue.getDelayed();
+    // Get active jobs from the document queue and its shards
+    const allJobs: Job[] = [];
+    for (const queue of this.allQueues) {
+      allJobs.push(
+        ...(await queue.getActive()),
+        ...(await queue.getWaiting()),
+        ...(await queue.getDelayed()),
+      );
+    }
     
     // Filter by organization ID
-    const allJobs = [...activeJobs, ...waitingJobs, ...delayedJobs];
     const orgJobs = allJobs.filter(
       job => job.data.organizationId === organizationId,
     );
@@ -115,16 +154,20 @@ export class DocumentQueueProducer {
    * Clean completed jobs for an organization
    */
   async cleanCompletedJobs(organizationId: string) {
-    // Get completed jobs
-    const completedJobs = await this.documentQueue.getCompleted();
-    
-    // Filter by organization ID and remove them
-    for (const job of completedJobs) {
-      if (job.data.organizationId === organizationId) {
-        await job.remove();
+    // Get completed jobs from the document queue and its shards
+    let removed = 0;
+    for (const queue of this.allQueues) {
+      const completedJobs = await queue.getCompleted();
+      
+      // Filter by organization ID and remove them
+      for (const job of completedJobs) {
+        if (job.data.organizationId === organizationId) {
+          await job.remove();
+          removed += 1;
+        }
       }
     }
     
-    return { removed: completedJobs.length };
+    return { removed };
   }
 }
\ No newline at end of file
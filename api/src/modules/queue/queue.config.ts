@@ -0,0 +1,40 @@
+import { ConfigService } from '@nestjs/config';
+import { QueueOptions } from 'bull';
+
+export const DOCUMENT_QUEUE_NAME = 'document-processing';
+
+// Shard that takes every processing type without a shard of its own, as in the worker
+const DEFAULT_SHARD = 'default';
+
+/**
+ * Redis connection shared by every Bull queue of the API
+ */
+export function getRedisOptions(configService: ConfigService): QueueOptions['redis'] {
+  return {
+    host: configService.get('REDIS_HOST', 'localhost'),
+    port: configService.get('REDIS_PORT', 6379),
+    password: configService.get('REDIS_PASSWORD', undefined),
+  };
+}
+
+/**
+ * Sub-queues the worker routes document jobs to when QUEUE_SHARDS is set
+ *
+ * Takes the same JSON as the worker's QUEUE_SHARDS; only the keys matter
+ * here. The worker moves each job's hash to `{queue}:{shard}` under the same
+ * job ID, so lookups by ID have to search these queues too.
+ */
+export function getShardQueueNames(configService: ConfigService): string[] {
+  const raw = configService.get<string>('QUEUE_SHARDS');
+  if (!raw) {
+    return [];
+  }
+  const shards = Object.keys(JSON.parse(raw));
+  if (shards.length === 0) {
+    return [];
+  }
+  if (!shards.includes(DEFAULT_SHARD)) {
+    shards.push(DEFAULT_SHARD);
+  }
+  return shards.map(shard => `${DOCUMENT_QUEUE_NAME}:${shard}`);
+}
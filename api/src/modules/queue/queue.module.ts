@@ -5,6 +5,7 @@ import { ConfigModule, ConfigService } from '@nestjs/config';
 import { DocumentProcessorService } from './processors/document-processor.service';
 import { DocumentQueueProducer } from './producers/document-queue.producer';
 import { QueueController } from './controllers/queue.controller';
+import { DOCUMENT_QUEUE_NAME, getRedisOptions } from './queue.config';
 
 @Module({
   imports: [
@@ -12,11 +13,7 @@ import { QueueController } from './controllers/queue.controller';
       imports: [ConfigModule],
       inject: [ConfigService],
       useFactory: (configService: ConfigService) => ({
-        redis: {
-          host: configService.get('REDIS_HOST', 'localhost'),
-          port: configService.get('REDIS_PORT', 6379),
-          password: configService.get('REDIS_PASSWORD', undefined),
-        },
+        redis: getRedisOptions(configService),
         defaultJobOptions: {
           attempts: 3,
           removeOnComplete: true,
@@ -25,7 +22,7 @@ import { QueueController } from './controllers/queue.controller';
       }),
     }),
     BullModule.registerQueue({
-      name: 'document-processing',
+      name: DOCUMENT_QUEUE_NAME,
     }),
   ],
   controllers: [QueueController],
@@ -0,0 +1,37 @@
+-- Per-organization usage of the document processing worker, one row per UTC day.
+-- The worker counts usage in Redis and overwrites each row with the running totals
+-- every USAGE_FLUSH_INTERVAL seconds (see worker/app/core/usage.py).
+
+CREATE TABLE IF NOT EXISTS organization_usage_daily (
+    organization_id UUID NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    usage_date DATE NOT NULL,
+    jobs BIGINT NOT NULL DEFAULT 0,
+    failed_jobs BIGINT NOT NULL DEFAULT 0,
+    pages BIGINT NOT NULL DEFAULT 0,
+    bytes BIGINT NOT NULL DEFAULT 0,
+    inference_calls BIGINT NOT NULL DEFAULT 0,
+    cache_hits BIGINT NOT NULL DEFAULT 0,
+    stage_seconds JSONB NOT NULL DEFAULT '{}'::JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (organization_id, usage_date)
+);
+
+CREATE INDEX IF NOT EXISTS organization_usage_daily_date_idx ON organization_usage_daily (usage_date);
+
+CREATE TRIGGER update_organization_usage_daily_updated_at
+BEFORE UPDATE ON organization_usage_daily
+FOR EACH ROW EXECUTE PROCEDURE update_updated_at_column();
+
+-- Only the worker writes usage, through a role that bypasses Row Level Security
+ALTER TABLE organization_usage_daily ENABLE ROW LEVEL SECURITY;
+
+-- Usage - Users can only see the usage of their organizations
+CREATE POLICY organization_usage_daily_select_policy ON organization_usage_daily
+    FOR SELECT
+    USING (
+        organization_id IN (
+            SELECT organization_id FROM organization_users 
+            WHERE user_id = auth.uid()
+        )
+    );
@@ -1,7 +1,10 @@
 from fastapi import APIRouter
 
-from app.api.api_v1.endpoints import health, documents
+from app.api.api_v1.endpoints import health, documents, scaling, cluster, usage
 
 api_router = APIRouter()
 api_router.include_router(health.router, prefix="/health", tags=["health"])
-api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
\ No newline at end of file
+api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
+api_router.include_router(scaling.router, prefix="/scaling", tags=["scaling"])
+api_router.include_router(cluster.router, prefix="/cluster", tags=["cluster"])
+api_router.include_router(usage.router, prefix="/usage", tags=["usage"])
\ No newline at end of file
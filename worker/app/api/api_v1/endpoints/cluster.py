@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Any
+from loguru import logger
+
+from app.core.cluster import get_cluster_view
+from app.core.redis_pool import get_redis_connection
+
+router = APIRouter()
+
+@router.get("")
+async def cluster_view() -> Dict[str, Any]:
+    """
+    Live workers and their combined capacity
+    
+    Aggregates the heartbeat every worker publishes: totals of capacity,
+    in-flight jobs and free slots, workers by version, per-queue capacity,
+    and each worker's heartbeat with the jobs it is running.
+    """
+    redis_client = await get_redis_connection()
+    try:
+        return await get_cluster_view(redis_client)
+    except Exception as e:
+        logger.error(f"Error reading cluster view: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Error reading cluster view: {str(e)}"
+        )
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Body, HTTPException, Depends, File, UploadFile, Form
-from typing import Dict, Any, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, Body, HTTPException, Depends, File, UploadFile, Form, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict, Any, List, Optional, Union
+from pydantic import BaseModel, Field, model_validator
+import asyncio
 import json
+import math
+from pathlib import Path
 from loguru import logger
 
-from app.services.document_processor import process_document
+from app.core.cluster import NoConsumersError
+from app.core.config import settings
+from app.core.redis_pool import get_redis_connection
+from app.services.bulk import process_bulk
+from app.services.progress import TERMINAL_STATUSES, get_status_key, progress_subscriber
+from app.services.submissions import get_job_status, get_latest_job_id, submit_job
+from app.utils.form_stream import FormStreamError, stream_form_file_to_s3
+from app.utils.s3 import list_s3_keys
 from app.models.document import DocumentProcessRequest
 
 router = APIRouter()
@@ -17,13 +28,70 @@ class ManualProcessRequest(BaseModel):
     contentType: Optional[str] = None
     processingType: Optional[str] = "certificate"
 
+class BulkDocument(BaseModel):
+    """One document of a bulk request; documentId defaults to the file path"""
+    filePath: str
+    documentId: Optional[str] = None
+    contentType: Optional[str] = None
+    processingType: Optional[str] = None
+
+class BulkProcessRequest(BaseModel):
+    """Request model for processing a manifest of S3 keys or every key under a prefix"""
+    organizationId: str
+    processingType: str = "certificate"
+    documents: List[Union[str, BulkDocument]] = []
+    prefix: Optional[str] = None
+    concurrency: int = Field(default_factory=lambda: settings.BULK_CONCURRENCY, ge=1)
+    
+    @model_validator(mode="after")
+    def check_source(self):
+        if bool(self.documents) == bool(self.prefix):
+            raise ValueError("Provide either documents or prefix")
+        if self.concurrency > settings.BULK_MAX_CONCURRENCY:
+            raise ValueError(f"concurrency must be at most {settings.BULK_MAX_CONCURRENCY}")
+        return self
+
+async def submit_or_process(job_data: Dict[str, Any], response: Response) -> Optional[Dict[str, Any]]:
+    """
+    Enqueue a job and return its submission, or process it inline in sync mode
+    
+    Returns:
+        The submission record with a 202 status, or None once a sync job has finished
+    
+    Raises:
+        HTTPException: 503 with Retry-After if no live worker would pick the job up
+    """
+    if settings.API_PROCESSING_MODE == "sync":
+        # Imported here so the API starts without loading the processing SDKs
+        from app.services.document_processor import process_document
+        await process_document(job_data)
+        return None
+    
+    try:
+        submission = await submit_job(job_data)
+    except NoConsumersError as e:
+        # New workers show up within a heartbeat interval
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(settings.HEARTBEAT_INTERVAL))}
+        )
+    response.status_code = 202
+    return {
+        "status": "queued",
+        **submission,
+        "statusUrl": f"{settings.API_V1_STR}/documents/jobs/{submission['jobId']}",
+    }
+
 @router.post("/process")
-async def manually_process_document(request: ManualProcessRequest) -> Dict[str, Any]:
+async def manually_process_document(request: ManualProcessRequest, response: Response) -> Dict[str, Any]:
     """
     Manually trigger document processing
     
-    This endpoint allows for manual triggering of document processing
-    without going through the queue for testing or reprocessing.
+    The job is enqueued and its ID returned right away; poll
+    /documents/jobs/{job_id} or stream /documents/{document_id}/events for
+    the outcome. With API_PROCESSING_MODE=sync the document is processed
+    inline instead, for testing or reprocessing.
     """
     try:
         # Create a job structure similar to what would come from the queue
@@ -36,13 +104,17 @@ async def manually_process_document(request: ManualProcessRequest) -> Dict[str,
             "processingType": request.processingType
         }
         
-        # Process the document
-        await process_document(job_data)
+        # Enqueue the document, or process it inline in sync mode
+        submission = await submit_or_process(job_data, response)
+        if submission is not None:
+            return submission
         
         return {
             "status": "success",
             "message": f"Document {request.documentId} processed successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing document: {str(e)}")
         raise HTTPException(
@@ -50,64 +122,199 @@ async def manually_process_document(request: ManualProcessRequest) -> Dict[str,
             detail=f"Error processing document: {str(e)}"
         )
         
-@router.post("/upload-and-process")
-async def upload_and_process_document(
-    document: UploadFile = File(...),
-    document_id: str = Form(...),
-    organization_id: str = Form(...),
-    processing_type: str = Form("certificate")
-) -> Dict[str, Any]:
+# Documents the form parsed by hand in upload_and_process_document
+UPLOAD_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["document_id", "organization_id", "document"],
+                    "properties": {
+                        "document_id": {"type": "string"},
+                        "organization_id": {"type": "string"},
+                        "processing_type": {"type": "string", "default": "certificate"},
+                        "document": {"type": "string", "format": "binary"},
+                    },
+                },
+            },
+        },
+    },
+}
+
+def build_upload_path(fields: Dict[str, str], filename: str) -> str:
+    """Return the S3 path of an uploaded document from the fields preceding the file"""
+    if not fields.get("document_id") or not fields.get("organization_id"):
+        raise FormStreamError("document_id and organization_id must be sent before the document")
+    return f"documents/{fields['organization_id']}/{fields['document_id']}/{Path(filename).name}"
+
+@router.post("/upload-and-process", openapi_extra=UPLOAD_FORM_SCHEMA)
+async def upload_and_process_document(request: Request, response: Response) -> Dict[str, Any]:
     """
     Upload a document and process it
     
     This endpoint provides a convenient way to test document processing
-    by uploading a file directly and processing it in one step.
+    by uploading a file directly and processing it in one step. Like
+    /process, it returns a job ID unless API_PROCESSING_MODE=sync.
+    
+    The file is streamed to S3/MinIO as it arrives, so memory use is
+    bounded by S3_UPLOAD_PART_SIZE whatever the file size. Send the
+    document_id and organization_id fields before the document field.
     """
     try:
-        from app.utils.s3 import get_s3_client
-        import tempfile
-        from pathlib import Path
-        
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # Write the uploaded file to the temporary file
-            content = await document.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Upload to S3/MinIO
-        s3_client = get_s3_client()
-        s3_path = f"documents/{organization_id}/{document_id}/{document.filename}"
-        s3_client.upload_file(
-            temp_file_path,
-            Bucket=document.S3_BUCKET_NAME,
-            Key=s3_path
+        fields, uploaded = await stream_form_file_to_s3(request, "document", build_upload_path)
+    except FormStreamError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error uploading document: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error uploading document: {str(e)}"
         )
-        
-        # Clean up temporary file
-        Path(temp_file_path).unlink()
-        
-        # Create a job structure
+    
+    document_id = fields["document_id"]
+    s3_path = uploaded["s3Path"]
+    try:
+        # Create a job structure; the content hash replaces the ETag lookup for duplicate suppression
         job_data = {
             "type": "process",
             "documentId": document_id,
-            "organizationId": organization_id,
+            "organizationId": fields["organization_id"],
             "filePath": s3_path,
-            "contentType": document.content_type,
-            "processingType": processing_type
+            "contentType": uploaded["contentType"],
+            "processingType": fields.get("processing_type") or "certificate",
+            "contentHash": uploaded["sha256"]
         }
         
-        # Process the document
-        await process_document(job_data)
+        # Enqueue the document, or process it inline in sync mode
+        submission = await submit_or_process(job_data, response)
+        if submission is not None:
+            return {**submission, "s3Path": s3_path}
         
         return {
             "status": "success",
             "message": f"Document {document_id} uploaded and processed successfully",
             "s3Path": s3_path
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading and processing document: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error uploading and processing document: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/bulk")
+async def bulk_process_documents(request: BulkProcessRequest) -> StreamingResponse:
+    """
+    Process many documents and stream their results as NDJSON
+    
+    Takes a manifest of S3 keys (plain strings or objects with filePath,
+    documentId, contentType and processingType) or a prefix to list. Every
+    document goes through the normal pipeline inline, at most concurrency
+    at a time, and one JSON line is written as each finishes. The last line
+    is {"summary": {...}} with the completed and failed counts.
+    """
+    def to_job(document: BulkDocument) -> Dict[str, Any]:
+        # Create a job structure similar to what would come from the queue
+        return {
+            "type": "process",
+            "documentId": document.documentId or document.filePath,
+            "organizationId": request.organizationId,
+            "filePath": document.filePath,
+            "contentType": document.contentType or "application/pdf",
+            "processingType": document.processingType or request.processingType
+        }
+    
+    async def jobs() -> AsyncIterator[Dict[str, Any]]:
+        if request.prefix:
+            async for key in list_s3_keys(request.prefix):
+                yield to_job(BulkDocument(filePath=key))
+            return
+        for document in request.documents:
+            yield to_job(BulkDocument(filePath=document) if isinstance(document, str) else document)
+    
+    async def ndjson() -> AsyncIterator[str]:
+        async for record in process_bulk(jobs(), request.concurrency):
+            yield json.dumps(record) + "\n"
+    
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Status of a job submitted through this API
+    
+    Returns the submission with the latest status, stage and progress of
+    the job ("queued" until a worker picks it up).
+    """
+    status = await get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return status
+
+@router.get("/{document_id}/events")
+async def stream_document_status(document_id: str, request: Request,
+                                 job_id: Optional[str] = None) -> StreamingResponse:
+    """
+    Stream processing status for a document as Server-Sent Events
+    
+    The stream follows one job: job_id, or the latest job submitted through
+    the API for the document. Its current status is sent first, followed by
+    every progress event of the document until that job completes or fails.
+    Without a known job, any completed or failed event ends the stream.
+    Comment lines are sent as keep-alives so proxies don't close idle
+    streams, and the job's status is checked again with each so a job that
+    failed without publishing an event still ends it. Streams share one
+    pub/sub connection per process rather than holding a pooled one each.
+    """
+    def ends_stream(event: Dict[str, Any], watched_job_id: Optional[str]) -> bool:
+        if event.get("status") not in TERMINAL_STATUSES:
+            return False
+        return watched_job_id is None or str(event.get("jobId")) == watched_job_id
+    
+    async def event_stream() -> AsyncIterator[str]:
+        redis_client = await get_redis_connection()
+        # Subscribe before reading the latest status so no event is missed in between
+        events = await progress_subscriber.subscribe(document_id)
+        try:
+            watched_job_id = job_id or await get_latest_job_id(document_id)
+            status = await get_job_status(watched_job_id) if watched_job_id else None
+            if status is None:
+                # Not submitted through the API, or expired: follow whichever job reports next
+                watched_job_id = None
+                latest = await redis_client.get(get_status_key(document_id))
+                status = json.loads(latest) if latest else None
+            if status is not None:
+                yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+                if ends_stream(status, watched_job_id):
+                    return
+            
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(events.get(), settings.SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    status = await get_job_status(watched_job_id) if watched_job_id else None
+                    if status is not None and ends_stream(status, watched_job_id):
+                        yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                yield f"event: progress\ndata: {data}\n\n"
+                if ends_stream(json.loads(data), watched_job_id):
+                    return
+        finally:
+            await progress_subscriber.unsubscribe(document_id, events)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
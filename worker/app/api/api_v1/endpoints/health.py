@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends
 from typing import Dict, Any
-import redis.asyncio as redis
 
 from app.core.config import settings
-from app.core.queue import get_redis_connection
+from app.core.redis_pool import get_pool_stats
+from app.services.health import get_health_snapshot
 
 router = APIRouter()
 
@@ -18,26 +18,18 @@ async def health_check() -> Dict[str, Any]:
 
 @router.get("/detailed")
 async def detailed_health_check() -> Dict[str, Any]:
-    """Detailed health check including Redis connectivity"""
-    health_status = {
-        "status": "healthy",
+    """
+    Detailed health check with the status and latency of each component
+    
+    Redis, S3 and LandingAI are probed in the background every
+    HEALTH_PROBE_INTERVAL seconds, so this answers from the cached results
+    without any I/O and frequent polling adds no load.
+    """
+    snapshot = get_health_snapshot()
+    return {
+        "status": snapshot["status"],
         "service": settings.PROJECT_NAME,
         "version": settings.PROJECT_VERSION,
-        "components": {
-            "api": "healthy",
-            "redis": "unknown",
-            "landing_ai": "configured" if settings.LANDINGAI_API_KEY else "not_configured",
-            "s3": "configured"
-        }
+        "components": {"api": {"status": "healthy"}, **snapshot["components"]},
+        "redisPool": get_pool_stats()
     }
-    
-    # Check Redis connectivity
-    try:
-        redis_client = await get_redis_connection()
-        await redis_client.ping()
-        health_status["components"]["redis"] = "healthy"
-    except Exception as e:
-        health_status["components"]["redis"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
-    
-    return health_status
\ No newline at end of file
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.core.autoscaling import get_scaling_signal
+from app.core.redis_pool import get_redis_connection
+
+router = APIRouter()
+
+@router.get("/signal")
+async def scaling_signal(
+    queue: Optional[str] = Query(None, description="Queue to report on"),
+    target_latency: Optional[float] = Query(None, gt=0, description="Target job latency in seconds"),
+    current_replicas: Optional[int] = Query(None, ge=0, description="Replicas currently running"),
+) -> Dict[str, Any]:
+    """
+    Autoscaling signal for the container orchestrator
+    
+    Reports backlog, arrival rate, service rate, estimated drain time and
+    the recommended replica count for the target latency.
+    """
+    redis_client = await get_redis_connection()
+    try:
+        return await get_scaling_signal(
+            redis_client,
+            queue or settings.DOCUMENT_QUEUE_NAME,
+            target_latency or settings.SCALING_TARGET_LATENCY,
+            current_replicas,
+        )
+    except Exception as e:
+        logger.error(f"Error computing scaling signal: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Error computing scaling signal: {str(e)}"
+        )
@@ -0,0 +1,43 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.core.redis_pool import get_redis_connection
+from app.core.usage import get_usage
+
+router = APIRouter()
+
+@router.get("/{organization_id}")
+async def organization_usage(
+    organization_id: str,
+    start: Optional[date] = Query(None, description="First day, UTC; defaults to 30 days before end"),
+    end: Optional[date] = Query(None, description="Last day, UTC; defaults to today"),
+) -> Dict[str, Any]:
+    """
+    Usage of an organization per day
+    
+    Jobs, failed jobs, pages, bytes downloaded, LandingAI inference calls,
+    duplicate jobs served from an earlier result, and seconds spent in each
+    processing stage, for every day with usage plus totals for the range.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=422, detail="start must not be after end")
+    if (end - start).days >= settings.USAGE_RETENTION_DAYS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"The range must be shorter than {settings.USAGE_RETENTION_DAYS} days"
+        )
+    
+    redis_client = await get_redis_connection()
+    try:
+        return await get_usage(redis_client, organization_id, start, end)
+    except Exception as e:
+        logger.error(f"Error reading usage: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Error reading usage: {str(e)}"
+        )
@@ -0,0 +1,231 @@
+"""
+Worker command line tools
+
+Usage:
+    python -m app.cli dlq list --error-class ConnectError --since 2024-05-01T10:00
+    python -m app.cli dlq stats
+    python -m app.cli dlq replay --stage inference --since 2024-05-01T10:00 --until 2024-05-01T11:30 --rate 2
+    python -m app.cli shadow stats --processing-type certificate
+    python -m app.cli recordings extract --processing-type certificate > extracted.jsonl
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.dead_letter import list_dead_letters, replay_dead_letter
+from app.core.rate_limit import RateLimiter
+from app.core.redis_pool import close_redis_pool, get_redis_connection
+from app.core.sharding import get_shards
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Parse an ISO 8601 timestamp (UTC unless an offset is given) into epoch seconds"""
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def format_time(milliseconds: Optional[int]) -> str:
+    """Format an epoch time in milliseconds for display"""
+    if not milliseconds:
+        return "-"
+    return datetime.fromtimestamp(milliseconds / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def get_queue_names(args: argparse.Namespace) -> List[str]:
+    """
+    Return the queues whose dead letters to read
+
+    Without --queue that is the document queue and, with QUEUE_SHARDS, each
+    of its shard queues. Failed jobs are dead-lettered on the shard queue
+    they ran on, and the parent keeps the ones from before sharding.
+    """
+    if args.queue:
+        return [args.queue]
+    queue_names = [settings.DOCUMENT_QUEUE_NAME]
+    for shard in get_shards(settings.DOCUMENT_QUEUE_NAME):
+        if shard.queue_name not in queue_names:
+            queue_names.append(shard.queue_name)
+    return queue_names
+
+async def find_dead_letters(args: argparse.Namespace):
+    """Fetch the dead letters matching the command line filters, newest first across queues"""
+    redis_client = await get_redis_connection()
+    dead_letters = []
+    for queue_name in get_queue_names(args):
+        dead_letters.extend(await list_dead_letters(
+            redis_client,
+            queue_name,
+            error_class=args.error_class,
+            stage=args.stage,
+            organization_id=args.organization,
+            processing_type=args.processing_type,
+            since=parse_time(args.since),
+            until=parse_time(args.until),
+            limit=args.limit,
+        ))
+    dead_letters.sort(key=lambda dead_letter: dead_letter[1].get("failedAt") or 0, reverse=True)
+    return dead_letters[:args.limit] if args.limit else dead_letters
+
+async def dlq_list(args: argparse.Namespace):
+    """Print matching dead letters"""
+    for _, entry in await find_dead_letters(args):
+        if args.json:
+            print(json.dumps(entry))
+            continue
+        data = entry.get("data") or {}
+        print(
+            f"{format_time(entry.get('failedAt'))}  job={entry.get('jobId')}  "
+            f"document={data.get('documentId')}  org={data.get('organizationId')}  "
+            f"stage={entry.get('stage')}  attempts={entry.get('attempts')}  "
+            f"{entry.get('errorClass')}: {entry.get('error')}"
+        )
+
+async def dlq_stats(args: argparse.Namespace):
+    """Print dead letter counts by error class and stage"""
+    counts = Counter(
+        (entry.get("errorClass"), entry.get("stage"))
+        for _, entry in await find_dead_letters(args)
+    )
+    print(f"{'count':>7}  {'error class':<32}stage")
+    for (error_class, stage), count in counts.most_common():
+        print(f"{count:>7}  {str(error_class):<32}{stage}")
+
+async def dlq_replay(args: argparse.Namespace):
+    """Replay matching dead letters through the shared rate limiter"""
+    dead_letters = await find_dead_letters(args)
+    if args.dry_run:
+        print(f"Would replay {len(dead_letters)} job(s)")
+        return
+    
+    redis_client = await get_redis_connection()
+    # Every replaying process shares the bucket, so parallel runs can't exceed the rate together
+    limiter = RateLimiter(redis_client, f"dlq-replay:{args.queue or settings.DOCUMENT_QUEUE_NAME}", args.rate)
+    replayed = 0
+    for raw, entry in dead_letters:
+        await limiter.acquire()
+        if await replay_dead_letter(redis_client, raw, entry):
+            replayed += 1
+            print(f"Replayed job {entry.get('jobId')} ({replayed}/{len(dead_letters)})")
+    print(f"Replayed {replayed} of {len(dead_letters)} job(s)")
+
+async def shadow_list(args: argparse.Namespace):
+    """Print stored shadow comparisons"""
+    # Imported here so the DLQ commands don't load the LandingAI SDK
+    from app.services.shadow import list_shadow_results
+    redis_client = await get_redis_connection()
+    for entry in await list_shadow_results(redis_client, args.processing_type, args.limit):
+        if args.json:
+            print(json.dumps(entry))
+            continue
+        print(
+            f"{format_time(entry.get('createdAt'))}  document={entry.get('documentId')}  "
+            f"{entry.get('primaryModel')} -> {entry.get('shadowModel')}  "
+            f"agreement={entry.get('agreement', 0):.0%}  differs={','.join(entry.get('mismatches') or {}) or '-'}"
+        )
+
+async def shadow_stats(args: argparse.Namespace):
+    """Print how often each field differs between the primary and shadow models"""
+    from app.services.shadow import list_shadow_results
+    redis_client = await get_redis_connection()
+    entries = await list_shadow_results(redis_client, args.processing_type, args.limit)
+    if not entries:
+        print("No shadow comparisons")
+        return
+    
+    mismatches = Counter(field for entry in entries for field in entry.get("mismatches") or {})
+    agreement = sum(entry.get("agreement", 0) for entry in entries) / len(entries)
+    print(f"{len(entries)} comparison(s), mean agreement {agreement:.1%}")
+    print(f"{'differs':>8}  field")
+    for field, count in mismatches.most_common():
+        print(f"{count / len(entries):>8.1%}  {field}")
+
+async def recordings_extract(args: argparse.Namespace):
+    """Run the extractor over every recorded LandingAI response, one JSON line per recording"""
+    from app.services.document_processor import extract_data_from_prediction
+    from app.services.inference_replay import list_recordings
+    for recording in list_recordings(args.model):
+        print(json.dumps({
+            "inputHash": recording["inputHash"],
+            "modelId": recording["modelId"],
+            "extractedData": extract_data_from_prediction(recording["result"], args.processing_type),
+        }, sort_keys=True))
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    dlq = commands.add_parser("dlq", help="Inspect and replay dead-lettered jobs")
+    dlq_commands = dlq.add_subparsers(dest="dlq_command", required=True)
+    
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--queue", help="Only this queue or shard queue (default: the document queue and all its shards)")
+    filters.add_argument("--error-class", help="Only jobs that failed with this exception class")
+    filters.add_argument("--stage", help="Only jobs that failed in this stage (download, inference, upload, callback)")
+    filters.add_argument("--organization", help="Only jobs for this organization ID")
+    filters.add_argument("--processing-type", help="Only jobs of this processing type")
+    filters.add_argument("--since", help="Only jobs that failed at or after this ISO 8601 time")
+    filters.add_argument("--until", help="Only jobs that failed before this ISO 8601 time")
+    filters.add_argument("--limit", type=int, help="Maximum number of jobs")
+    
+    list_parser = dlq_commands.add_parser("list", parents=[filters], help="List dead-lettered jobs")
+    list_parser.add_argument("--json", action="store_true", help="Print full entries as JSON lines")
+    list_parser.set_defaults(handler=dlq_list)
+    
+    stats_parser = dlq_commands.add_parser("stats", parents=[filters], help="Count dead letters by error class and stage")
+    stats_parser.set_defaults(handler=dlq_stats)
+    
+    replay_parser = dlq_commands.add_parser("replay", parents=[filters], help="Re-enqueue dead-lettered jobs")
+    replay_parser.add_argument("--rate", type=float, default=settings.DLQ_REPLAY_RATE,
+                               help="Maximum jobs replayed per second")
+    replay_parser.add_argument("--dry-run", action="store_true", help="Only report how many jobs would be replayed")
+    replay_parser.set_defaults(handler=dlq_replay)
+    
+    shadow = commands.add_parser("shadow", help="Inspect shadow inference comparisons")
+    shadow_commands = shadow.add_subparsers(dest="shadow_command", required=True)
+    
+    shadow_filters = argparse.ArgumentParser(add_help=False)
+    shadow_filters.add_argument("--processing-type", default="certificate", help="Processing type to inspect")
+    shadow_filters.add_argument("--limit", type=int, help="Only the most recent comparisons")
+    
+    shadow_list_parser = shadow_commands.add_parser("list", parents=[shadow_filters], help="List shadow comparisons")
+    shadow_list_parser.add_argument("--json", action="store_true", help="Print full entries as JSON lines")
+    shadow_list_parser.set_defaults(handler=shadow_list)
+    
+    shadow_stats_parser = shadow_commands.add_parser("stats", parents=[shadow_filters],
+                                                     help="Show how often each field differs")
+    shadow_stats_parser.set_defaults(handler=shadow_stats)
+    
+    recordings = commands.add_parser("recordings", help="Use recorded LandingAI responses")
+    recordings_commands = recordings.add_subparsers(dest="recordings_command", required=True)
+    
+    extract_parser = recordings_commands.add_parser("extract", help="Print the extracted data of every recording")
+    extract_parser.add_argument("--processing-type", default="certificate", help="Extractor to run")
+    extract_parser.add_argument("--model", help="Only recordings of this model ID")
+    extract_parser.set_defaults(handler=recordings_extract)
+    
+    return parser
+
+async def run(args: argparse.Namespace):
+    try:
+        await args.handler(args)
+    finally:
+        await close_redis_pool()
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    asyncio.run(run(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
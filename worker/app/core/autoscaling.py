@@ -0,0 +1,137 @@
+import math
+import time
+from typing import Any, Dict, Optional
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.sharding import get_queue_concurrency
+
+# Updates the EWMA of job service time in a single round trip
+_RECORD_DURATION_SCRIPT = """
+local prev = redis.call('HGET', KEYS[1], 'service_time_ewma')
+local sample = tonumber(ARGV[1])
+local alpha = tonumber(ARGV[2])
+local value = sample
+if prev then
+    value = alpha * sample + (1 - alpha) * tonumber(prev)
+end
+redis.call('HSET', KEYS[1], 'service_time_ewma', tostring(value))
+redis.call('HINCRBY', KEYS[1], 'completed', 1)
+return tostring(value)
+"""
+
+def get_scaling_key(queue_name: str) -> str:
+    """Return the Redis hash holding the scaling statistics for a queue"""
+    return f"worker:scaling:{queue_name}"
+
+async def record_job_duration(redis_client: redis.Redis, queue_name: str, duration: float):
+    """Fold a finished job's duration into the queue's service time EWMA"""
+    await redis_client.eval(
+        _RECORD_DURATION_SCRIPT,
+        1,
+        get_scaling_key(queue_name),
+        duration,
+        settings.SCALING_EWMA_ALPHA,
+    )
+
+async def get_scaling_signal(
+    redis_client: redis.Redis,
+    queue_name: str,
+    target_latency: float,
+    current_replicas: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Compute the autoscaling signal for a queue
+
+    The arrival rate is derived from Bull's job ID counter (or the stream's
+    entries-added counter), which is incremented on every enqueue, so no
+    keys need to be scanned.
+
+    Args:
+        redis_client: Redis connection
+        queue_name: Name of the queue, or of a shard's sub-queue
+        target_latency: Desired time in seconds for a new job to be picked up and finished
+        current_replicas: Number of worker replicas currently running, if known
+
+    Returns:
+        Dict with backlog, rates, drain time and the recommended replica count
+    """
+    scaling_key = get_scaling_key(queue_name)
+
+    if settings.QUEUE_BACKEND == "streams":
+        from app.core.streams import get_stream_backlog
+        # The stream's entries-added counter plays the role of Bull's job ID counter
+        waiting, active, job_counter = await get_stream_backlog(redis_client, queue_name)
+        delayed = 0
+        stats = await redis_client.hgetall(scaling_key)
+    else:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.llen(f"bull:{queue_name}:wait")
+            pipe.llen(f"bull:{queue_name}:active")
+            pipe.zcard(f"bull:{queue_name}:delayed")
+            pipe.get(f"bull:{queue_name}:id")
+            pipe.hgetall(scaling_key)
+            waiting, active, delayed, last_job_id, stats = await pipe.execute()
+        job_counter = int(last_job_id or 0)
+
+    now = time.time()
+    arrival_rate = float(stats.get("arrival_rate_ewma", 0.0))
+
+    # Update the arrival rate EWMA once the sampling window has elapsed
+    previous_counter = stats.get("arrival_last_id")
+    previous_sample_at = stats.get("arrival_last_at")
+    elapsed = now - float(previous_sample_at) if previous_sample_at else None
+    if elapsed is None or elapsed >= settings.SCALING_MIN_SAMPLE_INTERVAL:
+        if elapsed is not None and previous_counter is not None:
+            sample = max(0, job_counter - int(previous_counter)) / elapsed
+            alpha = settings.SCALING_EWMA_ALPHA
+            arrival_rate = alpha * sample + (1 - alpha) * arrival_rate
+        await redis_client.hset(scaling_key, mapping={
+            "arrival_last_id": job_counter,
+            "arrival_last_at": now,
+            "arrival_rate_ewma": arrival_rate,
+        })
+
+    service_time = float(stats["service_time_ewma"]) if "service_time_ewma" in stats else None
+    # Each replica runs the queue's (or shard's) concurrency worth of consumers
+    replica_service_rate = get_queue_concurrency(queue_name) / service_time if service_time else None
+    backlog = waiting + active
+
+    drain_time = None
+    if replica_service_rate and current_replicas:
+        net_rate = current_replicas * replica_service_rate - arrival_rate
+        drain_time = backlog / net_rate if net_rate > 0 else None
+
+    # Serve the arrival rate at the target utilization and clear the backlog within the target latency
+    recommended_replicas = settings.SCALING_MIN_REPLICAS
+    if replica_service_rate:
+        required_rate = (
+            arrival_rate / settings.SCALING_TARGET_UTILIZATION
+            + backlog / max(target_latency, 1e-3)
+        )
+        recommended_replicas = math.ceil(required_rate / replica_service_rate)
+    elif backlog:
+        # No service time observed yet, so make sure at least one replica runs
+        recommended_replicas = max(recommended_replicas, 1)
+    recommended_replicas = min(
+        max(recommended_replicas, settings.SCALING_MIN_REPLICAS),
+        settings.SCALING_MAX_REPLICAS,
+    )
+
+    return {
+        "queue": queue_name,
+        "backlog": {
+            "wait": waiting,
+            "active": active,
+            "delayed": delayed,
+            "total": backlog,
+        },
+        "arrivalRate": arrival_rate,
+        "serviceTime": service_time,
+        "replicaServiceRate": replica_service_rate,
+        "currentReplicas": current_replicas,
+        "estimatedDrainTime": drain_time,
+        "targetLatency": target_latency,
+        "recommendedReplicas": recommended_replicas,
+        "completedJobs": int(stats.get("completed", 0)),
+    }
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Any, Dict, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.consumer import get_consumer_snapshot, is_stopping, wait_for_stop
+from app.core.metrics import STALLED_JOBS
+from app.core.queue import release_job
+from app.core.redis_pool import get_redis_connection
+from app.core.sharding import get_local_shards
+
+# Set of every worker ID that has sent a heartbeat; IDs whose key expired are pruned on read
+NODES_KEY = "worker:nodes"
+
+_started_at = time.time()
+_heartbeat_task: Optional[asyncio.Task] = None
+
+# Cluster view reused by API submissions for CLUSTER_VIEW_CACHE_TTL seconds
+_cached_view: Optional[Dict[str, Any]] = None
+_cached_view_expires = 0.0
+
+class NoConsumersError(Exception):
+    """No live worker consumes the queue a job would be enqueued on"""
+
+    def __init__(self, queue_name: str):
+        super().__init__(f"No live worker is consuming queue {queue_name}")
+        self.queue_name = queue_name
+
+def get_heartbeat_key(worker_id: str) -> str:
+    """Return the key holding a worker's latest heartbeat"""
+    return f"worker:node:{worker_id}"
+
+def build_heartbeat() -> Dict[str, Any]:
+    """Describe this worker: identity, version, capacity and the jobs it is running"""
+    return {
+        "workerId": settings.WORKER_ID,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "version": settings.WORKER_VERSION,
+        "startedAt": _started_at,
+        "updatedAt": time.time(),
+        "stopping": is_stopping(),
+        **get_consumer_snapshot(),
+    }
+
+async def publish_heartbeat(redis_client: redis.Redis):
+    """Write this worker's heartbeat, which expires after HEARTBEAT_TTL seconds"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(get_heartbeat_key(settings.WORKER_ID), json.dumps(build_heartbeat()), ex=settings.HEARTBEAT_TTL)
+        pipe.sadd(NODES_KEY, settings.WORKER_ID)
+        await pipe.execute()
+
+async def _run_heartbeat(redis_client: redis.Redis):
+    while True:
+        await asyncio.sleep(settings.HEARTBEAT_INTERVAL)
+        try:
+            await publish_heartbeat(redis_client)
+        except Exception as e:
+            logger.error(f"Error publishing heartbeat: {str(e)}")
+
+async def start_heartbeat():
+    """
+    Publish a heartbeat now and every HEARTBEAT_INTERVAL seconds after
+
+    Unlike the queue listeners the heartbeat keeps going through a drain, so
+    the jobs this worker is still finishing are not taken for stalled ones.
+    """
+    global _heartbeat_task
+    redis_client = await get_redis_connection()
+    try:
+        await publish_heartbeat(redis_client)
+    except Exception as e:
+        # The loop keeps trying; until it succeeds this worker is absent from the cluster view
+        logger.error(f"Error publishing heartbeat: {str(e)}")
+    _heartbeat_task = asyncio.create_task(_run_heartbeat(redis_client))
+    logger.info(f"Publishing heartbeats as worker {settings.WORKER_ID} (version {settings.WORKER_VERSION})")
+
+async def stop_heartbeat():
+    """Stop the heartbeat and remove this worker from the cluster; call once in-flight jobs have drained"""
+    global _heartbeat_task
+    if _heartbeat_task is None:
+        return
+    _heartbeat_task.cancel()
+    await asyncio.gather(_heartbeat_task, return_exceptions=True)
+    _heartbeat_task = None
+    try:
+        redis_client = await get_redis_connection()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(get_heartbeat_key(settings.WORKER_ID))
+            pipe.srem(NODES_KEY, settings.WORKER_ID)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to remove heartbeat: {str(e)}")
+
+async def get_cluster_view(redis_client: redis.Redis) -> Dict[str, Any]:
+    """
+    Aggregate the heartbeats of every live worker
+
+    Returns:
+        Dict with totals (workers, capacity, inFlight, free), worker counts by
+        version, per-queue concurrency of workers that are not draining, and
+        each worker's heartbeat under "nodes"
+    """
+    worker_ids = sorted(await redis_client.smembers(NODES_KEY))
+    heartbeats = await redis_client.mget([get_heartbeat_key(w) for w in worker_ids]) if worker_ids else []
+
+    nodes = []
+    expired = []
+    for worker_id, heartbeat in zip(worker_ids, heartbeats):
+        if heartbeat is None:
+            expired.append(worker_id)
+        else:
+            nodes.append(json.loads(heartbeat))
+    if expired:
+        await redis_client.srem(NODES_KEY, *expired)
+
+    versions: Dict[str, int] = {}
+    queues: Dict[str, Dict[str, int]] = {}
+    for node in nodes:
+        versions[node["version"]] = versions.get(node["version"], 0) + 1
+        if node["stopping"]:
+            # A draining worker takes no new jobs
+            continue
+        for queue_name, pool in node["queues"].items():
+            queue = queues.setdefault(queue_name, {"workers": 0, "concurrency": 0, "active": 0})
+            queue["workers"] += 1
+            queue["concurrency"] += pool["concurrency"]
+            queue["active"] += pool["active"]
+    for queue in queues.values():
+        queue["free"] = max(0, queue["concurrency"] - queue["active"])
+
+    capacity = sum(node["capacity"] for node in nodes if not node["stopping"])
+    in_flight = sum(node["inFlight"] for node in nodes)
+    return {
+        "workers": len(nodes),
+        "capacity": capacity,
+        "inFlight": in_flight,
+        "free": sum(queue["free"] for queue in queues.values()),
+        "versions": versions,
+        "queues": queues,
+        "nodes": nodes,
+        "checkedAt": time.time(),
+    }
+
+async def check_dispatch_capacity(redis_client: redis.Redis, queue_name: str) -> Dict[str, int]:
+    """
+    Check that a live worker consumes a queue before a job is enqueued on it
+
+    The cluster view is cached for CLUSTER_VIEW_CACHE_TTL seconds so busy
+    submitters cost one lookup per interval rather than one per job.
+
+    Returns:
+        {"workers", "concurrency", "active", "free"} of the queue across the cluster
+
+    Raises:
+        NoConsumersError: If no worker that is not draining consumes the queue
+    """
+    global _cached_view, _cached_view_expires
+    if _cached_view is None or time.monotonic() >= _cached_view_expires:
+        _cached_view = await get_cluster_view(redis_client)
+        _cached_view_expires = time.monotonic() + settings.CLUSTER_VIEW_CACHE_TTL
+
+    queue = _cached_view["queues"].get(queue_name)
+    if not queue or not queue["concurrency"]:
+        raise NoConsumersError(queue_name)
+    return queue
+
+async def release_stalled_jobs(redis_client: redis.Redis, queue_name: str, live_workers: set) -> int:
+    """
+    Release the active jobs of a Bull queue whose worker has no live heartbeat
+
+    Jobs without a processedBy stamp were taken by a worker that predates
+    heartbeats, or by another Bull consumer, and are left alone.
+
+    Returns:
+        How many jobs were moved back to the wait list
+    """
+    job_ids = await redis_client.lrange(f"bull:{queue_name}:active", 0, -1)
+    if not job_ids:
+        return 0
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for job_id in job_ids:
+            pipe.hget(f"bull:{queue_name}:{job_id}", "processedBy")
+        owners = await pipe.execute()
+
+    released = 0
+    for job_id, owner in zip(job_ids, owners):
+        if owner is None or owner in live_workers:
+            continue
+        # The checkpoint already in the job hash is kept, so the next worker resumes from it
+        if await release_job(redis_client, queue_name, job_id):
+            released += 1
+            STALLED_JOBS.labels(queue=queue_name).inc()
+            logger.warning(f"Released stalled job {job_id} of {queue_name} from worker {owner}")
+    return released
+
+async def run_stalled_job_checker():
+    """
+    Release jobs left in the active lists by dead workers every STALLED_CHECK_INTERVAL seconds
+
+    Bull backend only; the streams backend reclaims idle entries with XAUTOCLAIM.
+    Every worker runs a checker, and the atomic release makes sure each job is
+    moved back once.
+    """
+    redis_client = await get_redis_connection()
+    while not is_stopping():
+        try:
+            live_workers = {node["workerId"] for node in (await get_cluster_view(redis_client))["nodes"]}
+            for shard in get_local_shards(settings.DOCUMENT_QUEUE_NAME):
+                await release_stalled_jobs(redis_client, shard.queue_name, live_workers)
+        except Exception as e:
+            logger.error(f"Error checking for stalled jobs: {str(e)}")
+        await wait_for_stop(settings.STALLED_CHECK_INTERVAL)
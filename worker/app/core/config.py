@@ -1,6 +1,7 @@
 import os
-from typing import List, Optional
-from pydantic import BaseModel
+import socket
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,6 +11,18 @@ class Settings(BaseSettings):
     PROJECT_DESCRIPTION: str = "Worker service for processing documents with LandingAI"
     PROJECT_VERSION: str = "0.1.0"
     
+    # "async" enqueues API submissions and returns a job ID, "sync" processes them inline
+    API_PROCESSING_MODE: str = os.getenv("API_PROCESSING_MODE", "async")
+    
+    # Documents of a bulk request processed at once, by default and at most
+    BULK_CONCURRENCY: int = int(os.getenv("BULK_CONCURRENCY", "4"))
+    BULK_MAX_CONCURRENCY: int = int(os.getenv("BULK_MAX_CONCURRENCY", "16"))
+    
+    # Server settings for python -m app.run; 0 processes means one per CPU core
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WORKER_PROCESSES: int = int(os.getenv("WORKER_PROCESSES", "1"))
+    
     # CORS settings
     CORS_ORIGINS: List[str] = ["http://localhost:3000"]
     
@@ -18,13 +31,114 @@ class Settings(BaseSettings):
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_PASSWORD: Optional[str] = os.getenv("REDIS_PASSWORD")
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_POOL_TIMEOUT: float = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
     
     # Queue settings
     DOCUMENT_QUEUE_NAME: str = "document-processing"
+    QUEUE_BACKEND: str = os.getenv("QUEUE_BACKEND", "bull")  # "bull" or "streams"
+    # Suffixed with the process ID, see add_process_id
+    WORKER_ID: str = Field(default=socket.gethostname(), validate_default=True)
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", "1"))
+    BULL_DEQUEUE_BATCH_SIZE: int = int(os.getenv("BULL_DEQUEUE_BATCH_SIZE", "16"))
+    JOB_TIMEOUT_SECONDS: float = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+    JOB_TIMEOUT_GRACE: float = float(os.getenv("JOB_TIMEOUT_GRACE", "5"))
+    # Share of the job's timeout (JOB_TIMEOUT_SECONDS by default) each stage may use, set as JSON to override
+    STAGE_BUDGETS: Dict[str, float] = {
+        "download": 0.15,
+        "inference": 0.6,
+        "upload": 0.1,
+        "callback": 0.15,
+    }
+    # Per processing type sub-queues, set as JSON, e.g.
+    # {"certificate": {"concurrency": 4, "rate": 10}, "medical_test": {"concurrency": 2}}
+    # Types without an entry share the "default" shard. Empty disables sharding.
+    QUEUE_SHARDS: Dict[str, Dict[str, float]] = {}
+    WORKER_SHARDS: str = os.getenv("WORKER_SHARDS", "")  # Comma-separated shards to consume, empty for all
+    SHUTDOWN_DRAIN_TIMEOUT: float = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "25"))
+    QUEUE_METRICS_INTERVAL: float = float(os.getenv("QUEUE_METRICS_INTERVAL", "15"))
+    
+    # Cluster settings; a worker whose heartbeat is older than HEARTBEAT_TTL counts as dead
+    WORKER_VERSION: str = os.getenv("WORKER_VERSION", PROJECT_VERSION)
+    HEARTBEAT_INTERVAL: float = float(os.getenv("HEARTBEAT_INTERVAL", "5"))
+    HEARTBEAT_TTL: int = int(os.getenv("HEARTBEAT_TTL", "15"))
+    STALLED_CHECK_INTERVAL: float = float(os.getenv("STALLED_CHECK_INTERVAL", "30"))
+    CLUSTER_VIEW_CACHE_TTL: float = float(os.getenv("CLUSTER_VIEW_CACHE_TTL", "2"))
+    # Reject API submissions with 503 while no live worker consumes the target queue
+    DISPATCH_REQUIRE_CONSUMERS: bool = os.getenv("DISPATCH_REQUIRE_CONSUMERS", "true").lower() == "true"
+    
+    # Duplicate job suppression settings
+    IDEMPOTENCY_ENABLED: bool = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    IDEMPOTENCY_CLAIM_TTL: int = int(os.getenv("IDEMPOTENCY_CLAIM_TTL", "900"))
+    IDEMPOTENCY_RESULT_TTL: int = int(os.getenv("IDEMPOTENCY_RESULT_TTL", "3600"))
+    IDEMPOTENCY_WAIT_TIMEOUT: float = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "600"))
+    # Share of the time left before the job deadline a duplicate may spend waiting for the owner
+    IDEMPOTENCY_WAIT_SHARE: float = float(os.getenv("IDEMPOTENCY_WAIT_SHARE", "0.5"))
+    IDEMPOTENCY_POLL_INTERVAL: float = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "1"))
+    
+    # Dead-letter settings
+    DLQ_MAX_LENGTH: int = int(os.getenv("DLQ_MAX_LENGTH", "10000"))
+    DLQ_REPLAY_RATE: float = float(os.getenv("DLQ_REPLAY_RATE", "1"))
+    
+    # Redis Streams backend settings
+    STREAM_CONSUMER_GROUP: str = os.getenv("STREAM_CONSUMER_GROUP", "document-workers")
+    STREAM_BLOCK_MS: int = int(os.getenv("STREAM_BLOCK_MS", "1000"))
+    STREAM_CLAIM_IDLE_MS: int = int(os.getenv("STREAM_CLAIM_IDLE_MS", "60000"))
+    STREAM_CLAIM_INTERVAL: float = float(os.getenv("STREAM_CLAIM_INTERVAL", "15"))
+    STREAM_MAX_LEN: int = int(os.getenv("STREAM_MAX_LEN", "100000"))
+    
+    # Autoscaling signal settings
+    SCALING_TARGET_LATENCY: float = float(os.getenv("SCALING_TARGET_LATENCY", "60"))
+    SCALING_TARGET_UTILIZATION: float = float(os.getenv("SCALING_TARGET_UTILIZATION", "0.8"))
+    SCALING_EWMA_ALPHA: float = float(os.getenv("SCALING_EWMA_ALPHA", "0.2"))
+    SCALING_MIN_SAMPLE_INTERVAL: float = float(os.getenv("SCALING_MIN_SAMPLE_INTERVAL", "5"))
+    SCALING_MIN_REPLICAS: int = int(os.getenv("SCALING_MIN_REPLICAS", "1"))
+    SCALING_MAX_REPLICAS: int = int(os.getenv("SCALING_MAX_REPLICAS", "20"))
+    
+    # Progress reporting settings
+    PROGRESS_STATUS_TTL: int = int(os.getenv("PROGRESS_STATUS_TTL", "86400"))
+    SSE_KEEPALIVE_INTERVAL: float = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+    
+    # Usage accounting settings; counters live in Redis and are flushed to Postgres when DATABASE_URL is set
+    USAGE_ENABLED: bool = os.getenv("USAGE_ENABLED", "true").lower() == "true"
+    USAGE_RETENTION_DAYS: int = int(os.getenv("USAGE_RETENTION_DAYS", "90"))
+    USAGE_FLUSH_INTERVAL: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "300"))
+    DATABASE_URL: Optional[str] = os.getenv("DATABASE_URL")
     
     # LandingAI settings
     LANDINGAI_API_KEY: str = os.getenv("LANDINGAI_API_KEY", "")
     LANDINGAI_CLIENT_ID: str = os.getenv("LANDINGAI_CLIENT_ID", "")
+    LANDINGAI_HEALTH_URL: str = os.getenv("LANDINGAI_HEALTH_URL", "https://predict.app.landing.ai")
+    LANDINGAI_MODE: str = os.getenv("LANDINGAI_MODE", "live")  # "live", "record" or "replay"
+    LANDINGAI_RECORDINGS_DIR: str = os.getenv("LANDINGAI_RECORDINGS_DIR", "recordings/landingai")
+    # "recorded", "none" or a fixed latency in milliseconds
+    LANDINGAI_REPLAY_LATENCY: str = os.getenv("LANDINGAI_REPLAY_LATENCY", "recorded")
+    LANDINGAI_REPLAY_MISSING: str = os.getenv("LANDINGAI_REPLAY_MISSING", "error")  # "error" or "record"
+    
+    # Health probe settings; probe results older than HEALTH_CACHE_TTL are reported as stale
+    HEALTH_PROBE_INTERVAL: float = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+    HEALTH_PROBE_TIMEOUT: float = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+    HEALTH_CACHE_TTL: float = float(os.getenv("HEALTH_CACHE_TTL", "60"))
+    
+    # Model routing settings
+    MODEL_ROUTES_SOURCE: str = os.getenv("MODEL_ROUTES_SOURCE", "config")  # "config" or "redis"
+    # Processing type -> model ID or [{"modelId": ..., "weight": ...}], set as JSON
+    MODEL_ROUTES: Dict[str, Any] = {}
+    MODEL_ROUTES_FILE: Optional[str] = os.getenv("MODEL_ROUTES_FILE")
+    MODEL_ROUTES_REDIS_KEY: str = os.getenv("MODEL_ROUTES_REDIS_KEY", "worker:model-routes")
+    MODEL_ROUTES_RELOAD_INTERVAL: float = float(os.getenv("MODEL_ROUTES_RELOAD_INTERVAL", "30"))
+    MODEL_WARMUP_ENABLED: bool = os.getenv("MODEL_WARMUP_ENABLED", "false").lower() == "true"
+    MODEL_WARMUP_TIMEOUT: float = float(os.getenv("MODEL_WARMUP_TIMEOUT", "60"))
+    # Import the SDKs in the background after startup instead of on the first job
+    MODULE_PRELOAD_ENABLED: bool = os.getenv("MODULE_PRELOAD_ENABLED", "true").lower() == "true"
+    
+    # Shadow inference settings
+    # Processing type -> candidate model ID, set as JSON
+    SHADOW_MODELS: Dict[str, str] = {}
+    SHADOW_SAMPLE_RATE: float = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+    SHADOW_RATE: float = float(os.getenv("SHADOW_RATE", "0.5"))  # Shadow runs per second across the deployment
+    SHADOW_CONCURRENCY: int = int(os.getenv("SHADOW_CONCURRENCY", "1"))
+    SHADOW_MAX_LENGTH: int = int(os.getenv("SHADOW_MAX_LENGTH", "10000"))
     
     # S3/MinIO settings
     S3_ENDPOINT: str = os.getenv("S3_ENDPOINT", "http://localhost:9000")
@@ -32,10 +146,20 @@ class Settings(BaseSettings):
     S3_SECRET_KEY: str = os.getenv("S3_SECRET_KEY", "minioadmin")
     S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
     S3_BUCKET_NAME: str = os.getenv("S3_BUCKET_NAME", "documents")
+    S3_UPLOAD_PART_SIZE: int = int(os.getenv("S3_UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+    RESULT_FORMAT: str = os.getenv("RESULT_FORMAT", "json")  # "json" or "compact"
+    RESULT_COMPRESSION: str = os.getenv("RESULT_COMPRESSION", "gzip")  # "none", "gzip" or "zstd"
+    RESULT_COMPRESSION_LEVEL: Optional[int] = None  # Codec default when unset
     
     # Main application callback URL
     API_CALLBACK_URL: str = os.getenv("API_CALLBACK_URL", "http://localhost:3001/api/documents/process-result")
     
+    @field_validator("WORKER_ID")
+    @classmethod
+    def add_process_id(cls, value: str) -> str:
+        """Make the worker ID unique per process, also when every process of a supervisor gets the same WORKER_ID"""
+        return f"{value}-{os.getpid()}"
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
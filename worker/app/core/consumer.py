@@ -0,0 +1,251 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.autoscaling import record_job_duration
+from app.core.deadline import DeadlineExceededError, compute_deadline
+from app.core.job_context import JobContext, set_job_context
+from app.core.metrics import JOBS_IN_FLIGHT, QUEUE_WAIT, record_job
+from app.core.rate_limit import RateLimiter
+
+# Type alias for job handler functions
+JobHandler = Callable[[Dict[str, Any]], Any]
+
+async def process_document(job_data: Dict[str, Any]):
+    """Run the document pipeline, importing it (and the SDKs behind it) on first use"""
+    from app.services.document_processor import process_document as run
+    await run(job_data)
+
+# Job type to handler mapping
+JOB_HANDLERS = {
+    "process": process_document,
+    # Add more job types and handlers as needed
+}
+
+# Consumer state shared by every queue backend and the shutdown hook
+_stopping = asyncio.Event()
+_listener_tasks: List[asyncio.Task] = []
+_in_flight: Dict[str, Dict[str, Any]] = {}
+_pools: List["ConsumerPool"] = []
+
+class ConsumerPool:
+    """Bounds the number of jobs a listener runs at once and tracks them for draining"""
+
+    def __init__(self, concurrency: int, rate_limiter: Optional[RateLimiter] = None,
+                 queue_name: Optional[str] = None):
+        """
+        Args:
+            concurrency: Maximum number of jobs running at once
+            rate_limiter: Limits how fast jobs start, if set
+            queue_name: Queue the pool consumes, reported in the worker heartbeat
+        """
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.queue_name = queue_name
+        self.active = 0
+        self._slot_freed = asyncio.Event()
+        _pools.append(self)
+
+    @property
+    def free(self) -> int:
+        """Number of jobs that can be started right now"""
+        return max(0, self.concurrency - self.active)
+
+    async def wait_for_capacity(self):
+        """Wait until a slot is free or a drain starts"""
+        while self.free == 0 and not _stopping.is_set():
+            self._slot_freed.clear()
+            stop_waiter = asyncio.ensure_future(_stopping.wait())
+            slot_waiter = asyncio.ensure_future(self._slot_freed.wait())
+            try:
+                await asyncio.wait([stop_waiter, slot_waiter], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stop_waiter.cancel()
+                slot_waiter.cancel()
+
+    def start(self, job_id: str, job: Dict[str, Any], coro: Awaitable[Any]):
+        """
+        Run a job in the background and register it as in-flight
+
+        Args:
+            job_id: ID of the job
+            job: In-flight record; "data" is filled in once the job is loaded and
+                "release" is called with it if the job is still running at the drain deadline
+            coro: Coroutine processing the job
+        """
+        self.active += 1
+        job["queue"] = self.queue_name
+        job["startedAt"] = time.time()
+        job["task"] = asyncio.create_task(self._run(coro))
+        _in_flight[job_id] = job
+
+        def _on_done(task: asyncio.Task):
+            _in_flight.pop(job_id, None)
+            self.active -= 1
+            self._slot_freed.set()
+
+        job["task"].add_done_callback(_on_done)
+
+    async def _run(self, coro: Awaitable[Any]) -> Any:
+        """Wait for the rate limiter, if any, then run the job"""
+        if self.rate_limiter is not None:
+            # The job holds its slot while it waits, so a drain can still release it
+            try:
+                await self.rate_limiter.acquire()
+            except BaseException:
+                coro.close()
+                raise
+        return await coro
+
+def is_stopping() -> bool:
+    """Return True once a drain has started"""
+    return _stopping.is_set()
+
+def start_listener(coro: Awaitable[Any]):
+    """Run a queue listener until the next drain"""
+    _stopping.clear()
+    _listener_tasks.append(asyncio.create_task(coro))
+
+def get_consumer_snapshot() -> Dict[str, Any]:
+    """
+    Describe this worker's consumer pools and in-flight jobs, as published in its heartbeat
+
+    Returns:
+        {"capacity", "inFlight", "queues": {queue: {"concurrency", "active"}}, "jobs": [...]}
+    """
+    queues: Dict[str, Dict[str, int]] = {}
+    for pool in _pools:
+        queue = queues.setdefault(pool.queue_name or "unknown", {"concurrency": 0, "active": 0})
+        queue["concurrency"] += pool.concurrency
+        queue["active"] += pool.active
+    jobs = [
+        {
+            "jobId": job_id,
+            "queue": job.get("queue"),
+            "documentId": (job.get("data") or {}).get("documentId"),
+            "startedAt": job.get("startedAt"),
+        }
+        for job_id, job in _in_flight.items()
+    ]
+    return {
+        "capacity": sum(pool.concurrency for pool in _pools),
+        "inFlight": len(_in_flight),
+        "queues": queues,
+        "jobs": jobs,
+    }
+
+async def wait_for_stop(timeout: float):
+    """Sleep for up to timeout seconds, waking early when a drain starts"""
+    try:
+        await asyncio.wait_for(_stopping.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+async def drain_consumers():
+    """
+    Drain every queue listener
+
+    Stops dequeuing, gives in-flight jobs until SHUTDOWN_DRAIN_TIMEOUT to
+    finish, then cancels the rest and hands each one to its backend's
+    release function so another worker can resume it.
+    """
+    _stopping.set()
+
+    if _listener_tasks:
+        await asyncio.gather(*_listener_tasks, return_exceptions=True)
+        _listener_tasks.clear()
+
+    if _in_flight:
+        logger.info(f"Draining {len(_in_flight)} in-flight job(s)")
+        await asyncio.wait(
+            [job["task"] for job in _in_flight.values()],
+            timeout=settings.SHUTDOWN_DRAIN_TIMEOUT
+        )
+
+    # Anything still running missed the deadline
+    leftovers = dict(_in_flight)
+    for job in leftovers.values():
+        job["task"].cancel()
+    if leftovers:
+        await asyncio.gather(*[job["task"] for job in leftovers.values()], return_exceptions=True)
+
+    for job_id, job in leftovers.items():
+        try:
+            await job["release"](job)
+            logger.warning(f"Released job {job_id} back to the queue")
+        except Exception as e:
+            logger.error(f"Failed to release job {job_id}: {str(e)}")
+
+async def execute_job(redis_client: redis.Redis, queue_name: str, job_id: str,
+                      job_data: Dict[str, Any], enqueued_at: Optional[float] = None) -> Optional[Exception]:
+    """
+    Dispatch a job to its handler and record metrics
+
+    Args:
+        redis_client: Redis connection
+        queue_name: Queue the job came from
+        job_id: ID of the job
+        job_data: Job payload
+        enqueued_at: Enqueue time in epoch seconds, if known
+
+    Returns:
+        None if the job succeeded, otherwise the error it failed with
+    """
+    context = JobContext(
+        document_id=job_data.get("documentId"),
+        organization_id=job_data.get("organizationId"),
+        job_id=job_id,
+        queue_name=queue_name,
+        started_at=time.time(),
+        deadline=compute_deadline(job_data),
+    )
+    set_job_context(context)
+    logger.info(f"Processing job {job_id} of type {job_data.get('type', 'unknown')}")
+
+    if enqueued_at:
+        QUEUE_WAIT.labels(queue=queue_name).observe(max(0.0, time.time() - enqueued_at))
+
+    # Get the job type and dispatch to the appropriate handler
+    job_type = job_data.get("type")
+    if job_type not in JOB_HANDLERS:
+        logger.warning(f"Unknown job type: {job_type}")
+        record_job(job_type, "unknown_type", job_data.get("organizationId"))
+        return ValueError(f"Unknown job type: {job_type}")
+
+    handler = JOB_HANDLERS[job_type]
+    started = time.perf_counter()
+    error = None
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # Process the job; stages enforce their own budgets, this is the backstop
+        # that frees the consumer slot if a handler ignores its deadline
+        timeout = asyncio.timeout(context.deadline - time.monotonic() + settings.JOB_TIMEOUT_GRACE)
+        try:
+            async with timeout:
+                await handler(job_data)
+        except TimeoutError as e:
+            if not timeout.expired():
+                raise
+            raise DeadlineExceededError(f"Job {job_id} ran past its deadline") from e
+        record_job(job_type, "completed", job_data.get("organizationId"),
+                   time.perf_counter() - started)
+        logger.info(f"Job {job_id} completed successfully")
+    except Exception as e:
+        error = e
+        outcome = "timeout" if isinstance(e, DeadlineExceededError) else "failed"
+        record_job(job_type, outcome, job_data.get("organizationId"),
+                   time.perf_counter() - started)
+        logger.error(f"Job {job_id} failed: {str(e)}")
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+    # Feed the service time EWMA used by the autoscaling signal; bookkeeping
+    # must never fail a finished job, or it would be left on the active list
+    try:
+        await record_job_duration(redis_client, queue_name, time.perf_counter() - started)
+    except Exception as e:
+        logger.error(f"Failed to record duration of job {job_id}: {str(e)}")
+    return error
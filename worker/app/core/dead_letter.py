@@ -0,0 +1,162 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.job_context import get_job_context
+
+# Removes a dead-letter entry and puts its Bull job back on the wait list
+_REPLAY_BULL_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[2], 'data', ARGV[3])
+redis.call('HSETNX', KEYS[2], 'timestamp', ARGV[4])
+redis.call('HDEL', KEYS[2], 'status', 'failedReason', 'checkpoint')
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[2], 'checkpoint', ARGV[5])
+end
+redis.call('LPUSH', KEYS[3], ARGV[2])
+return 1
+"""
+
+# Removes a dead-letter entry and adds its job to the stream again
+_REPLAY_STREAM_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+if ARGV[3] ~= '' then
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', 'data', ARGV[2], 'checkpoint', ARGV[3])
+else
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', 'data', ARGV[2])
+end
+return 1
+"""
+
+def get_dead_letter_key(queue_name: str) -> str:
+    """Return the Redis list holding dead-lettered jobs for a queue"""
+    return f"worker:dlq:{queue_name}"
+
+def build_dead_letter_entry(queue_name: str, job_id: str, job_data: Dict[str, Any],
+                            error: Exception, attempts: int,
+                            enqueued_at: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Describe a failed job for the dead-letter list
+    
+    The failing stage and start time come from the job context of the
+    current task, so this must be called from the task that ran the job.
+    """
+    context = get_job_context()
+    now = time.time()
+    data = {key: value for key, value in job_data.items() if key != "checkpoint"}
+    
+    return {
+        "jobId": job_id,
+        "queue": queue_name,
+        "data": data,
+        "checkpoint": job_data.get("checkpoint"),
+        "errorClass": type(error).__name__,
+        "error": str(error),
+        "stage": context.stage if context else None,
+        "attempts": attempts,
+        "enqueuedAt": int(enqueued_at * 1000) if enqueued_at else None,
+        "startedAt": int(context.started_at * 1000) if context and context.started_at else None,
+        "failedAt": int(now * 1000),
+        "duration": now - context.started_at if context and context.started_at else None,
+    }
+
+def queue_dead_letter(pipe: redis.client.Pipeline, queue_name: str, entry: Dict[str, Any]):
+    """Add a dead-letter entry to a pipeline, keeping the list bounded"""
+    key = get_dead_letter_key(queue_name)
+    pipe.lpush(key, json.dumps(entry))
+    pipe.ltrim(key, 0, settings.DLQ_MAX_LENGTH - 1)
+
+async def list_dead_letters(redis_client: redis.Redis, queue_name: str,
+                            error_class: Optional[str] = None,
+                            stage: Optional[str] = None,
+                            organization_id: Optional[str] = None,
+                            processing_type: Optional[str] = None,
+                            since: Optional[float] = None,
+                            until: Optional[float] = None,
+                            limit: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Return dead-lettered jobs matching every given filter, newest first
+    
+    Args:
+        redis_client: Redis connection
+        queue_name: Queue whose dead letters to read
+        error_class: Only jobs that failed with this exception class
+        stage: Only jobs that failed in this processing stage
+        organization_id: Only jobs for this organization
+        processing_type: Only jobs of this processing type
+        since: Only jobs that failed at or after this epoch time in seconds
+        until: Only jobs that failed before this epoch time in seconds
+        limit: Maximum number of jobs to return
+    
+    Returns:
+        List of (raw list value, parsed entry) tuples; the raw value is needed to remove the entry
+    """
+    matches = []
+    for raw in await redis_client.lrange(get_dead_letter_key(queue_name), 0, -1):
+        entry = json.loads(raw)
+        data = entry.get("data") or {}
+        failed_at = (entry.get("failedAt") or 0) / 1000
+        if error_class and entry.get("errorClass") != error_class:
+            continue
+        if stage and entry.get("stage") != stage:
+            continue
+        if organization_id and data.get("organizationId") != organization_id:
+            continue
+        if processing_type and data.get("processingType", "certificate") != processing_type:
+            continue
+        if since is not None and failed_at < since:
+            continue
+        if until is not None and failed_at >= until:
+            continue
+        matches.append((raw, entry))
+        if limit and len(matches) >= limit:
+            break
+    return matches
+
+async def replay_dead_letter(redis_client: redis.Redis, raw: str, entry: Dict[str, Any]) -> bool:
+    """
+    Put a dead-lettered job back on its queue
+    
+    The entry is removed from the dead-letter list by the same script that
+    re-enqueues it, so a job is never replayed twice. Its checkpoint is
+    restored, so a job that only failed at the callback does not repeat
+    inference.
+    
+    Returns:
+        False if the entry was already removed by someone else
+    """
+    queue_name = entry["queue"]
+    checkpoint = json.dumps(entry["checkpoint"]) if entry.get("checkpoint") else ""
+    
+    if settings.QUEUE_BACKEND == "streams":
+        from app.core.streams import get_stream_key
+        replayed = await redis_client.eval(
+            _REPLAY_STREAM_SCRIPT,
+            2,
+            get_dead_letter_key(queue_name),
+            get_stream_key(queue_name),
+            raw,
+            json.dumps(entry["data"]),
+            checkpoint,
+            settings.STREAM_MAX_LEN,
+        )
+    else:
+        replayed = await redis_client.eval(
+            _REPLAY_BULL_SCRIPT,
+            3,
+            get_dead_letter_key(queue_name),
+            f"bull:{queue_name}:{entry['jobId']}",
+            f"bull:{queue_name}:wait",
+            raw,
+            entry["jobId"],
+            json.dumps(entry["data"]),
+            int(time.time() * 1000),
+            checkpoint,
+        )
+    return bool(replayed)
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.core.job_context import get_job_context
+from app.core.metrics import track_stage
+
+class DeadlineExceededError(Exception):
+    """Raised when a job runs past its deadline"""
+
+class StageTimeoutError(DeadlineExceededError):
+    """Raised when a processing stage exhausts its time budget"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Stage '{stage}' exceeded its {budget:.1f}s budget")
+        self.stage = stage
+        self.budget = budget
+
+def compute_deadline(job_data: Dict[str, Any]) -> float:
+    """
+    Work out when a job must finish, as a time.monotonic() value
+    
+    Jobs can carry a relative "timeoutSeconds" and/or an absolute "deadline"
+    in epoch milliseconds propagated from the caller; the earlier one wins.
+    JOB_TIMEOUT_SECONDS applies when neither is set.
+    """
+    now = time.monotonic()
+    deadline = now + float(job_data.get("timeoutSeconds") or settings.JOB_TIMEOUT_SECONDS)
+    if job_data.get("deadline"):
+        deadline = min(deadline, now + float(job_data["deadline"]) / 1000 - time.time())
+    return deadline
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current job's deadline, or None outside of a job"""
+    context = get_job_context()
+    if context is None or context.deadline is None:
+        return None
+    return context.deadline - time.monotonic()
+
+def get_stage_budget(stage: str) -> Optional[float]:
+    """
+    Return the time budget for a stage of the current job
+    
+    A stage gets its STAGE_BUDGETS share of the job's own timeout (from its
+    timeoutSeconds or deadline, JOB_TIMEOUT_SECONDS otherwise), capped by
+    the time left before the deadline.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return None
+    share = settings.STAGE_BUDGETS.get(stage)
+    if share is None:
+        return remaining
+    context = get_job_context()
+    timeout = context.timeout if context.timeout is not None else settings.JOB_TIMEOUT_SECONDS
+    return min(remaining, share * timeout)
+
+@asynccontextmanager
+async def stage_budget(stage: str) -> AsyncIterator[None]:
+    """
+    Track a processing stage and enforce its time budget
+    
+    Raises:
+        DeadlineExceededError: The job deadline passed before the stage started
+        StageTimeoutError: The stage did not finish within its budget
+    """
+    budget = get_stage_budget(stage)
+    if budget is not None and budget <= 0:
+        raise DeadlineExceededError(f"Job deadline passed before stage '{stage}'")
+    
+    timeout = asyncio.timeout(budget)
+    with track_stage(stage):
+        try:
+            async with timeout:
+                yield
+        except TimeoutError as e:
+            # Only our own expiry is a budget failure, not timeouts raised by the stage itself
+            if timeout.expired():
+                raise StageTimeoutError(stage, budget) from e
+            raise
@@ -0,0 +1,38 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+@dataclass
+class JobContext:
+    """Details of the job being processed by the current task"""
+    document_id: Optional[str] = None
+    organization_id: Optional[str] = None
+    job_id: Optional[str] = None
+    queue_name: Optional[str] = None
+    stage: Optional[str] = None
+    started_at: Optional[float] = None
+    deadline: Optional[float] = None  # time.monotonic() value
+    # Seconds the job was given in total, which stage budgets are shares of
+    timeout: Optional[float] = None
+    # Usage counters added up while the job runs and recorded once it ends (see app.core.usage)
+    usage: Dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.timeout is None and self.deadline is not None:
+            self.timeout = max(0.0, self.deadline - time.monotonic())
+
+    def add_usage(self, name: str, amount: float = 1):
+        """Add to one of the job's usage counters"""
+        self.usage[name] = self.usage.get(name, 0) + amount
+
+# asyncio copies the context into each task, so every job sees its own value
+_current_job: ContextVar[Optional[JobContext]] = ContextVar("current_job", default=None)
+
+def get_job_context() -> Optional[JobContext]:
+    """Return the context of the job running in the current task, if any"""
+    return _current_job.get()
+
+def set_job_context(context: Optional[JobContext]):
+    """Bind a job context to the current task"""
+    return _current_job.set(context)
@@ -0,0 +1,146 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.core.job_context import get_job_context
+
+# Gauges say how to combine the values of several processes in multiprocess mode (see app.run)
+
+# Buckets cover everything from a fast Redis round trip to a slow multi-page inference
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_LATENCY = Histogram(
+    "worker_stage_duration_seconds",
+    "Time spent in each document processing stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+JOB_DURATION = Histogram(
+    "worker_job_duration_seconds",
+    "End-to-end time spent processing a job",
+    ["job_type"],
+    buckets=STAGE_BUCKETS,
+)
+
+QUEUE_WAIT = Histogram(
+    "worker_queue_wait_seconds",
+    "Time a job spent in the queue before a worker picked it up",
+    ["queue"],
+    buckets=STAGE_BUCKETS,
+)
+
+JOBS_TOTAL = Counter(
+    "worker_jobs_total",
+    "Jobs processed by the worker",
+    ["job_type", "outcome", "organization"],
+)
+
+MODEL_REQUESTS = Counter(
+    "worker_model_requests_total",
+    "Documents routed to each LandingAI model",
+    ["processing_type", "model_id"],
+)
+
+SHADOW_COMPARISONS = Counter(
+    "worker_shadow_comparisons_total",
+    "Shadow inference runs against candidate models by outcome",
+    ["processing_type", "model_id", "outcome"],
+)
+
+SHADOW_FIELD_MISMATCHES = Counter(
+    "worker_shadow_field_mismatches_total",
+    "Extracted fields where a candidate model disagreed with the primary model",
+    ["processing_type", "model_id", "field"],
+)
+
+STALLED_JOBS = Counter(
+    "worker_stalled_jobs_total",
+    "Active jobs of workers whose heartbeat expired, released back to the wait list",
+    ["queue"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "worker_queue_depth",
+    "Number of jobs in each state of the queue",
+    ["queue", "state"],
+    multiprocess_mode="livemax",
+)
+
+JOBS_IN_FLIGHT = Gauge(
+    "worker_jobs_in_flight",
+    "Jobs currently being processed by this worker",
+    multiprocess_mode="livesum",
+)
+
+COMPONENT_HEALTHY = Gauge(
+    "worker_component_healthy",
+    "1 if the last health probe of a component succeeded",
+    ["component"],
+    multiprocess_mode="livemin",
+)
+
+COMPONENT_PROBE_LATENCY = Gauge(
+    "worker_component_probe_latency_seconds",
+    "Latency of the last health probe of a component",
+    ["component"],
+    multiprocess_mode="livemax",
+)
+
+REDIS_POOL_CONNECTIONS = Gauge(
+    "worker_redis_pool_connections",
+    "Connections in the shared Redis pool",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Record the wall-clock duration of a processing stage, also in the job's usage"""
+    context = get_job_context()
+    if context is not None:
+        context.stage = stage
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage=stage).observe(duration)
+        if context is not None:
+            context.add_usage(f"seconds:{stage}", duration)
+
+def record_job(job_type: Optional[str], outcome: str, organization_id: Optional[str],
+               duration: Optional[float] = None):
+    """Record the outcome and duration of a finished job"""
+    job_type = job_type or "unknown"
+    JOBS_TOTAL.labels(
+        job_type=job_type,
+        outcome=outcome,
+        organization=organization_id or "unknown",
+    ).inc()
+    if duration is not None:
+        JOB_DURATION.labels(job_type=job_type).observe(duration)
+
+def is_multiprocess() -> bool:
+    """Return True when metrics are shared by several worker processes"""
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+def render_metrics() -> bytes:
+    """Render all registered metrics in the Prometheus text format, summed over every worker process"""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
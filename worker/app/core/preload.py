@@ -0,0 +1,28 @@
+import importlib
+import time
+from loguru import logger
+
+# Heavy modules kept off the startup path; they load on first use or in preload_modules
+LAZY_MODULES = [
+    "app.services.document_processor",
+    "landingai.pipeline",
+    "PIL.Image",
+    "boto3",
+    "botocore",
+    "httpx",
+]
+
+def preload_modules():
+    """
+    Import every lazy module so the first job doesn't pay for it
+
+    Blocking; run it on an executor after startup. Failures are logged and
+    left for first use to report.
+    """
+    started = time.perf_counter()
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Failed to preload {name}: {str(e)}")
+    logger.info(f"Preloaded {len(LAZY_MODULES)} module(s) in {time.perf_counter() - started:.2f}s")
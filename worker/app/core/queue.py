@@ -1,31 +1,105 @@
-import asyncio
 import json
-from typing import Any, Dict, Callable
+import time
+from typing import Any, Dict, List, Optional, Tuple
 import redis.asyncio as redis
 from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.core.config import settings
-from app.services.document_processor import process_document
-
-# Type alias for job handler functions
-JobHandler = Callable[[Dict[str, Any]], Any]
-
-# Job type to handler mapping
-JOB_HANDLERS = {
-    "process": process_document,
-    # Add more job types and handlers as needed
-}
-
-async def get_redis_connection():
-    """Get an async Redis connection"""
-    return redis.Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        password=settings.REDIS_PASSWORD,
-        db=settings.REDIS_DB,
-        decode_responses=True
-    )
+from app.core.consumer import (
+    ConsumerPool,
+    drain_consumers,
+    execute_job,
+    is_stopping,
+    start_listener,
+    wait_for_stop,
+)
+from app.core.dead_letter import build_dead_letter_entry, queue_dead_letter
+from app.core.metrics import QUEUE_DEPTH
+from app.core.rate_limit import RateLimiter
+from app.core.redis_pool import get_redis_connection
+from app.core.sharding import DEFAULT_PROCESSING_TYPE, DEFAULT_SHARD, get_local_shards, is_sharded
+
+# Moves a job from the active list back to the head of the wait list, keeping its checkpoint
+_RELEASE_JOB_SCRIPT = """
+local removed = redis.call('LREM', KEYS[1], 0, ARGV[1])
+if removed > 0 then
+    if ARGV[2] ~= '' then
+        redis.call('HSET', KEYS[3], 'checkpoint', ARGV[2])
+    end
+    redis.call('HDEL', KEYS[3], 'status')
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+end
+return removed
+"""
+
+# Moves up to ARGV[1] jobs from wait to active and returns their data in one round trip.
+# Each job is stamped with the ID of the worker taking it, for stalled job detection.
+_DEQUEUE_BATCH_SCRIPT = """
+local jobs = {}
+for i = 1, tonumber(ARGV[1]) do
+    local job_id = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+    if not job_id then
+        break
+    end
+    local fields = redis.call('HMGET', ARGV[2] .. job_id, 'data', 'timestamp', 'checkpoint')
+    if fields[1] then
+        redis.call('HSET', ARGV[2] .. job_id, 'processedBy', ARGV[3])
+    end
+    jobs[#jobs + 1] = {job_id, fields[1], fields[2], fields[3]}
+end
+return jobs
+"""
+
+# Adds a job the way Bull's Queue.add does for a plain job: new ID, job hash, wait list
+_ADD_JOB_SCRIPT = """
+local job_id = tostring(redis.call('INCR', KEYS[1]))
+redis.call('HSET', ARGV[1] .. job_id, 'name', ARGV[2], 'data', ARGV[3], 'opts', '{}',
+    'timestamp', ARGV[4], 'delay', 0, 'priority', 0)
+redis.call('LPUSH', KEYS[2], job_id)
+return job_id
+"""
+
+# Moves up to ARGV[1] jobs from the parent wait list to their shard's wait list.
+# The job hash is renamed under the shard queue and the shard's ID counter is
+# bumped so the shard looks like a regular Bull queue to the rest of the worker.
+_ROUTE_JOBS_SCRIPT = """
+local shards = {}
+for i = 5, #ARGV do
+    shards[ARGV[i]] = true
+end
+local moved = 0
+for i = 1, tonumber(ARGV[1]) do
+    local job_id = redis.call('RPOP', KEYS[1])
+    if not job_id then
+        break
+    end
+    local source = ARGV[2] .. job_id
+    local shard = ARGV[3]
+    local data = redis.call('HGET', source, 'data')
+    if data then
+        local processing_type = ARGV[4]
+        local ok, job = pcall(cjson.decode, data)
+        if ok and type(job) == 'table' and type(job['processingType']) == 'string' then
+            processing_type = job['processingType']
+        end
+        if shards[processing_type] then
+            shard = processing_type
+        end
+        redis.call('RENAME', source, ARGV[2] .. shard .. ':' .. job_id)
+    end
+    redis.call('INCR', ARGV[2] .. shard .. ':id')
+    redis.call('LPUSH', ARGV[2] .. shard .. ':wait', job_id)
+    moved = moved + 1
+end
+return moved
+"""
+
+# Jobs moved per routing round trip
+_ROUTE_BATCH_SIZE = 100
+
+# (job ID, data, timestamp, checkpoint) as stored in the Bull job hash
+BullJob = Tuple[str, Optional[str], Optional[str], Optional[str]]
 
 @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=60))
 async def setup_queue_listeners():
@@ -33,66 +107,226 @@ async def setup_queue_listeners():
     try:
         # Connect to Redis
         redis_client = await get_redis_connection()
+        await redis_client.ping()
         logger.info(f"Connected to Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+
+        # Start a listener and consumer pool for each shard this deployment runs
+        listen = listen_to_bull_queue
+        if settings.QUEUE_BACKEND == "streams":
+            from app.core.streams import listen_to_stream_queue
+            listen = listen_to_stream_queue
+        elif is_sharded():
+            start_listener(run_bull_router(redis_client, settings.DOCUMENT_QUEUE_NAME))
         
-        # Start the queue listeners
-        asyncio.create_task(listen_to_bull_queue(redis_client, settings.DOCUMENT_QUEUE_NAME))
-        logger.info(f"Started listening to queue: {settings.DOCUMENT_QUEUE_NAME}")
+        for shard in get_local_shards(settings.DOCUMENT_QUEUE_NAME):
+            rate_limiter = None
+            if shard.rate:
+                rate_limiter = RateLimiter(redis_client, f"shard:{shard.queue_name}", shard.rate, shard.burst)
+            pool = ConsumerPool(shard.concurrency, rate_limiter, shard.queue_name)
+            start_listener(listen(redis_client, shard.queue_name, pool))
+            logger.info(f"Started listening to queue: {shard.queue_name} ({settings.QUEUE_BACKEND}, "
+                        f"concurrency {shard.concurrency})")
         
         return True
     except Exception as e:
         logger.error(f"Failed to setup queue listeners: {str(e)}")
         raise
 
-async def listen_to_bull_queue(redis_client: redis.Redis, queue_name: str):
-    """Listen to a Bull queue and process jobs"""
-    logger.info(f"Listening to Bull queue: {queue_name}")
+async def shutdown_queue_listeners():
+    """Stop dequeuing and drain in-flight jobs within SHUTDOWN_DRAIN_TIMEOUT"""
+    await drain_consumers()
+
+async def release_job(redis_client: redis.Redis, queue_name: str, job_id: str,
+                      checkpoint: Optional[Dict[str, Any]] = None) -> bool:
+    """Atomically move a job from the active list back to the head of the wait list"""
+    removed = await redis_client.eval(
+        _RELEASE_JOB_SCRIPT,
+        3,
+        f"bull:{queue_name}:active",
+        f"bull:{queue_name}:wait",
+        f"bull:{queue_name}:{job_id}",
+        job_id,
+        json.dumps(checkpoint) if checkpoint else "",
+    )
+    return bool(removed)
+
+async def enqueue_bull_job(redis_client: redis.Redis, queue_name: str, job_data: Dict[str, Any]) -> str:
+    """Add a job to a Bull queue in one round trip and return its ID"""
+    job_id = await redis_client.eval(
+        _ADD_JOB_SCRIPT,
+        2,
+        f"bull:{queue_name}:id",
+        f"bull:{queue_name}:wait",
+        f"bull:{queue_name}:",
+        job_data.get("type", "process"),
+        json.dumps(job_data),
+        int(time.time() * 1000),
+    )
+    return str(job_id)
+
+async def enqueue_job(redis_client: redis.Redis, queue_name: str, job_data: Dict[str, Any]) -> str:
+    """
+    Add a job to a queue using the configured backend
     
-    # Bull stores jobs in several Redis keys
-    queue_key = f"bull:{queue_name}:wait"
-    active_key = f"bull:{queue_name}:active"
+    Sharded queues are routed the same way as jobs from other producers.
     
-    while True:
+    Returns:
+        The job ID
+    """
+    if settings.QUEUE_BACKEND == "streams":
+        from app.core.streams import enqueue_stream_job
+        return await enqueue_stream_job(redis_client, queue_name, job_data)
+    return await enqueue_bull_job(redis_client, queue_name, job_data)
+
+async def dequeue_bull_jobs(redis_client: redis.Redis, queue_name: str, count: int) -> List[BullJob]:
+    """
+    Move up to count jobs from the wait list to the active list
+    
+    Job IDs and their data hashes come back together from a single Lua
+    script, so a batch costs one round trip instead of two per job.
+    """
+    jobs = await redis_client.eval(
+        _DEQUEUE_BATCH_SCRIPT,
+        2,
+        f"bull:{queue_name}:wait",
+        f"bull:{queue_name}:active",
+        count,
+        f"bull:{queue_name}:",
+        settings.WORKER_ID,
+    )
+    return [tuple(job) for job in jobs]
+
+async def route_bull_jobs(redis_client: redis.Redis, queue_name: str, count: int = _ROUTE_BATCH_SIZE) -> int:
+    """Move up to count jobs from a Bull queue's wait list to their shards, returning how many moved"""
+    shard_names = [name for name in settings.QUEUE_SHARDS if name != DEFAULT_SHARD]
+    moved = await redis_client.eval(
+        _ROUTE_JOBS_SCRIPT,
+        1,
+        f"bull:{queue_name}:wait",
+        count,
+        f"bull:{queue_name}:",
+        DEFAULT_SHARD,
+        DEFAULT_PROCESSING_TYPE,
+        *shard_names,
+    )
+    return int(moved)
+
+async def update_queue_depth(redis_client: redis.Redis, queue_name: str):
+    """Refresh the queue depth gauges for a Bull queue in a single round trip"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.llen(f"bull:{queue_name}:wait")
+        pipe.llen(f"bull:{queue_name}:active")
+        pipe.zcard(f"bull:{queue_name}:delayed")
+        waiting, active, delayed = await pipe.execute()
+
+    QUEUE_DEPTH.labels(queue=queue_name, state="wait").set(waiting)
+    QUEUE_DEPTH.labels(queue=queue_name, state="active").set(active)
+    QUEUE_DEPTH.labels(queue=queue_name, state="delayed").set(delayed)
+
+async def listen_to_bull_queue(redis_client: redis.Redis, queue_name: str, pool: ConsumerPool):
+    """
+    Listen to a Bull queue and process up to the pool's concurrency of jobs at a time
+
+    Each dequeue takes as many jobs as there are free consumer slots, capped
+    at BULL_DEQUEUE_BATCH_SIZE.
+    """
+    logger.info(f"Listening to Bull queue: {queue_name}")
+
+    # Queue depth is sampled on an interval rather than per job to keep overhead flat
+    next_depth_update = 0.0
+
+    while not is_stopping():
         try:
-            # Get the next job from the wait list
-            job_id = await redis_client.rpoplpush(queue_key, active_key)
-            
-            if job_id:
-                # Get the job data
-                job_key = f"bull:{queue_name}:{job_id}"
-                job_data_raw = await redis_client.hget(job_key, "data")
-                
-                if job_data_raw:
-                    job_data = json.loads(job_data_raw)
-                    logger.info(f"Processing job {job_id} of type {job_data.get('type', 'unknown')}")
-                    
-                    # Get the job type and dispatch to the appropriate handler
-                    job_type = job_data.get("type")
-                    if job_type in JOB_HANDLERS:
-                        handler = JOB_HANDLERS[job_type]
-                        try:
-                            # Process the job
-                            await handler(job_data)
-                            
-                            # Mark job as completed
-                            await redis_client.hset(job_key, "status", "completed")
-                            logger.info(f"Job {job_id} completed successfully")
-                        except Exception as e:
-                            # Mark job as failed
-                            await redis_client.hset(job_key, "status", "failed")
-                            await redis_client.hset(job_key, "failedReason", str(e))
-                            logger.error(f"Job {job_id} failed: {str(e)}")
-                    else:
-                        logger.warning(f"Unknown job type: {job_type}")
-                        await redis_client.hset(job_key, "status", "failed")
-                        await redis_client.hset(job_key, "failedReason", f"Unknown job type: {job_type}")
-                    
-                    # Move job from active to completed or failed
-                    await redis_client.lrem(active_key, 0, job_id)
-                    await redis_client.rpush(f"bull:{queue_name}:completed", job_id)
-            else:
+            if time.monotonic() >= next_depth_update:
+                await update_queue_depth(redis_client, queue_name)
+                next_depth_update = time.monotonic() + settings.QUEUE_METRICS_INTERVAL
+
+            # Wait for a free consumer slot
+            await pool.wait_for_capacity()
+            if is_stopping():
+                break
+
+            # Get the next batch of jobs from the wait list
+            batch_size = min(pool.free, settings.BULL_DEQUEUE_BATCH_SIZE)
+            bull_jobs = await dequeue_bull_jobs(redis_client, queue_name, batch_size)
+
+            for bull_job in bull_jobs:
+                job_id = bull_job[0]
+                job = {"data": None, "release": _release_bull_job(redis_client, queue_name, job_id)}
+                pool.start(job_id, job, run_bull_job(redis_client, queue_name, bull_job, job))
+
+            if not bull_jobs:
                 # No jobs, wait a bit
-                await asyncio.sleep(1)
+                await wait_for_stop(1)
         except Exception as e:
             logger.error(f"Error processing queue: {str(e)}")
-            await asyncio.sleep(5)  # Wait a bit before retrying
\ No newline at end of file
+            await wait_for_stop(5)  # Wait a bit before retrying
+
+    logger.info(f"Stopped listening to Bull queue: {queue_name}")
+
+async def run_bull_router(redis_client: redis.Redis, queue_name: str):
+    """
+    Keep routing jobs from a Bull queue to its shards by processing type
+    
+    Producers keep enqueuing onto the parent queue. Every worker runs a
+    router, and each job is moved by exactly one of them since the move is
+    a single Lua script.
+    """
+    logger.info(f"Routing Bull queue {queue_name} to shards")
+    
+    while not is_stopping():
+        try:
+            if not await route_bull_jobs(redis_client, queue_name):
+                # No jobs, wait a bit
+                await wait_for_stop(0.25)
+        except Exception as e:
+            logger.error(f"Error routing queue: {str(e)}")
+            await wait_for_stop(5)  # Wait a bit before retrying
+    
+    logger.info(f"Stopped routing Bull queue: {queue_name}")
+
+def _release_bull_job(redis_client: redis.Redis, queue_name: str, job_id: str):
+    """Build the drain release function for a Bull job"""
+    async def release(job: Dict[str, Any]):
+        checkpoint = job["data"].get("checkpoint") if job["data"] else None
+        await release_job(redis_client, queue_name, job_id, checkpoint)
+    return release
+
+async def run_bull_job(redis_client: redis.Redis, queue_name: str, bull_job: BullJob, job: Dict[str, Any]):
+    """Process a single job that has been moved to the active list"""
+    job_id, job_data_raw, enqueued_at, checkpoint = bull_job
+    active_key = f"bull:{queue_name}:active"
+    job_key = f"bull:{queue_name}:{job_id}"
+
+    try:
+        if not job_data_raw:
+            return
+
+        job_data = json.loads(job_data_raw)
+        if checkpoint:
+            # Resume from where a previous worker left off
+            job_data["checkpoint"] = json.loads(checkpoint)
+        job["data"] = job_data
+
+        # Bull stores the enqueue time in milliseconds
+        enqueued_at = int(enqueued_at) / 1000 if enqueued_at else None
+        error = await execute_job(redis_client, queue_name, job_id, job_data, enqueued_at)
+
+        if error is None:
+            # Mark job as completed and move it from active to completed
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(job_key, "status", "completed")
+                pipe.lrem(active_key, 0, job_id)
+                pipe.rpush(f"bull:{queue_name}:completed", job_id)
+                await pipe.execute()
+        else:
+            # Mark job as failed and move it from active to the dead-letter list
+            attempts = await redis_client.hincrby(job_key, "attemptsMade", 1)
+            entry = build_dead_letter_entry(queue_name, job_id, job_data, error, attempts, enqueued_at)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(job_key, mapping={"status": "failed", "failedReason": str(error)})
+                pipe.lrem(active_key, 0, job_id)
+                queue_dead_letter(pipe, queue_name, entry)
+                await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {str(e)}")
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Optional
+import redis.asyncio as redis
+
+# Token bucket shared by every process using the same key; returns the wait in ms, 0 when granted
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate / 1000)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+class RateLimiter:
+    """
+    Distributed token bucket rate limiter backed by Redis
+    
+    Every worker and CLI process using the same name shares one bucket, so
+    the limit holds across the whole deployment.
+    """
+
+    def __init__(self, redis_client: redis.Redis, name: str, rate: float, burst: Optional[float] = None):
+        """
+        Args:
+            redis_client: Redis connection
+            name: Name of the bucket
+            rate: Tokens added per second
+            burst: Bucket capacity, defaults to one second's worth of tokens
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.redis_client = redis_client
+        self.key = f"worker:ratelimit:{name}"
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+
+    async def try_acquire(self, tokens: float = 1) -> float:
+        """Try to take tokens, returning 0 on success or the seconds to wait before retrying"""
+        wait_ms = await self.redis_client.eval(
+            _TOKEN_BUCKET_SCRIPT,
+            1,
+            self.key,
+            self.rate,
+            self.burst,
+            int(time.time() * 1000),
+            tokens,
+        )
+        return int(wait_ms) / 1000
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until tokens are available and take them"""
+        while True:
+            wait = await self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,96 @@
+from typing import Any, Dict, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import REDIS_POOL_CONNECTIONS, is_multiprocess
+
+# Connection pool shared by the queue listeners, health checks and caches
+_pool: Optional[redis.BlockingConnectionPool] = None
+
+# Separate pool for pub/sub, whose connections stay checked out while subscribed
+_pubsub_pool: Optional[redis.ConnectionPool] = None
+
+def get_redis_pool() -> redis.BlockingConnectionPool:
+    """Return the shared Redis connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        _pool = redis.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+        )
+        if not is_multiprocess():
+            REDIS_POOL_CONNECTIONS.labels(state="in_use").set_function(
+                lambda: get_pool_stats()["inUse"]
+            )
+            REDIS_POOL_CONNECTIONS.labels(state="available").set_function(
+                lambda: get_pool_stats()["available"]
+            )
+        logger.info(f"Created Redis connection pool for {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+    return _pool
+
+async def get_redis_connection() -> redis.Redis:
+    """
+    Get an async Redis client backed by the shared connection pool
+    
+    Clients are cheap wrappers around the pool, so callers don't need to
+    close them. Connections are returned to the pool after each command.
+    """
+    return redis.Redis(connection_pool=get_redis_pool())
+
+def get_pubsub_client() -> redis.Redis:
+    """
+    Get a Redis client for pub/sub subscriptions
+
+    Backed by a pool of its own, so long-lived subscriptions never take
+    connections from the shared pool the queue listeners depend on.
+    """
+    global _pubsub_pool
+    if _pubsub_pool is None:
+        _pubsub_pool = redis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+        )
+    return redis.Redis(connection_pool=_pubsub_pool)
+
+async def close_redis_pool():
+    """Disconnect every connection in the shared and pub/sub pools"""
+    global _pool, _pubsub_pool
+    if _pubsub_pool is not None:
+        await _pubsub_pool.disconnect()
+        _pubsub_pool = None
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+        logger.info("Closed Redis connection pool")
+
+def update_pool_metrics():
+    """
+    Record the pool usage gauges
+    
+    Only needed in multiprocess mode, where gauges can't be read at scrape
+    time through set_function; the health prober calls it on each round.
+    """
+    stats = get_pool_stats()
+    REDIS_POOL_CONNECTIONS.labels(state="in_use").set(stats["inUse"])
+    REDIS_POOL_CONNECTIONS.labels(state="available").set(stats["available"])
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return usage statistics for the shared connection pool"""
+    if _pool is None:
+        return {"maxConnections": settings.REDIS_MAX_CONNECTIONS, "created": 0, "inUse": 0, "available": 0}
+    
+    return {
+        "maxConnections": _pool.max_connections,
+        "created": getattr(_pool, "_created_connections", 0),
+        "inUse": len(getattr(_pool, "_in_use_connections", ())),
+        "available": len(getattr(_pool, "_available_connections", ())),
+    }
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Shard that takes every processing type without a shard of its own
+DEFAULT_SHARD = "default"
+
+# Processing type assumed when a job doesn't specify one, as in process_document
+DEFAULT_PROCESSING_TYPE = "certificate"
+
+@dataclass
+class Shard:
+    """A processing type with its own sub-queue and consumer pool"""
+    name: str
+    queue_name: str
+    concurrency: int
+    rate: Optional[float] = None  # Job starts per second across the deployment
+    burst: Optional[float] = None
+
+def is_sharded() -> bool:
+    """Return True if jobs are split into sub-queues by processing type"""
+    return bool(settings.QUEUE_SHARDS)
+
+def get_shard_queue_name(queue_name: str, shard: str) -> str:
+    """Return the sub-queue holding a shard's jobs"""
+    return f"{queue_name}:{shard}"
+
+def get_shards(queue_name: str) -> List[Shard]:
+    """
+    Return every shard of a queue
+
+    Without QUEUE_SHARDS the queue itself is the only shard. Otherwise each
+    configured processing type gets a shard, plus the default shard for
+    everything else, which runs with WORKER_CONCURRENCY unless configured.
+    """
+    if not is_sharded():
+        return [Shard(name=DEFAULT_SHARD, queue_name=queue_name, concurrency=settings.WORKER_CONCURRENCY)]
+
+    shard_options: Dict[str, Dict[str, Any]] = dict(settings.QUEUE_SHARDS)
+    shard_options.setdefault(DEFAULT_SHARD, {})
+    return [
+        Shard(
+            name=name,
+            queue_name=get_shard_queue_name(queue_name, name),
+            concurrency=int(options.get("concurrency", settings.WORKER_CONCURRENCY)),
+            rate=options.get("rate"),
+            burst=options.get("burst"),
+        )
+        for name, options in shard_options.items()
+    ]
+
+def get_local_shards(queue_name: str) -> List[Shard]:
+    """Return the shards this deployment consumes, as selected by WORKER_SHARDS"""
+    selected = {name.strip() for name in settings.WORKER_SHARDS.split(",") if name.strip()}
+    shards = get_shards(queue_name)
+    if not selected or not is_sharded():
+        return shards
+    return [shard for shard in shards if shard.name in selected]
+
+def get_queue_concurrency(queue_name: str) -> int:
+    """Return the per-replica concurrency of a queue or one of its shards"""
+    for shard in get_shards(settings.DOCUMENT_QUEUE_NAME):
+        if shard.queue_name == queue_name:
+            return shard.concurrency
+    return settings.WORKER_CONCURRENCY
+
+def route_queue_name(queue_name: str, job_data: Dict[str, Any]) -> str:
+    """Return the sub-queue a new job belongs on, or the queue itself when unsharded"""
+    if not is_sharded():
+        return queue_name
+    processing_type = job_data.get("processingType") or DEFAULT_PROCESSING_TYPE
+    shard = processing_type if processing_type in settings.QUEUE_SHARDS else DEFAULT_SHARD
+    return get_shard_queue_name(queue_name, shard)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+from loguru import logger
+
+from app.core.config import settings
+from app.core.consumer import ConsumerPool, execute_job, is_stopping, wait_for_stop
+from app.core.dead_letter import build_dead_letter_entry, queue_dead_letter
+from app.core.metrics import QUEUE_DEPTH
+from app.core.sharding import route_queue_name
+
+def get_stream_key(queue_name: str) -> str:
+    """Return the Redis stream backing a queue"""
+    return f"stream:{queue_name}"
+
+def get_stream_job_key(queue_name: str, job_id: str) -> str:
+    """Return the hash holding the status of a stream job"""
+    return f"stream:{queue_name}:job:{job_id}"
+
+async def ensure_consumer_group(redis_client: redis.Redis, queue_name: str):
+    """Create the stream and its consumer group if they don't exist yet"""
+    try:
+        await redis_client.xgroup_create(
+            get_stream_key(queue_name), settings.STREAM_CONSUMER_GROUP, id="0", mkstream=True
+        )
+        logger.info(f"Created consumer group {settings.STREAM_CONSUMER_GROUP} for {queue_name}")
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+async def enqueue_stream_job(redis_client: redis.Redis, queue_name: str, job_data: Dict[str, Any],
+                             checkpoint: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Add a job to a stream queue
+    
+    When QUEUE_SHARDS is set the job goes to its processing type's shard
+    stream instead.
+    
+    Args:
+        redis_client: Redis connection
+        queue_name: Name of the queue
+        job_data: Job payload
+        checkpoint: Progress recorded by a previous attempt, if any
+    
+    Returns:
+        The stream entry ID, which doubles as the job ID
+    """
+    fields = {"data": json.dumps(job_data)}
+    if checkpoint:
+        fields["checkpoint"] = json.dumps(checkpoint)
+    return await redis_client.xadd(
+        get_stream_key(route_queue_name(queue_name, job_data)), fields, maxlen=settings.STREAM_MAX_LEN, approximate=True
+    )
+
+async def get_stream_backlog(redis_client: redis.Redis, queue_name: str) -> Tuple[int, int, int]:
+    """
+    Return the waiting and pending entry counts and the total entries ever added
+
+    Uses XINFO, which reads counters Redis already maintains instead of walking the stream.
+    """
+    stream_key = get_stream_key(queue_name)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.xinfo_stream(stream_key)
+        pipe.xinfo_groups(stream_key)
+        stream_info, groups = await pipe.execute()
+
+    waiting, pending = 0, 0
+    for group in groups:
+        if group.get("name") == settings.STREAM_CONSUMER_GROUP:
+            waiting = group.get("lag") or 0
+            pending = group.get("pending") or 0
+    return waiting, pending, int(stream_info.get("entries-added") or 0)
+
+async def update_stream_depth(redis_client: redis.Redis, queue_name: str):
+    """Refresh the queue depth gauges for a stream queue"""
+    waiting, pending, _ = await get_stream_backlog(redis_client, queue_name)
+    QUEUE_DEPTH.labels(queue=queue_name, state="wait").set(waiting)
+    QUEUE_DEPTH.labels(queue=queue_name, state="active").set(pending)
+
+async def keep_entries_claimed(redis_client: redis.Redis, stream_key: str, consumer: str,
+                               in_flight: Dict[str, Dict[str, Any]]):
+    """
+    Reset the idle time of this consumer's in-flight entries so XAUTOCLAIM doesn't steal them
+
+    Runs on its own rather than in the listener loop, which waits for a free
+    slot and so never gets round to it while every slot is busy. Keeps going
+    through a drain until the last in-flight entry is done.
+    """
+    # Refresh well within the idle time after which other consumers reclaim
+    interval = min(settings.STREAM_CLAIM_INTERVAL, settings.STREAM_CLAIM_IDLE_MS / 1000 / 3)
+    while not is_stopping() or in_flight:
+        await asyncio.sleep(interval)
+        if not in_flight:
+            continue
+        try:
+            await redis_client.xclaim(
+                stream_key, settings.STREAM_CONSUMER_GROUP, consumer, 0, list(in_flight), justid=True
+            )
+        except Exception as e:
+            logger.error(f"Error refreshing in-flight stream entries: {str(e)}")
+
+async def listen_to_stream_queue(redis_client: redis.Redis, queue_name: str, pool: ConsumerPool):
+    """
+    Listen to a stream queue as a member of the worker consumer group
+    
+    Entries are read in batches sized to the pool's free capacity and acked
+    once processed. Entries left pending by a crashed consumer for longer than
+    STREAM_CLAIM_IDLE_MS are recovered with XAUTOCLAIM, and a background task
+    periodically re-claims this consumer's in-flight entries so long jobs
+    aren't mistaken for stalled ones.
+    """
+    stream_key = get_stream_key(queue_name)
+    group = settings.STREAM_CONSUMER_GROUP
+    consumer = settings.WORKER_ID
+    await ensure_consumer_group(redis_client, queue_name)
+    logger.info(f"Listening to stream {stream_key} as {consumer} in group {group}")
+    
+    in_flight: Dict[str, Dict[str, Any]] = {}
+    next_depth_update = 0.0
+    next_claim = 0.0
+    # Not awaited: it outlives the listener until in-flight entries finish draining
+    refresher = asyncio.create_task(keep_entries_claimed(redis_client, stream_key, consumer, in_flight))
+    
+    while not is_stopping():
+        try:
+            if time.monotonic() >= next_depth_update:
+                await update_stream_depth(redis_client, queue_name)
+                next_depth_update = time.monotonic() + settings.QUEUE_METRICS_INTERVAL
+            
+            # Wait for a free consumer slot
+            await pool.wait_for_capacity()
+            if is_stopping():
+                break
+            
+            entries: List[Tuple[str, Dict[str, str]]] = []
+            if time.monotonic() >= next_claim:
+                # Recover entries abandoned by consumers that died mid-job
+                claimed = await redis_client.xautoclaim(
+                    stream_key, group, consumer, settings.STREAM_CLAIM_IDLE_MS,
+                    start_id="0-0", count=pool.free
+                )
+                entries.extend(entry for entry in claimed[1] if entry and entry[1])
+                next_claim = time.monotonic() + settings.STREAM_CLAIM_INTERVAL
+            
+            if not entries:
+                response = await redis_client.xreadgroup(
+                    group, consumer, {stream_key: ">"},
+                    count=pool.free, block=settings.STREAM_BLOCK_MS
+                )
+                for _, messages in response or []:
+                    entries.extend(messages)
+            
+            for entry_id, fields in entries:
+                job = {"data": None, "release": _release_stream_job(redis_client, queue_name, entry_id)}
+                in_flight[entry_id] = job
+                pool.start(entry_id, job, run_stream_job(redis_client, queue_name, entry_id, fields, job))
+                job["task"].add_done_callback(lambda _, entry_id=entry_id: in_flight.pop(entry_id, None))
+        except Exception as e:
+            logger.error(f"Error processing stream: {str(e)}")
+            await wait_for_stop(5)  # Wait a bit before retrying
+    
+    if not in_flight:
+        refresher.cancel()
+    logger.info(f"Stopped listening to stream {stream_key}")
+
+def _release_stream_job(redis_client: redis.Redis, queue_name: str, entry_id: str):
+    """Build the drain release function for a stream entry"""
+    async def release(job: Dict[str, Any]):
+        if not job["data"]:
+            # Never loaded, XAUTOCLAIM will hand it to another consumer
+            return
+        
+        # Re-add the job with its checkpoint and ack the original in one transaction
+        stream_key = get_stream_key(queue_name)
+        fields = {"data": json.dumps(job["data"])}
+        checkpoint = job["data"].get("checkpoint")
+        if checkpoint:
+            fields["checkpoint"] = json.dumps(checkpoint)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(stream_key, fields, maxlen=settings.STREAM_MAX_LEN, approximate=True)
+            pipe.xack(stream_key, settings.STREAM_CONSUMER_GROUP, entry_id)
+            pipe.xdel(stream_key, entry_id)
+            await pipe.execute()
+    return release
+
+async def run_stream_job(redis_client: redis.Redis, queue_name: str, entry_id: str,
+                         fields: Dict[str, str], job: Dict[str, Any]):
+    """Process a single stream entry and acknowledge it"""
+    stream_key = get_stream_key(queue_name)
+    job_key = get_stream_job_key(queue_name, entry_id)
+    
+    try:
+        job_data = json.loads(fields["data"])
+        if fields.get("checkpoint"):
+            # Resume from where a previous worker left off
+            job_data["checkpoint"] = json.loads(fields["checkpoint"])
+        job["data"] = job_data
+        
+        # Stream entry IDs start with the enqueue time in milliseconds
+        enqueued_at = int(entry_id.split("-")[0]) / 1000
+        error = await execute_job(redis_client, queue_name, entry_id, job_data, enqueued_at)
+        
+        entry = None
+        if error is not None:
+            attempts = await redis_client.hincrby(job_key, "attemptsMade", 1)
+            entry = build_dead_letter_entry(queue_name, entry_id, job_data, error, attempts, enqueued_at)
+        
+        status = {"status": "completed"} if error is None else {"status": "failed", "failedReason": str(error)}
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(job_key, mapping=status)
+            pipe.expire(job_key, settings.PROGRESS_STATUS_TTL)
+            pipe.xack(stream_key, settings.STREAM_CONSUMER_GROUP, entry_id)
+            if entry is not None:
+                queue_dead_letter(pipe, queue_name, entry)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Error processing stream entry {entry_id}: {str(e)}")
@@ -0,0 +1,221 @@
+import json
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.consumer import is_stopping, wait_for_stop
+from app.core.job_context import JobContext, get_job_context
+from app.core.redis_pool import get_redis_connection
+
+# Adds a job's usage to its organization's daily hash and indexes the organization
+# under the day for the flush, in one round trip. ARGV is the TTL, the organization
+# ID, then field/amount pairs.
+_RECORD_USAGE_SCRIPT = """
+for i = 3, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Counters summed as integers; everything else ("seconds:{stage}") is stage wall time
+COUNT_FIELDS = ["jobs", "failed", "pages", "bytes", "inferenceCalls", "cacheHits"]
+
+FLUSH_LOCK_KEY = "usage:flush-lock"
+
+# Columns of organization_usage_daily filled from the Redis hash
+_UPSERT_USAGE_SQL = """
+INSERT INTO organization_usage_daily
+    (organization_id, usage_date, jobs, failed_jobs, pages, bytes, inference_calls, cache_hits, stage_seconds)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9::jsonb)
+ON CONFLICT (organization_id, usage_date) DO UPDATE SET
+    jobs = EXCLUDED.jobs,
+    failed_jobs = EXCLUDED.failed_jobs,
+    pages = EXCLUDED.pages,
+    bytes = EXCLUDED.bytes,
+    inference_calls = EXCLUDED.inference_calls,
+    cache_hits = EXCLUDED.cache_hits,
+    stage_seconds = EXCLUDED.stage_seconds
+"""
+
+def get_usage_day(timestamp: Optional[float] = None) -> str:
+    """Return the UTC day usage at a time is counted under, as yyyymmdd"""
+    moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), timezone.utc)
+    return moment.strftime("%Y%m%d")
+
+def get_usage_key(organization_id: str, day: str) -> str:
+    """Return the hash of an organization's usage on a day"""
+    return f"usage:{organization_id}:{day}"
+
+def get_usage_index_key(day: str) -> str:
+    """Return the set of organizations with usage on a day"""
+    return f"usage:orgs:{day}"
+
+def count_usage(name: str, amount: float = 1):
+    """Add to a usage counter of the current job; does nothing outside of a job"""
+    context = get_job_context()
+    if context is not None:
+        context.add_usage(name, amount)
+
+async def record_usage(context: JobContext, failed: bool = False):
+    """
+    Add a finished job's usage to its organization's counters for today
+
+    A single script call, so accounting costs one round trip per job
+    whatever the number of counters. Errors are logged, never raised, so
+    accounting can't fail a job.
+    """
+    if not settings.USAGE_ENABLED or not context.organization_id:
+        return
+    usage = {**context.usage, "jobs": 1}
+    if failed:
+        usage["failed"] = 1
+    args: List[Any] = [settings.USAGE_RETENTION_DAYS * 86400, context.organization_id]
+    for name, amount in usage.items():
+        args.extend([name, amount])
+
+    day = get_usage_day()
+    try:
+        redis_client = await get_redis_connection()
+        await redis_client.eval(
+            _RECORD_USAGE_SCRIPT,
+            2,
+            get_usage_key(context.organization_id, day),
+            get_usage_index_key(day),
+            *args,
+        )
+    except Exception as e:
+        logger.error(f"Failed to record usage for organization {context.organization_id}: {str(e)}")
+
+def parse_usage(raw: Dict[str, str]) -> Dict[str, Any]:
+    """Turn a usage hash into counters plus stage seconds"""
+    usage: Dict[str, Any] = {name: int(float(raw.get(name, 0))) for name in COUNT_FIELDS}
+    usage["stageSeconds"] = {
+        name.split(":", 1)[1]: round(float(value), 3)
+        for name, value in raw.items() if name.startswith("seconds:")
+    }
+    return usage
+
+async def get_usage(redis_client: redis.Redis, organization_id: str, start: date, end: date) -> Dict[str, Any]:
+    """
+    Return an organization's usage for each day from start to end inclusive, with totals
+
+    Days without usage are left out; every day is read in one round trip.
+    """
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for day in days:
+            pipe.hgetall(get_usage_key(organization_id, day.strftime("%Y%m%d")))
+        hashes = await pipe.execute()
+
+    daily = []
+    totals: Dict[str, Any] = {name: 0 for name in COUNT_FIELDS}
+    totals["stageSeconds"] = {}
+    for day, raw in zip(days, hashes):
+        if not raw:
+            continue
+        usage = parse_usage(raw)
+        daily.append({"date": day.isoformat(), **usage})
+        for name in COUNT_FIELDS:
+            totals[name] += usage[name]
+        for stage, seconds in usage["stageSeconds"].items():
+            totals["stageSeconds"][stage] = round(totals["stageSeconds"].get(stage, 0) + seconds, 3)
+
+    return {
+        "organizationId": organization_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": daily,
+        "totals": totals,
+    }
+
+def _asyncpg():
+    """Import asyncpg only when usage is flushed to Postgres"""
+    try:
+        import asyncpg
+    except ImportError as e:
+        raise RuntimeError("Flushing usage to Postgres requires the asyncpg package") from e
+    return asyncpg
+
+async def flush_usage(redis_client: redis.Redis, pool, days: List[str]) -> int:
+    """
+    Write the usage counters of the given days to organization_usage_daily
+
+    Redis holds running totals, so rows are overwritten with the current
+    values and flushing again is harmless. Organizations that are not
+    UUIDs, or unknown to Postgres, are skipped.
+
+    Returns:
+        The number of rows written
+    """
+    written = 0
+    for day in days:
+        organization_ids = sorted(await redis_client.smembers(get_usage_index_key(day)))
+        if not organization_ids:
+            continue
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for organization_id in organization_ids:
+                pipe.hgetall(get_usage_key(organization_id, day))
+            hashes = await pipe.execute()
+
+        usage_date = datetime.strptime(day, "%Y%m%d").date()
+        async with pool.acquire() as connection:
+            for organization_id, raw in zip(organization_ids, hashes):
+                if not raw:
+                    continue
+                try:
+                    organization_uuid = uuid.UUID(organization_id)
+                except ValueError:
+                    continue
+                usage = parse_usage(raw)
+                try:
+                    await connection.execute(
+                        _UPSERT_USAGE_SQL,
+                        organization_uuid,
+                        usage_date,
+                        usage["jobs"],
+                        usage["failed"],
+                        usage["pages"],
+                        usage["bytes"],
+                        usage["inferenceCalls"],
+                        usage["cacheHits"],
+                        json.dumps(usage["stageSeconds"]),
+                    )
+                    written += 1
+                except Exception as e:
+                    logger.warning(f"Failed to flush usage of organization {organization_id} for {day}: {str(e)}")
+    return written
+
+async def run_usage_flusher():
+    """
+    Flush today's and yesterday's usage to Postgres every USAGE_FLUSH_INTERVAL seconds
+
+    Every worker runs a flusher when DATABASE_URL is set; a Redis lock held
+    for the interval lets only one of them flush each time. Yesterday is
+    flushed too, so usage counted just before midnight still lands.
+    """
+    asyncpg = _asyncpg()
+    redis_client = await get_redis_connection()
+    pool = None
+    try:
+        while not is_stopping():
+            try:
+                if await redis_client.set(FLUSH_LOCK_KEY, settings.WORKER_ID, nx=True,
+                                          ex=max(1, int(settings.USAGE_FLUSH_INTERVAL))):
+                    if pool is None:
+                        pool = await asyncpg.create_pool(settings.DATABASE_URL, min_size=1, max_size=2)
+                    now = time.time()
+                    written = await flush_usage(redis_client, pool, [get_usage_day(now - 86400), get_usage_day(now)])
+                    logger.info(f"Flushed {written} usage row(s) to Postgres")
+            except Exception as e:
+                logger.error(f"Error flushing usage: {str(e)}")
+            await wait_for_stop(settings.USAGE_FLUSH_INTERVAL)
+    finally:
+        if pool is not None:
+            await pool.close()
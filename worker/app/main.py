@@ -1,12 +1,23 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from app.core.config import settings
 from app.api.api_v1.api import api_router
-from app.core.queue import setup_queue_listeners
+from app.core.cluster import run_stalled_job_checker, start_heartbeat, stop_heartbeat
+from app.core.consumer import start_listener
+from app.core.queue import setup_queue_listeners, shutdown_queue_listeners
+from app.core.metrics import CONTENT_TYPE_LATEST, render_metrics
+from app.core.preload import preload_modules
+from app.core.redis_pool import close_redis_pool
+from app.core.usage import run_usage_flusher
+from app.services.health import run_health_prober
+from app.services.model_routing import load_routing_table, run_routing_table_reloader, warm_up_models
+from app.services.progress import progress_subscriber
+from app.services.shadow import shutdown_shadow
 
 # Load environment variables
 load_dotenv()
@@ -34,17 +45,43 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting up the worker service...")
+    # Load the model routing table and warm the models up before taking jobs
+    await load_routing_table()
+    if settings.MODEL_WARMUP_ENABLED:
+        await warm_up_models()
+    # Announce this worker before it takes jobs, so its jobs are never seen without an owner
+    await start_heartbeat()
     # Setup Redis/Bull queue listeners
     await setup_queue_listeners()
+    if settings.QUEUE_BACKEND == "bull":
+        start_listener(run_stalled_job_checker())
+    start_listener(run_routing_table_reloader())
+    start_listener(run_health_prober())
+    if settings.USAGE_ENABLED and settings.DATABASE_URL:
+        start_listener(run_usage_flusher())
+    if settings.MODULE_PRELOAD_ENABLED:
+        # Startup doesn't wait for the SDKs; a job that arrives first imports what it needs
+        asyncio.get_event_loop().run_in_executor(None, preload_modules)
     logger.info("Worker service ready!")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down the worker service...")
-    # Cleanup code here
+    # Stop dequeuing and drain in-flight jobs
+    await shutdown_queue_listeners()
+    await stop_heartbeat()
+    await shutdown_shadow()
+    await progress_subscriber.close()
+    await close_redis_pool()
+    logger.info("Worker service stopped")
 
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint"""
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
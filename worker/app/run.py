@@ -0,0 +1,199 @@
+"""
+Production entry point: a supervisor running the worker in several processes
+
+Binds the listening socket once and serves it from WORKER_PROCESSES uvicorn
+processes, each with its own event loop (uvloop), HTTP parser (httptools)
+and consumer pool. Processes that die are restarted. SIGHUP restarts them
+one at a time, each replacement serving before its predecessor drains;
+SIGTERM or SIGINT drains them all and exits. With more than one process,
+metrics are collected in prometheus_client multiprocess mode so /metrics on
+any process reports the whole host.
+
+Usage:
+    WORKER_PROCESSES=4 python -m app.run
+"""
+import importlib.util
+import multiprocessing
+import multiprocessing.synchronize
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from loguru import logger
+
+from app.core.config import settings
+
+# Seconds a process must stay up for its exit to count as a crash rather than a crash loop
+MIN_UPTIME = 5
+MAX_RESTART_DELAY = 30
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def serve(sock: socket.socket, ready):
+    """Run one uvicorn server on the shared socket; the body of each worker process"""
+    import uvicorn
+
+    async def notify_ready():
+        # Called from uvicorn's main loop, so only once startup has finished
+        ready.set()
+
+    config = uvicorn.Config(
+        "app.main:app",
+        loop="uvloop" if _has_module("uvloop") else "asyncio",
+        http="httptools" if _has_module("httptools") else "h11",
+        lifespan="on",
+        callback_notify=notify_ready,
+        timeout_notify=1,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+class Supervisor:
+    """Keeps a number of worker processes serving one socket"""
+
+    def __init__(self, processes: int, sock: socket.socket):
+        self.processes = processes
+        self.sock = sock
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[multiprocessing.Process] = []
+        # Processes asked to stop, which are left to drain rather than restarted
+        self.retiring: List[multiprocessing.Process] = []
+        self.started_at: Dict[int, float] = {}
+        self.ready: Dict[int, multiprocessing.synchronize.Event] = {}
+        self.restart_delay = 0.0
+        self.should_exit = False
+        self.should_restart = False
+
+    def spawn(self) -> multiprocessing.Process:
+        ready = self.context.Event()
+        process = self.context.Process(target=serve, args=(self.sock, ready))
+        process.start()
+        self.started_at[process.pid] = time.monotonic()
+        self.ready[process.pid] = ready
+        logger.info(f"Started worker process {process.pid}")
+        return process
+
+    def handle_signal(self, signum, frame):
+        if signum == getattr(signal, "SIGHUP", None):
+            self.should_restart = True
+        else:
+            self.should_exit = True
+
+    def reap(self, process: multiprocessing.Process):
+        """Forget an exited process and drop its live gauge values"""
+        process.join()
+        self.started_at.pop(process.pid, None)
+        self.ready.pop(process.pid, None)
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(process.pid)
+
+    def restart_all(self):
+        """Replace every process in turn, waiting for each replacement to serve before retiring the old one"""
+        logger.info(f"Restarting {len(self.workers)} worker process(es)")
+        for index, old in enumerate(list(self.workers)):
+            new = self.spawn()
+            if not self.ready[new.pid].wait(timeout=settings.MODEL_WARMUP_TIMEOUT + 30):
+                logger.warning(f"Worker process {new.pid} did not become ready, keeping {old.pid}")
+                new.terminate()
+                self.retiring.append(new)
+                continue
+            self.workers[index] = new
+            old.terminate()
+            self.retiring.append(old)
+        self.should_restart = False
+
+    def check_workers(self):
+        """Restart processes that exited unexpectedly, backing off when they keep crashing"""
+        for process in [p for p in self.retiring if not p.is_alive()]:
+            self.reap(process)
+            self.retiring.remove(process)
+
+        for index, process in enumerate(self.workers):
+            if process.is_alive():
+                continue
+            uptime = time.monotonic() - self.started_at.get(process.pid, 0)
+            self.reap(process)
+            logger.error(f"Worker process {process.pid} exited with code {process.exitcode} after {uptime:.0f}s")
+            if uptime < MIN_UPTIME:
+                self.restart_delay = min(MAX_RESTART_DELAY, max(1.0, self.restart_delay * 2))
+                time.sleep(self.restart_delay)
+            else:
+                self.restart_delay = 0.0
+            self.workers[index] = self.spawn()
+
+    def shutdown(self):
+        """Ask every process to drain and wait for them, killing any that outlive the drain timeout"""
+        processes = self.workers + self.retiring
+        logger.info(f"Stopping {len(processes)} worker process(es)")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + settings.SHUTDOWN_DRAIN_TIMEOUT + settings.JOB_TIMEOUT_GRACE
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Killing worker process {process.pid} after the drain timeout")
+                process.kill()
+                process.join()
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, getattr(signal, "SIGHUP", None)):
+            if signum is not None:
+                signal.signal(signum, self.handle_signal)
+
+        self.workers = [self.spawn() for _ in range(self.processes)]
+        try:
+            while not self.should_exit:
+                if self.should_restart:
+                    self.restart_all()
+                self.check_workers()
+                time.sleep(0.5)
+        finally:
+            self.shutdown()
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Bind the listening socket shared by every worker process"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+def setup_multiprocess_metrics() -> Optional[str]:
+    """Point prometheus_client at an empty directory shared by the worker processes"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        # Files left by a previous run would be counted again
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return None
+    path = tempfile.mkdtemp(prefix="worker-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+def main() -> int:
+    processes = settings.WORKER_PROCESSES or os.cpu_count() or 1
+    for name in ("uvloop", "httptools"):
+        if not _has_module(name):
+            logger.warning(f"{name} is not installed, falling back to the standard implementation")
+
+    # Set before any worker imports prometheus_client
+    created_dir = setup_multiprocess_metrics() if processes > 1 else None
+    sock = bind_socket(settings.HOST, settings.PORT)
+    logger.info(f"Serving on {settings.HOST}:{settings.PORT} with {processes} worker process(es)")
+    try:
+        Supervisor(processes, sock).run()
+    finally:
+        sock.close()
+        if created_dir:
+            shutil.rmtree(created_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
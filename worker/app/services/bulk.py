@@ -0,0 +1,108 @@
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict
+from loguru import logger
+
+from app.core.deadline import compute_deadline
+from app.core.job_context import JobContext, set_job_context
+from app.core.metrics import JOBS_IN_FLIGHT, record_job
+
+async def run_bulk_job(batch_id: str, index: int, job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process one document of a bulk request through the normal pipeline
+
+    Failures are reported in the returned record instead of raised, so one
+    bad document does not end the batch.
+    """
+    # Each job gets its own context, but no queue since it never went through one
+    set_job_context(JobContext(
+        document_id=job_data["documentId"],
+        organization_id=job_data["organizationId"],
+        job_id=f"bulk:{batch_id}:{index}",
+        started_at=time.time(),
+        deadline=compute_deadline(job_data),
+    ))
+
+    record: Dict[str, Any] = {
+        "index": index,
+        "documentId": job_data["documentId"],
+        "filePath": job_data["filePath"],
+    }
+    # Imported here so the API starts without loading the processing SDKs
+    from app.services.document_processor import process_document
+    
+    started = time.perf_counter()
+    JOBS_IN_FLIGHT.inc()
+    try:
+        await process_document(job_data)
+        record["status"] = "completed"
+        record["resultPath"] = (job_data.get("checkpoint") or {}).get("resultPath")
+    except Exception as e:
+        record["status"] = "failed"
+        record["errorClass"] = type(e).__name__
+        record["error"] = str(e)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+    record["duration"] = time.perf_counter() - started
+    record_job("process", record["status"], job_data["organizationId"], record["duration"])
+    return record
+
+async def process_bulk(jobs: AsyncIterator[Dict[str, Any]], concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Process a stream of jobs with at most concurrency running at once
+
+    Jobs are pulled from the iterator only as slots free up, so a manifest
+    or prefix listing of any size is consumed lazily. Results are yielded in
+    completion order, followed by a summary record. Closing the iterator
+    cancels whatever is still running.
+
+    Args:
+        jobs: Job payloads as they would appear on the queue
+        concurrency: Maximum number of documents processed at once
+
+    Yields:
+        One record per document, then {"summary": {...}}
+    """
+    batch_id = uuid.uuid4().hex[:12]
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+    summary = {"batchId": batch_id, "total": 0, "completed": 0, "failed": 0}
+
+    async def feed():
+        try:
+            index = 0
+            async for job_data in jobs:
+                await pending.put((index, job_data))
+                index += 1
+        except Exception as e:
+            logger.error(f"Error listing documents for bulk batch {batch_id}: {str(e)}")
+            await results.put({"status": "failed", "errorClass": type(e).__name__, "error": str(e)})
+        finally:
+            for _ in range(concurrency):
+                await pending.put(None)
+
+    async def work():
+        while (item := await pending.get()) is not None:
+            await results.put(await run_bulk_job(batch_id, *item))
+        await results.put(None)
+
+    logger.info(f"Starting bulk batch {batch_id} with concurrency {concurrency}")
+    tasks = [asyncio.create_task(feed())] + [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        running = concurrency
+        while running:
+            record = await results.get()
+            if record is None:
+                running -= 1
+                continue
+            if "index" in record:
+                summary["total"] += 1
+                summary[record["status"]] += 1
+            yield record
+        logger.info(f"Finished bulk batch {batch_id}: {summary}")
+        yield {"summary": summary}
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,19 +1,26 @@
 import asyncio
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List
 import os
 import tempfile
+import uuid
 from pathlib import Path
 import httpx
 from loguru import logger
-from landingai.pipeline import inference
-from PIL import Image
-import boto3
-from botocore.exceptions import ClientError
+from PIL import Image, ImageSequence
 
 from app.core.config import settings
+from app.core.job_context import JobContext, get_job_context, set_job_context
+from app.core.deadline import compute_deadline, remaining_time, stage_budget
+from app.core.metrics import track_stage
+from app.core.usage import count_usage, record_usage
+from app.services.idempotency import build_idempotency_key, claim_or_attach, complete_claim, release_claim
 from app.services.landing_ai import get_prediction_from_landingai
-from app.utils.s3 import download_file_from_s3, upload_result_to_s3
+from app.services.model_routing import select_model
+from app.services.predictions import CompactPredictions, PredictionsView
+from app.services.progress import report_progress
+from app.services.shadow import schedule_shadow
+from app.utils.s3 import download_file_from_s3, download_result_from_s3, get_object_etag, upload_result_to_s3
 
 async def process_document(job_data: Dict[str, Any]):
     """
@@ -26,9 +33,22 @@ async def process_document(job_data: Dict[str, Any]):
         "organizationId": "456",
         "filePath": "documents/org_456/doc_123.pdf",
         "contentType": "application/pdf",
-        "processingType": "certificate" | "medical_test" | "fitness_declaration"
+        "processingType": "certificate" | "medical_test" | "fitness_declaration",
+        "checkpoint": {"stage": "uploaded", "resultPath": "..."},  # optional
+        "force": false,  # optional, bypasses duplicate suppression
+        "contentHash": "..."  # optional SHA-256 of the file, used instead of its ETag
     }
+    
+    Progress is recorded in job_data["checkpoint"] so that a job released
+    during a drain can resume without paying for inference again. Jobs for
+    the same document version (documentId, file ETag, processingType) are
+    coalesced: only one runs and the others reuse its result. Each stage
+    runs within its share of the job deadline ("timeoutSeconds" or
+    "deadline" in the job data, JOB_TIMEOUT_SECONDS otherwise). Pages,
+    bytes, inference calls, cache hits and stage time are added to the
+    organization's usage once the job ends, whatever its outcome.
     """
+    failed = False
     try:
         document_id = job_data.get("documentId")
         organization_id = job_data.get("organizationId")
@@ -42,26 +62,53 @@ async def process_document(job_data: Dict[str, Any]):
         logger.info(f"Processing document {document_id} for organization {organization_id}")
         logger.info(f"File path: {file_path}, Content type: {content_type}, Processing type: {processing_type}")
         
-        # Create temporary directory for processing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Download file from S3/MinIO
-            local_file_path = Path(temp_dir) / Path(file_path).name
-            await download_file_from_s3(file_path, local_file_path)
-            
-            # Process with LandingAI based on document type
-            result = await process_with_landingai(local_file_path, processing_type)
-            
-            # Upload result to S3/MinIO
-            result_path = f"results/{organization_id}/{document_id}/analysis_result.json"
-            await upload_result_to_s3(result, result_path)
-            
-            # Notify main application about the result
-            await send_result_to_main_application(document_id, organization_id, result_path, result)
+        # Jobs from the queue already carry a context, manual calls get one here
+        if get_job_context() is None:
+            set_job_context(JobContext(
+                document_id=document_id,
+                organization_id=organization_id,
+                deadline=compute_deadline(job_data),
+            ))
+        
+        checkpoint = job_data.get("checkpoint") or {}
+        
+        # Coalesce duplicate jobs for the same version of the document
+        idempotency_key = None
+        if settings.IDEMPOTENCY_ENABLED and checkpoint.get("stage") != "uploaded" and not job_data.get("force"):
+            context = get_job_context()
+            owner = (context.job_id if context else None) or uuid.uuid4().hex
+            with track_stage("claim"):
+                # Uploads through the API already hashed the content, everything else uses the ETag
+                etag = job_data.get("contentHash") or await get_object_etag(file_path)
+                key = build_idempotency_key(document_id, etag, processing_type)
+                is_owner, existing = await claim_or_attach(key, owner, remaining_time())
             
+            if existing is not None:
+                logger.info(f"Document {document_id} was already processed by job {existing.get('jobId')}, reusing its result")
+                count_usage("cacheHits")
+                await report_progress("done", 100, status="completed")
+                return True
+            if is_owner:
+                idempotency_key = key
+        
+        try:
+            result_path = await run_document_pipeline(job_data)
+        except BaseException:
+            if idempotency_key:
+                await release_claim(idempotency_key, owner)
+            raise
+        
+        if idempotency_key:
+            await complete_claim(idempotency_key, {"jobId": owner, "resultPath": result_path})
+        
+        await report_progress("done", 100, status="completed")
         logger.info(f"Document {document_id} processed successfully")
         return True
     except Exception as e:
+        failed = True
         logger.error(f"Error processing document: {str(e)}")
+        context = get_job_context()
+        await report_progress(context.stage if context else "unknown", 100, status="failed", error=str(e))
         # Attempt to notify the main application about the failure
         try:
             if document_id and organization_id:
@@ -69,6 +116,64 @@ async def process_document(job_data: Dict[str, Any]):
         except Exception as callback_error:
             logger.error(f"Failed to send error callback: {str(callback_error)}")
         raise
+    finally:
+        context = get_job_context()
+        if context is not None:
+            await record_usage(context, failed)
+
+async def run_document_pipeline(job_data: Dict[str, Any]) -> str:
+    """
+    Run the download, inference, upload and callback stages for a job
+    
+    Returns:
+        Path of the uploaded result in S3/MinIO
+    """
+    document_id = job_data["documentId"]
+    organization_id = job_data["organizationId"]
+    file_path = job_data["filePath"]
+    processing_type = job_data.get("processingType", "certificate")
+    checkpoint = job_data.get("checkpoint") or {}
+    
+    extension = "msgpack" if settings.RESULT_FORMAT == "compact" else "json"
+    result_path = f"results/{organization_id}/{document_id}/analysis_result.{extension}"
+    
+    if checkpoint.get("stage") == "uploaded":
+        # A previous attempt already stored the result, only the callback is left
+        logger.info(f"Resuming document {document_id} from checkpoint")
+        result_path = checkpoint.get("resultPath", result_path)
+        await report_progress("download", 80)
+        async with stage_budget("download"):
+            result = await download_result_from_s3(result_path)
+    else:
+        # Create temporary directory for processing
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Download file from S3/MinIO
+            local_file_path = Path(temp_dir) / Path(file_path).name
+            await report_progress("download", 0)
+            async with stage_budget("download"):
+                await download_file_from_s3(file_path, local_file_path)
+            count_usage("bytes", local_file_path.stat().st_size)
+            
+            # Process with LandingAI based on document type
+            async with stage_budget("inference"):
+                result = await process_with_landingai(local_file_path, processing_type)
+        
+        # Upload result to S3/MinIO
+        await report_progress("upload", 80)
+        async with stage_budget("upload"):
+            await upload_result_to_s3(result, result_path)
+        job_data["checkpoint"] = {"stage": "uploaded", "resultPath": result_path}
+    
+    # Notify main application about the result
+    await report_progress("callback", 90)
+    async with stage_budget("callback"):
+        await send_result_to_main_application(document_id, organization_id, result_path, result)
+    
+    # The result is delivered, so a sampled shadow run can't delay it
+    if checkpoint.get("stage") != "uploaded":
+        schedule_shadow(job_data, result)
+    
+    return result_path
 
 async def process_with_landingai(file_path: Path, processing_type: str) -> Dict[str, Any]:
     """Process a document with LandingAI based on the document type"""
@@ -79,8 +184,18 @@ async def process_with_landingai(file_path: Path, processing_type: str) -> Dict[
         # Select the appropriate LandingAI model based on document type
         model_id = get_model_id_for_document_type(processing_type)
         
-        # Get prediction from LandingAI
-        prediction_result = await get_prediction_from_landingai(image, model_id)
+        # Get prediction from LandingAI, one page at a time for multi-page images
+        pages = getattr(image, "n_frames", 1)
+        count_usage("pages", pages)
+        await report_progress("inference", 10, page=1, pages=pages)
+        if pages == 1:
+            prediction_result = await get_prediction_from_landingai(image, model_id)
+        else:
+            page_results = []
+            for index, page in enumerate(ImageSequence.Iterator(image), start=1):
+                page_results.append(await get_prediction_from_landingai(page.copy(), model_id))
+                await report_progress("inference", 10 + (70 * index) // pages, page=index, pages=pages)
+            prediction_result = merge_page_predictions(page_results)
         
         # Extract relevant data from the prediction
         extracted_data = extract_data_from_prediction(prediction_result, processing_type)
@@ -95,16 +210,29 @@ async def process_with_landingai(file_path: Path, processing_type: str) -> Dict[
         logger.error(f"Error processing with LandingAI: {str(e)}")
         raise
 
-def get_model_id_for_document_type(processing_type: str) -> str:
-    """Return the appropriate LandingAI model ID for the document type"""
-    # These would come from your actual LandingAI models
-    model_map = {
-        "certificate": "medical-certificate-model-12345",
-        "medical_test": "medical-test-results-model-67890",
-        "fitness_declaration": "fitness-declaration-model-24680",
-    }
+def merge_page_predictions(page_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-page predictions into a single prediction, tagging each with its page"""
+    if page_results and all(isinstance(r, PredictionsView) for r in page_results):
+        return CompactPredictions.merge([r.compact for r in page_results]).view()
+    
+    predictions = []
+    for page_number, page_result in enumerate(page_results, start=1):
+        for prediction in page_result.get("predictions", []):
+            predictions.append({**prediction, "page": page_number})
     
-    return model_map.get(processing_type, model_map["certificate"])
+    return {
+        "predictions": predictions,
+        "ocrText": "\n".join(r.get("ocrText", "") for r in page_results if r.get("ocrText")),
+        "modelId": page_results[0].get("modelId") if page_results else None,
+        "imageSize": page_results[0].get("imageSize") if page_results else None,
+        "pages": len(page_results),
+    }
+
+def get_model_id_for_document_type(processing_type: str) -> str:
+    """Return the LandingAI model ID for the document type from the routing table"""
+    # Route by document so retries of a document stay on the same model version
+    context = get_job_context()
+    return select_model(processing_type, context.document_id if context else None)
 
 def extract_data_from_prediction(prediction: Dict[str, Any], processing_type: str) -> Dict[str, Any]:
     """Extract structured data from the LandingAI prediction based on document type"""
@@ -117,6 +245,8 @@ def extract_data_from_prediction(prediction: Dict[str, Any], processing_type: st
     elif processing_type == "fitness_declaration":
         return extract_fitness_declaration_data(prediction)
     else:
+        if isinstance(prediction, PredictionsView):
+            prediction = prediction.compact.to_dict()
         return {"raw": prediction}
 
 def extract_certificate_data(prediction: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,119 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from app.core.config import settings
+from app.core.consumer import is_stopping, wait_for_stop
+from app.core.metrics import COMPONENT_HEALTHY, COMPONENT_PROBE_LATENCY, is_multiprocess
+from app.core.redis_pool import get_redis_connection, update_pool_metrics
+from app.utils.s3 import get_s3_client
+
+if TYPE_CHECKING:
+    import httpx
+
+# Latest probe result per component, answered by /health/detailed without any I/O
+_results: Dict[str, Dict[str, Any]] = {}
+
+# Clients reused across probes so probing does not pay for setup every time
+_s3_client = None
+_http_client: Optional["httpx.AsyncClient"] = None
+
+async def _probe_redis():
+    redis_client = await get_redis_connection()
+    await redis_client.ping()
+
+def _head_bucket():
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = get_s3_client()
+    _s3_client.head_bucket(Bucket=settings.S3_BUCKET_NAME)
+
+async def _probe_s3():
+    # Creating the client loads boto3, so that happens on the executor too
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, _head_bucket)
+
+async def _probe_landing_ai():
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.AsyncClient(timeout=settings.HEALTH_PROBE_TIMEOUT)
+    # Any answer short of a server error means the API is reachable
+    response = await _http_client.head(settings.LANDINGAI_HEALTH_URL)
+    if response.status_code >= 500:
+        raise Exception(f"LandingAI returned {response.status_code}")
+
+PROBES: Dict[str, Callable[[], Awaitable[None]]] = {
+    "redis": _probe_redis,
+    "s3": _probe_s3,
+    "landing_ai": _probe_landing_ai,
+}
+
+async def probe_component(component: str) -> Dict[str, Any]:
+    """
+    Probe one component and cache the result
+
+    Returns:
+        {"status": "healthy" | "unhealthy" | "not_configured", "latencyMs", "checkedAt", "error"}
+    """
+    result: Dict[str, Any] = {"status": "healthy", "latencyMs": None, "checkedAt": time.time(), "error": None}
+    if component == "landing_ai" and not settings.LANDINGAI_API_KEY:
+        result["status"] = "not_configured"
+    else:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(PROBES[component](), settings.HEALTH_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            result.update(status="unhealthy", error=f"timed out after {settings.HEALTH_PROBE_TIMEOUT}s")
+        except Exception as e:
+            result.update(status="unhealthy", error=str(e))
+        latency = time.perf_counter() - started
+        result["latencyMs"] = round(latency * 1000, 2)
+        COMPONENT_PROBE_LATENCY.labels(component=component).set(latency)
+
+    if result["status"] == "unhealthy" and _results.get(component, {}).get("status") != "unhealthy":
+        logger.warning(f"Health probe for {component} failed: {result['error']}")
+    COMPONENT_HEALTHY.labels(component=component).set(result["status"] != "unhealthy")
+    _results[component] = result
+    return result
+
+async def probe_all():
+    """Probe every component concurrently"""
+    await asyncio.gather(*(probe_component(component) for component in PROBES))
+
+async def run_health_prober():
+    """Probe every component each HEALTH_PROBE_INTERVAL seconds until the worker drains"""
+    try:
+        while not is_stopping():
+            await probe_all()
+            if is_multiprocess():
+                update_pool_metrics()
+            await wait_for_stop(settings.HEALTH_PROBE_INTERVAL)
+    finally:
+        if _http_client is not None:
+            await _http_client.aclose()
+
+def get_health_snapshot() -> Dict[str, Any]:
+    """
+    Return the cached status of every component
+
+    Components never probed are "unknown" and results older than
+    HEALTH_CACHE_TTL are "stale"; either makes the overall status degraded,
+    as does an unhealthy component.
+    """
+    now = time.time()
+    components: Dict[str, Any] = {}
+    for component in PROBES:
+        result = _results.get(component)
+        if result is None:
+            components[component] = {"status": "unknown", "latencyMs": None, "checkedAt": None, "error": None}
+            continue
+        result = dict(result)
+        if now - result["checkedAt"] > settings.HEALTH_CACHE_TTL:
+            result["status"] = "stale"
+        result["age"] = round(now - result["checkedAt"], 3)
+        components[component] = result
+
+    healthy = all(c["status"] in ("healthy", "not_configured") for c in components.values())
+    return {"status": "healthy" if healthy else "degraded", "components": components}
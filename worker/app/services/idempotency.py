@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.core.redis_pool import get_redis_connection
+
+# Deletes the claim only if it is still held by the caller
+_RELEASE_CLAIM_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Takes the claim if it is free (1) or already held by the caller (2), e.g. a job
+# redelivered after its worker died or its stream entry was reclaimed
+_CLAIM_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return 2
+end
+return 0
+"""
+
+# Claims owned by this process, so local duplicates wait on a future instead of polling Redis
+_local_flights: Dict[str, asyncio.Future] = {}
+
+def build_idempotency_key(document_id: str, etag: str, processing_type: str) -> str:
+    """Build the idempotency key for processing a specific version of a document"""
+    digest = hashlib.sha256(f"{document_id}:{etag}:{processing_type}".encode()).hexdigest()
+    return f"worker:idempotency:{digest}"
+
+async def claim_or_attach(key: str, owner: str,
+                          timeout: Optional[float] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    Claim the right to process a key, or attach to whoever already has it
+    
+    Args:
+        key: Idempotency key from build_idempotency_key
+        owner: ID of the job trying to claim the key
+        timeout: Seconds left before the job deadline; at most IDEMPOTENCY_WAIT_SHARE
+            of it is spent waiting for another owner, and never more than
+            IDEMPOTENCY_WAIT_TIMEOUT, so the job still has time to process
+            the document itself
+    
+    Returns:
+        (True, None) if the caller now owns the key and must call
+        complete_claim or release_claim; (False, result) if another job
+        already produced the result; (False, None) if the owner did not
+        finish within the timeout and the caller should process the
+        document without a claim. A claim already held by the same owner
+        counts as the caller's, unless its result was published.
+    """
+    redis_client = await get_redis_connection()
+    result_key = f"{key}:result"
+    wait_timeout = settings.IDEMPOTENCY_WAIT_TIMEOUT
+    if timeout is not None:
+        wait_timeout = min(wait_timeout, timeout * settings.IDEMPOTENCY_WAIT_SHARE)
+    deadline = time.monotonic() + wait_timeout
+    
+    while time.monotonic() < deadline:
+        local_flight = _local_flights.get(key)
+        if local_flight is not None:
+            # Coalesce with the job running in this process
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.shield(local_flight), deadline - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                break
+            if result is not None:
+                return False, result
+            # The owner failed, try to claim the key ourselves
+            continue
+        
+        claimed = await redis_client.eval(_CLAIM_SCRIPT, 1, key, owner, settings.IDEMPOTENCY_CLAIM_TTL)
+        if claimed == 2:
+            # Our own earlier attempt; it may have finished before the job was redelivered
+            result = await redis_client.get(result_key)
+            if result:
+                return False, json.loads(result)
+            await redis_client.expire(key, settings.IDEMPOTENCY_CLAIM_TTL)
+        if claimed:
+            _local_flights[key] = asyncio.get_running_loop().create_future()
+            return True, None
+        
+        result = await redis_client.get(result_key)
+        if result:
+            return False, json.loads(result)
+        
+        # Another worker is processing the document, wait for its result
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+    
+    logger.warning(f"Timed out waiting for the owner of {key}, processing without a claim")
+    return False, None
+
+async def complete_claim(key: str, result: Dict[str, Any]):
+    """
+    Publish the result of a claimed key so duplicates attach to it
+
+    Called once the result is delivered, so errors are logged rather than
+    raised and can't turn the job into a failure. Local duplicates get the
+    result either way; ones on other workers stop waiting after their cap.
+    """
+    try:
+        redis_client = await get_redis_connection()
+        await redis_client.set(f"{key}:result", json.dumps(result), ex=settings.IDEMPOTENCY_RESULT_TTL)
+        # Keep the claim for as long as the result so later duplicates attach straight away
+        await redis_client.expire(key, settings.IDEMPOTENCY_RESULT_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to publish the result of idempotency claim {key}: {str(e)}")
+    finally:
+        _resolve_local_flight(key, result)
+
+async def release_claim(key: str, owner: str):
+    """Give up a claim after a failure so a duplicate can take over"""
+    try:
+        redis_client = await get_redis_connection()
+        await redis_client.eval(_RELEASE_CLAIM_SCRIPT, 1, key, owner)
+    except Exception as e:
+        # The claim expires after IDEMPOTENCY_CLAIM_TTL anyway
+        logger.warning(f"Failed to release idempotency claim {key}: {str(e)}")
+    finally:
+        _resolve_local_flight(key, None)
+
+def _resolve_local_flight(key: str, result: Optional[Dict[str, Any]]):
+    """Wake up local duplicates waiting on a claim"""
+    flight = _local_flights.pop(key, None)
+    if flight is not None and not flight.done():
+        flight.set_result(result)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+from loguru import logger
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Recordings already read from disk, by input hash
+_recordings: Dict[str, Dict[str, Any]] = {}
+
+class RecordingNotFoundError(LookupError):
+    """No recorded response exists for an inference input"""
+
+def get_input_hash(model_id: str, image: "Image.Image") -> str:
+    """Return the key of an inference input: the model plus the decoded pixels, not the file bytes"""
+    digest = hashlib.sha256()
+    digest.update(f"{model_id}\0{image.mode}\0{image.size[0]}x{image.size[1]}\0".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def _recording_path(input_hash: str) -> Path:
+    return Path(settings.LANDINGAI_RECORDINGS_DIR) / f"{input_hash}.json"
+
+def save_recording(model_id: str, image: "Image.Image", result: Dict[str, Any], latency: float) -> str:
+    """
+    Store a LandingAI response for replay
+
+    Args:
+        model_id: Model the image was run through
+        image: Input image
+        result: The response, as returned by inference_result_to_dict
+        latency: Seconds the live call took
+
+    Returns:
+        The input hash the response is stored under
+    """
+    input_hash = get_input_hash(model_id, image)
+    recording = {
+        "inputHash": input_hash,
+        "modelId": model_id,
+        "latency": latency,
+        "recordedAt": time.time(),
+        "result": result,
+    }
+    path = _recording_path(input_hash)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent replays never read a partial file
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(recording))
+    os.replace(temp_path, path)
+    _recordings[input_hash] = recording
+    logger.debug(f"Recorded LandingAI response {input_hash} for model {model_id}")
+    return input_hash
+
+def load_recording(input_hash: str) -> Optional[Dict[str, Any]]:
+    """Return the recording for an input hash, or None if there is none"""
+    recording = _recordings.get(input_hash)
+    if recording is None:
+        path = _recording_path(input_hash)
+        if not path.exists():
+            return None
+        recording = _recordings[input_hash] = json.loads(path.read_text())
+    return recording
+
+def list_recordings(model_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield stored recordings in input hash order, optionally only those of one model"""
+    for path in sorted(Path(settings.LANDINGAI_RECORDINGS_DIR).glob("*.json")):
+        recording = json.loads(path.read_text())
+        if model_id is None or recording["modelId"] == model_id:
+            yield recording
+
+def result_from_dict(data: Dict[str, Any]) -> SimpleNamespace:
+    """Rebuild an object shaped like a LandingAI InferenceResult from its dict form"""
+    predictions = []
+    for prediction in data.get("predictions", []):
+        box = prediction.get("boundingBox")
+        score = prediction.get("score")
+        predictions.append(SimpleNamespace(
+            label=prediction.get("label"),
+            score=SimpleNamespace(value=score) if score is not None else None,
+            text=prediction.get("text"),
+            bounding_box=SimpleNamespace(**box) if box else None,
+        ))
+    image_size = data.get("imageSize")
+    return SimpleNamespace(
+        predictions=predictions,
+        model_id=data.get("modelId"),
+        image_size=SimpleNamespace(**image_size) if image_size else None,
+    )
+
+def replay_inference(model_id: str, image: "Image.Image") -> SimpleNamespace:
+    """
+    Serve a recorded LandingAI response, blocking for the configured latency
+
+    Runs on an executor thread like the live call, so LANDINGAI_REPLAY_LATENCY
+    of "recorded" reproduces the concurrency profile of real traffic; "none"
+    returns at once and a number is a fixed latency in milliseconds.
+
+    Raises:
+        RecordingNotFoundError: If the input was never recorded
+    """
+    input_hash = get_input_hash(model_id, image)
+    recording = load_recording(input_hash)
+    if recording is None:
+        raise RecordingNotFoundError(f"No recorded LandingAI response for model {model_id}, input {input_hash}")
+
+    if settings.LANDINGAI_REPLAY_LATENCY == "recorded":
+        time.sleep(recording["latency"])
+    elif settings.LANDINGAI_REPLAY_LATENCY != "none":
+        time.sleep(float(settings.LANDINGAI_REPLAY_LATENCY) / 1000)
+    return result_from_dict(recording["result"])
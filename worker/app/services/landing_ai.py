@@ -1,20 +1,62 @@
-from typing import Dict, Any, Optional
+from typing import TYPE_CHECKING, Dict, Any, Optional
 import os
-from PIL import Image
+import time
 import asyncio
 from loguru import logger
-from landingai.pipeline import inference
-from landingai.common.types import BoundingBox, InferenceResult, Prediction, Score
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
 
 from app.core.config import settings
+from app.core.usage import count_usage
+from app.services.inference_replay import RecordingNotFoundError, replay_inference, save_recording
+from app.services.predictions import CompactPredictions
 
-# Configure LandingAI credentials
-os.environ["LANDINGAI_API_KEY"] = settings.LANDINGAI_API_KEY
-os.environ["LANDINGAI_CLIENT_ID"] = settings.LANDINGAI_CLIENT_ID
+if TYPE_CHECKING:
+    from landingai.common.types import InferenceResult
+    from PIL import Image
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-async def get_prediction_from_landingai(image: Image.Image, model_id: str) -> Dict[str, Any]:
+# The LandingAI SDK is imported on first use, it is the slowest import of the worker
+_inference = None
+
+def get_inference():
+    """Return the LandingAI inference module, importing and configuring it on first use"""
+    global _inference
+    if _inference is None:
+        # The SDK reads its credentials from the environment; values set there take precedence
+        for name, value in (("LANDINGAI_API_KEY", settings.LANDINGAI_API_KEY),
+                            ("LANDINGAI_CLIENT_ID", settings.LANDINGAI_CLIENT_ID)):
+            if value:
+                os.environ.setdefault(name, value)
+        from landingai.pipeline import inference
+        _inference = inference
+    return _inference
+
+def run_inference(model_id: str, image: "Image.Image"):
+    """
+    Run an image through a LandingAI model, or replay a recorded response
+    
+    Blocking; call it from an executor. LANDINGAI_MODE selects "live" calls,
+    "record" (live calls whose responses are saved by input hash) or
+    "replay" (recorded responses only, falling back to a recorded live call
+    when LANDINGAI_REPLAY_MISSING is "record").
+    """
+    if settings.LANDINGAI_MODE == "replay":
+        try:
+            return replay_inference(model_id, image)
+        except RecordingNotFoundError:
+            if settings.LANDINGAI_REPLAY_MISSING != "record":
+                raise
+    elif settings.LANDINGAI_MODE != "record":
+        return get_inference().infer(model_id=model_id, image=image)
+    
+    started = time.perf_counter()
+    result = get_inference().infer(model_id=model_id, image=image)
+    save_recording(model_id, image, inference_result_to_dict(result), time.perf_counter() - started)
+    return result
+
+# A missing recording won't appear on retry, so replay misses fail at once
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+       retry=retry_if_not_exception_type(RecordingNotFoundError))
+async def get_prediction_from_landingai(image: "Image.Image", model_id: str) -> Dict[str, Any]:
     """
     Get a prediction from LandingAI
     
@@ -26,18 +68,17 @@ async def get_prediction_from_landingai(image: Image.Image, model_id: str) -> Di
         Dict containing the prediction results
     """
     try:
+        # Every attempt is billed, retries included
+        count_usage("inferenceCalls")
         # Run in a thread pool to avoid blocking the event loop
         loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None, 
-            lambda: inference.infer(
-                model_id=model_id,
-                image=image
-            )
-        )
+        result = await loop.run_in_executor(None, run_inference, model_id, image)
         
-        # Convert the LandingAI result to a serializable dict
-        prediction_dict = inference_result_to_dict(result)
+        # Convert the LandingAI result to a dict, or a lazy view over compact columns
+        if settings.RESULT_FORMAT == "compact":
+            prediction_dict = CompactPredictions.from_result(result).view()
+        else:
+            prediction_dict = inference_result_to_dict(result)
         logger.info(f"LandingAI prediction successful for model {model_id}")
         
         return prediction_dict
@@ -45,47 +86,44 @@ async def get_prediction_from_landingai(image: Image.Image, model_id: str) -> Di
         logger.error(f"Error getting prediction from LandingAI: {str(e)}")
         raise
 
-def inference_result_to_dict(result: InferenceResult) -> Dict[str, Any]:
-    """Convert LandingAI InferenceResult to a serializable dict"""
+async def warm_up_model(model_id: str):
+    """Run a blank image through a model to absorb its cold-start latency"""
+    from PIL import Image
+    image = Image.new("RGB", (64, 64), "white")
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, run_inference, model_id, image)
+
+def inference_result_to_dict(result: "InferenceResult") -> Dict[str, Any]:
+    """Convert LandingAI InferenceResult to a serializable dict in a single pass"""
     if not result or not result.predictions:
         return {"predictions": []}
     
-    # Process each prediction
+    # Process each prediction, collecting OCR text as we go
     predictions = []
+    ocr_lines = []
     for pred in result.predictions:
-        prediction_dict = {
+        text = pred.text if hasattr(pred, 'text') else None
+        box = pred.bounding_box
+        predictions.append({
             "label": pred.label,
             "score": pred.score.value if pred.score else None,
-            "boundingBox": None,
-            "text": pred.text if hasattr(pred, 'text') else None,
-        }
-        
-        # Add bounding box if available
-        if pred.bounding_box:
-            prediction_dict["boundingBox"] = {
-                "xmin": pred.bounding_box.xmin,
-                "ymin": pred.bounding_box.ymin,
-                "xmax": pred.bounding_box.xmax,
-                "ymax": pred.bounding_box.ymax,
-            }
-        
-        predictions.append(prediction_dict)
-    
-    # Extract OCR text if available
-    ocr_text = ""
-    for pred in result.predictions:
-        if hasattr(pred, 'text') and pred.text:
-            if pred.label:
-                ocr_text += f"{pred.label}: {pred.text}\n"
-            else:
-                ocr_text += f"{pred.text}\n"
+            "boundingBox": {
+                "xmin": box.xmin,
+                "ymin": box.ymin,
+                "xmax": box.xmax,
+                "ymax": box.ymax,
+            } if box else None,
+            "text": text,
+        })
+        if text:
+            ocr_lines.append(f"{pred.label}: {text}" if pred.label else text)
     
     return {
         "predictions": predictions,
-        "ocrText": ocr_text.strip(),
+        "ocrText": "\n".join(ocr_lines).strip(),
         "modelId": result.model_id,
         "imageSize": {
             "width": result.image_size.width if result.image_size else None,
             "height": result.image_size.height if result.image_size else None,
         }
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import MODEL_REQUESTS
+from app.core.redis_pool import get_redis_connection
+from app.core.sharding import DEFAULT_PROCESSING_TYPE
+
+# Used when neither MODEL_ROUTES, MODEL_ROUTES_FILE nor Redis provide a table
+DEFAULT_ROUTES = {
+    "certificate": "medical-certificate-model-12345",
+    "medical_test": "medical-test-results-model-67890",
+    "fitness_declaration": "fitness-declaration-model-24680",
+}
+
+# Processing type -> [(model ID, weight)]
+RoutingTable = Dict[str, List[Tuple[str, float]]]
+
+_routing_table: Optional[RoutingTable] = None
+_routing_source: Optional[str] = None  # Raw table the current one was parsed from
+
+def parse_routing_table(raw: Dict[str, Any]) -> RoutingTable:
+    """
+    Validate a routing table
+
+    Each processing type maps to a model ID, or to a list of
+    {"modelId": ..., "weight": ...} entries to split traffic between model
+    versions by weight.
+
+    Raises:
+        ValueError: If the table is malformed
+    """
+    if not isinstance(raw, dict) or not raw:
+        raise ValueError("Routing table must be a non-empty object")
+
+    table: RoutingTable = {}
+    for processing_type, routes in raw.items():
+        if isinstance(routes, str):
+            routes = [{"modelId": routes, "weight": 1}]
+        if not isinstance(routes, list) or not routes:
+            raise ValueError(f"Routes for {processing_type} must be a model ID or a non-empty list")
+
+        table[processing_type] = []
+        for route in routes:
+            model_id = route.get("modelId") if isinstance(route, dict) else None
+            weight = float(route.get("weight", 1)) if isinstance(route, dict) else 0
+            if not model_id or weight < 0:
+                raise ValueError(f"Invalid route for {processing_type}: {route}")
+            table[processing_type].append((model_id, weight))
+        if not any(weight for _, weight in table[processing_type]):
+            raise ValueError(f"Routes for {processing_type} have no weight")
+
+    if DEFAULT_PROCESSING_TYPE not in table:
+        raise ValueError(f"Routing table must include {DEFAULT_PROCESSING_TYPE}")
+    return table
+
+async def _read_routing_source() -> str:
+    """Return the raw routing table from the highest priority source that has one"""
+    if settings.MODEL_ROUTES_SOURCE == "redis":
+        redis_client = await get_redis_connection()
+        raw = await redis_client.get(settings.MODEL_ROUTES_REDIS_KEY)
+        if raw:
+            return raw
+    if settings.MODEL_ROUTES_FILE:
+        with open(settings.MODEL_ROUTES_FILE) as f:
+            return f.read()
+    return json.dumps(settings.MODEL_ROUTES or DEFAULT_ROUTES)
+
+async def load_routing_table() -> RoutingTable:
+    """
+    (Re)load the routing table from its source
+
+    A table that fails to parse is rejected and the current one is kept,
+    so a bad edit cannot take the worker down.
+    """
+    global _routing_table, _routing_source
+
+    raw = await _read_routing_source()
+    if raw == _routing_source and _routing_table is not None:
+        return _routing_table
+
+    try:
+        table = parse_routing_table(json.loads(raw))
+    except (ValueError, TypeError) as e:
+        if _routing_table is None:
+            raise
+        logger.error(f"Rejected model routing table, keeping the current one: {str(e)}")
+        return _routing_table
+
+    if _routing_table is not None:
+        logger.info(f"Reloaded model routing table: {table}")
+    _routing_table, _routing_source = table, raw
+    return table
+
+def get_routing_table() -> RoutingTable:
+    """Return the current routing table, falling back to the configured one before the first load"""
+    if _routing_table is None:
+        return parse_routing_table(settings.MODEL_ROUTES or DEFAULT_ROUTES)
+    return _routing_table
+
+def select_model(processing_type: str, routing_key: Optional[str] = None) -> str:
+    """
+    Pick the model to run a document through
+
+    Args:
+        processing_type: Type of the document
+        routing_key: Keeps a document on the same model version across
+            retries when set, typically its ID; otherwise the pick is random
+
+    Returns:
+        The LandingAI model ID
+    """
+    table = get_routing_table()
+    routes = table.get(processing_type) or table[DEFAULT_PROCESSING_TYPE]
+
+    if len(routes) == 1:
+        model_id = routes[0][0]
+    else:
+        total = sum(weight for _, weight in routes)
+        if routing_key:
+            digest = hashlib.sha256(f"{processing_type}:{routing_key}".encode()).digest()
+            point = int.from_bytes(digest[:8], "big") / 2 ** 64 * total
+        else:
+            point = random.random() * total
+        model_id = routes[-1][0]
+        for candidate, weight in routes:
+            if point < weight:
+                model_id = candidate
+                break
+            point -= weight
+
+    MODEL_REQUESTS.labels(processing_type=processing_type, model_id=model_id).inc()
+    return model_id
+
+def get_routed_model_ids() -> List[str]:
+    """Return every model ID the routing table can send traffic to"""
+    model_ids = []
+    for routes in get_routing_table().values():
+        for model_id, weight in routes:
+            if weight and model_id not in model_ids:
+                model_ids.append(model_id)
+    return model_ids
+
+async def warm_up_models():
+    """
+    Send one request to every routed model so the first real job doesn't pay its cold start
+
+    Failures are logged and ignored, and the whole warm-up gives up after
+    MODEL_WARMUP_TIMEOUT seconds so a slow model cannot block startup.
+    """
+    # Imported here so loading the routing table doesn't load the LandingAI SDK
+    from app.services.landing_ai import warm_up_model
+    
+    async def warm_up(model_id: str):
+        started = time.perf_counter()
+        try:
+            await warm_up_model(model_id)
+            logger.info(f"Warmed up model {model_id} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"Failed to warm up model {model_id}: {str(e)}")
+
+    model_ids = get_routed_model_ids()
+    logger.info(f"Warming up {len(model_ids)} model(s)")
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*[warm_up(model_id) for model_id in model_ids]),
+            settings.MODEL_WARMUP_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Model warm-up did not finish within {settings.MODEL_WARMUP_TIMEOUT}s")
+
+async def run_routing_table_reloader():
+    """Reload the routing table every MODEL_ROUTES_RELOAD_INTERVAL seconds until the worker drains"""
+    # Imported here since the consumer imports the document processor, which imports this module
+    from app.core.consumer import is_stopping, wait_for_stop
+
+    while not is_stopping():
+        await wait_for_stop(settings.MODEL_ROUTES_RELOAD_INTERVAL)
+        if is_stopping():
+            break
+        try:
+            await load_routing_table()
+        except Exception as e:
+            logger.error(f"Error reloading model routing table: {str(e)}")
@@ -0,0 +1,244 @@
+import math
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterator, List, Optional
+import msgpack
+
+# Version of the encoded column layout, bumped on incompatible changes
+COMPACT_FORMAT_VERSION = 1
+
+# Content type of results stored in the compact format
+COMPACT_CONTENT_TYPE = "application/x-msgpack"
+
+_NAN = float("nan")
+_NO_BOX = (_NAN, _NAN, _NAN, _NAN)
+
+def _to_bytes(values: array) -> bytes:
+    """Serialize an array as little-endian bytes"""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_bytes(typecode: str, data: Optional[bytes]) -> Optional[array]:
+    """Inverse of _to_bytes"""
+    if data is None:
+        return None
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _optional(value: float) -> Optional[float]:
+    """Map the NaN used for missing values back to None"""
+    return None if math.isnan(value) else value
+
+class CompactPredictions:
+    """
+    LandingAI predictions stored as parallel columns
+
+    Labels, scores and texts are parallel arrays and every bounding box is
+    four consecutive float32 values in one array, NaN when the prediction
+    has no box. This is a fraction of the size of a dict per prediction and
+    encodes without walking nested objects.
+    """
+
+    def __init__(self, labels: List[Optional[str]], scores: array, texts: List[Optional[str]],
+                 boxes: array, ocr_text: str = "", model_id: Optional[str] = None,
+                 image_size: Optional[Dict[str, Any]] = None, pages: Optional[array] = None,
+                 page_count: Optional[int] = None):
+        self.labels = labels
+        self.scores = scores
+        self.texts = texts
+        self.boxes = boxes
+        self.ocr_text = ocr_text
+        self.model_id = model_id
+        self.image_size = image_size
+        self.pages = pages  # Page of each prediction, set for merged multi-page results
+        self.page_count = page_count
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def from_result(cls, result) -> "CompactPredictions":
+        """Build the columns from a LandingAI InferenceResult in a single pass"""
+        labels: List[Optional[str]] = []
+        scores = array("f")
+        texts: List[Optional[str]] = []
+        boxes = array("f")
+        ocr_lines: List[str] = []
+
+        for pred in (result.predictions if result else None) or []:
+            labels.append(pred.label)
+            scores.append(pred.score.value if pred.score else _NAN)
+            text = pred.text if hasattr(pred, 'text') else None
+            texts.append(text)
+            box = pred.bounding_box
+            boxes.extend((box.xmin, box.ymin, box.xmax, box.ymax) if box else _NO_BOX)
+            if text:
+                ocr_lines.append(f"{pred.label}: {text}" if pred.label else text)
+
+        if not labels:
+            return cls([], scores, [], boxes)
+        return cls(
+            labels, scores, texts, boxes,
+            ocr_text="\n".join(ocr_lines).strip(),
+            model_id=result.model_id,
+            image_size={
+                "width": result.image_size.width if result.image_size else None,
+                "height": result.image_size.height if result.image_size else None,
+            },
+        )
+
+    @classmethod
+    def merge(cls, page_results: List["CompactPredictions"]) -> "CompactPredictions":
+        """Concatenate per-page predictions, recording the page of each one"""
+        merged = cls([], array("f"), [], array("f"), pages=array("H"), page_count=len(page_results))
+        for page_number, page in enumerate(page_results, start=1):
+            merged.labels.extend(page.labels)
+            merged.scores.extend(page.scores)
+            merged.texts.extend(page.texts)
+            merged.boxes.extend(page.boxes)
+            merged.pages.extend([page_number] * len(page))
+        merged.ocr_text = "\n".join(page.ocr_text for page in page_results if page.ocr_text)
+        merged.model_id = page_results[0].model_id if page_results else None
+        merged.image_size = page_results[0].image_size if page_results else None
+        return merged
+
+    def prediction(self, index: int) -> Dict[str, Any]:
+        """Materialize one prediction in the dict layout of inference_result_to_dict"""
+        xmin, ymin, xmax, ymax = self.boxes[index * 4:index * 4 + 4]
+        prediction = {
+            "label": self.labels[index],
+            "score": _optional(self.scores[index]),
+            "boundingBox": None if math.isnan(xmin) else {
+                "xmin": xmin,
+                "ymin": ymin,
+                "xmax": xmax,
+                "ymax": ymax,
+            },
+            "text": self.texts[index],
+        }
+        if self.pages is not None:
+            prediction["page"] = self.pages[index]
+        return prediction
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize the full dict layout, as produced by inference_result_to_dict"""
+        result = dict(PredictionsView(self).items())
+        result["predictions"] = [self.prediction(i) for i in range(len(self))]
+        return result
+
+    def to_columns(self) -> Dict[str, Any]:
+        """Return the columns as msgpack-friendly values"""
+        return {
+            "version": COMPACT_FORMAT_VERSION,
+            "labels": self.labels,
+            "scores": _to_bytes(self.scores),
+            "texts": self.texts,
+            "boxes": _to_bytes(self.boxes),
+            "pages": _to_bytes(self.pages) if self.pages is not None else None,
+            "pageCount": self.page_count,
+            "ocrText": self.ocr_text,
+            "modelId": self.model_id,
+            "imageSize": self.image_size,
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any]) -> "CompactPredictions":
+        """Inverse of to_columns"""
+        if columns.get("version") != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact prediction version: {columns.get('version')}")
+        return cls(
+            columns["labels"],
+            _from_bytes("f", columns["scores"]),
+            columns["texts"],
+            _from_bytes("f", columns["boxes"]),
+            ocr_text=columns.get("ocrText") or "",
+            model_id=columns.get("modelId"),
+            image_size=columns.get("imageSize"),
+            pages=_from_bytes("H", columns.get("pages")),
+            page_count=columns.get("pageCount"),
+        )
+
+    def view(self) -> "PredictionsView":
+        """Return a lazy read-only dict view of the predictions"""
+        return PredictionsView(self)
+
+class _PredictionList(Sequence):
+    """Sequence of prediction dicts, each materialized when it is accessed"""
+
+    def __init__(self, compact: CompactPredictions):
+        self._compact = compact
+
+    def __len__(self) -> int:
+        return len(self._compact)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._compact.prediction(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("prediction index out of range")
+        return self._compact.prediction(index)
+
+class PredictionsView(Mapping):
+    """
+    Read-only view of CompactPredictions with the keys of inference_result_to_dict
+
+    Existing code that reads prediction dicts keeps working, and only the
+    predictions it actually touches are turned into dicts.
+    """
+
+    def __init__(self, compact: CompactPredictions):
+        self.compact = compact
+
+    def _keys(self) -> List[str]:
+        if not len(self.compact) and self.compact.page_count is None:
+            return ["predictions"]
+        keys = ["predictions", "ocrText", "modelId", "imageSize"]
+        if self.compact.page_count is not None:
+            keys.append("pages")
+        return keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys():
+            raise KeyError(key)
+        if key == "predictions":
+            return _PredictionList(self.compact)
+        if key == "ocrText":
+            return self.compact.ocr_text
+        if key == "modelId":
+            return self.compact.model_id
+        if key == "imageSize":
+            return self.compact.image_size
+        return self.compact.page_count
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+def encode_result(result: Dict[str, Any]) -> bytes:
+    """
+    Serialize a processing result with msgpack
+
+    A rawPrediction held as a PredictionsView is stored as its columns.
+    """
+    raw_prediction = result.get("rawPrediction")
+    if isinstance(raw_prediction, PredictionsView):
+        result = {**result, "rawPrediction": raw_prediction.compact.to_columns()}
+    return msgpack.packb(result, use_bin_type=True)
+
+def decode_result(body: bytes) -> Dict[str, Any]:
+    """Inverse of encode_result, with rawPrediction as a lazy PredictionsView"""
+    result = msgpack.unpackb(body, raw=False)
+    raw_prediction = result.get("rawPrediction")
+    if isinstance(raw_prediction, dict) and "version" in raw_prediction:
+        result["rawPrediction"] = CompactPredictions.from_columns(raw_prediction).view()
+    return result
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional, Set
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.job_context import get_job_context
+from app.core.redis_pool import get_pubsub_client, get_redis_connection
+
+# Statuses after which no more events are published for a document
+TERMINAL_STATUSES = ("completed", "failed")
+
+def get_progress_channel(document_id: str) -> str:
+    """Return the pub/sub channel progress events for a document are published on"""
+    return f"worker:progress:{document_id}"
+
+def get_status_key(document_id: str) -> str:
+    """Return the key holding the latest progress event for a document"""
+    return f"worker:status:{document_id}"
+
+async def report_progress(stage: str, progress: int, status: str = "processing",
+                          page: Optional[int] = None, pages: Optional[int] = None,
+                          error: Optional[str] = None):
+    """
+    Publish a progress event for the job running in the current task
+    
+    The event is written to the Bull job's progress field (Bull backend
+    only), stored as the document's latest status and published on its
+    pub/sub channel, all in one round trip. Progress reporting is best effort and never fails a job.
+    
+    Args:
+        stage: Processing stage the job is in
+        progress: Overall progress percentage (0-100)
+        status: "processing", "completed" or "failed"
+        page: Page currently being processed, for multi-page documents
+        pages: Total number of pages
+        error: Error message for failed jobs
+    """
+    context = get_job_context()
+    if context is None or not context.document_id:
+        return
+    
+    event: Dict[str, Any] = {
+        "documentId": context.document_id,
+        "organizationId": context.organization_id,
+        "jobId": context.job_id,
+        "status": status,
+        "stage": stage,
+        "progress": progress,
+        "timestamp": int(time.time() * 1000),
+    }
+    if pages:
+        event["page"] = page
+        event["pages"] = pages
+    if error:
+        event["error"] = error
+    payload = json.dumps(event)
+    
+    try:
+        redis_client = await get_redis_connection()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if settings.QUEUE_BACKEND == "bull" and context.job_id and context.queue_name:
+                # Bull reads the progress field as JSON; stream entries have no job hash to write it to
+                pipe.hset(f"bull:{context.queue_name}:{context.job_id}", "progress", progress)
+            pipe.set(get_status_key(context.document_id), payload, ex=settings.PROGRESS_STATUS_TTL)
+            pipe.publish(get_progress_channel(context.document_id), payload)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to report progress for document {context.document_id}: {str(e)}")
+
+class ProgressSubscriber:
+    """
+    One pub/sub connection shared by every progress stream of the process
+
+    Channels are subscribed while at least one stream listens to them, and
+    a single reader fans each event out to the queues of those streams, so
+    open SSE streams cost no Redis connections beyond this one.
+    """
+
+    def __init__(self):
+        self._pubsub: Optional[redis.client.PubSub] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._listeners: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def subscribe(self, document_id: str) -> asyncio.Queue:
+        """Start receiving a document's progress events, returning the queue they arrive on"""
+        if self._pubsub is None:
+            self._pubsub = get_pubsub_client().pubsub()
+        channel = get_progress_channel(document_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        listeners = self._listeners.setdefault(channel, set())
+        listeners.add(queue)
+        if len(listeners) == 1:
+            try:
+                await self._pubsub.subscribe(channel)
+            except BaseException:
+                listeners.discard(queue)
+                if not listeners:
+                    del self._listeners[channel]
+                raise
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, document_id: str, queue: asyncio.Queue):
+        """Stop delivering a document's events to a queue, dropping the subscription after the last one"""
+        channel = get_progress_channel(document_id)
+        listeners = self._listeners.get(channel)
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            del self._listeners[channel]
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe from {channel}: {str(e)}")
+
+    async def _read(self):
+        """Deliver published events to every queue listening on their channel until none are left"""
+        while self._listeners:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error reading progress events: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            for queue in self._listeners.get(message["channel"], ()):
+                queue.put_nowait(message["data"])
+
+    async def close(self):
+        """Stop the reader and close the pub/sub connection"""
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        self._listeners.clear()
+
+progress_subscriber = ProgressSubscriber()
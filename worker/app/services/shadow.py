@@ -0,0 +1,150 @@
+import asyncio
+import io
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.config import settings
+from app.core.job_context import set_job_context
+from app.core.metrics import SHADOW_COMPARISONS, SHADOW_FIELD_MISMATCHES
+from app.core.rate_limit import RateLimiter
+from app.core.redis_pool import get_redis_connection
+from app.services.landing_ai import inference_result_to_dict, run_inference
+from app.utils.s3 import get_s3_client
+
+# Shadow inference runs on its own threads so it never queues behind, or in front of, primary jobs
+_shadow_executor: Optional[ThreadPoolExecutor] = None
+_shadow_tasks: Set[asyncio.Task] = set()
+
+def get_shadow_key(processing_type: str) -> str:
+    """Return the Redis list holding shadow comparisons for a processing type"""
+    return f"worker:shadow:{processing_type}"
+
+def _get_shadow_executor() -> ThreadPoolExecutor:
+    global _shadow_executor
+    if _shadow_executor is None:
+        _shadow_executor = ThreadPoolExecutor(
+            max_workers=settings.SHADOW_CONCURRENCY, thread_name_prefix="shadow"
+        )
+    return _shadow_executor
+
+def diff_extracted_data(primary: Dict[str, Any], shadow: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return the fields whose extracted values differ, with both values"""
+    return {
+        field: {"primary": primary.get(field), "shadow": shadow.get(field)}
+        for field in sorted(set(primary) | set(shadow))
+        if primary.get(field) != shadow.get(field)
+    }
+
+def schedule_shadow(job_data: Dict[str, Any], result: Dict[str, Any]):
+    """
+    Sample a finished job for shadow inference against the candidate model
+
+    Call this only after the primary result has been delivered. The shadow
+    run happens in a background task and is skipped, never queued, when the
+    worker is already running SHADOW_CONCURRENCY shadow jobs.
+    """
+    processing_type = job_data.get("processingType", "certificate")
+    candidate = settings.SHADOW_MODELS.get(processing_type)
+    if not candidate or random.random() >= settings.SHADOW_SAMPLE_RATE:
+        return
+
+    if len(_shadow_tasks) >= settings.SHADOW_CONCURRENCY:
+        SHADOW_COMPARISONS.labels(processing_type=processing_type, model_id=candidate, outcome="skipped").inc()
+        return
+
+    task = asyncio.create_task(run_shadow(job_data, result, candidate))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+async def run_shadow(job_data: Dict[str, Any], result: Dict[str, Any], candidate: str):
+    """Run a document through the candidate model and store how its extraction differs"""
+    # Imported here since the document processor imports this module
+    from app.services.document_processor import extract_data_from_prediction
+
+    # Detach from the primary job so shadow work never touches its stage or deadline
+    set_job_context(None)
+    processing_type = job_data.get("processingType", "certificate")
+    outcome = "error"
+    try:
+        redis_client = await get_redis_connection()
+        limiter = RateLimiter(redis_client, "shadow", settings.SHADOW_RATE)
+        if await limiter.try_acquire() > 0:
+            outcome = "skipped"
+            return
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        prediction = await loop.run_in_executor(
+            _get_shadow_executor(), _run_shadow_inference, job_data["filePath"], candidate
+        )
+        duration = time.perf_counter() - started
+
+        primary_data = result.get("extractedData") or {}
+        shadow_data = extract_data_from_prediction(prediction, processing_type)
+        mismatches = diff_extracted_data(primary_data, shadow_data)
+        fields = len(set(primary_data) | set(shadow_data))
+
+        entry = {
+            "documentId": job_data.get("documentId"),
+            "organizationId": job_data.get("organizationId"),
+            "processingType": processing_type,
+            "primaryModel": (result.get("rawPrediction") or {}).get("modelId"),
+            "shadowModel": candidate,
+            "fields": fields,
+            "mismatches": mismatches,
+            "agreement": (fields - len(mismatches)) / fields if fields else 1.0,
+            "shadowDuration": duration,
+            "createdAt": int(time.time() * 1000),
+        }
+        key = get_shadow_key(processing_type)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.lpush(key, json.dumps(entry))
+            pipe.ltrim(key, 0, settings.SHADOW_MAX_LENGTH - 1)
+            await pipe.execute()
+
+        for field in mismatches:
+            SHADOW_FIELD_MISMATCHES.labels(processing_type=processing_type, model_id=candidate, field=field).inc()
+        outcome = "mismatch" if mismatches else "match"
+        logger.info(f"Shadow run of {candidate} on document {entry['documentId']}: "
+                    f"{len(mismatches)} of {fields} field(s) differ")
+    except Exception as e:
+        logger.warning(f"Shadow run of {candidate} failed: {str(e)}")
+    finally:
+        SHADOW_COMPARISONS.labels(processing_type=processing_type, model_id=candidate, outcome=outcome).inc()
+
+def _run_shadow_inference(s3_path: str, model_id: str) -> Dict[str, Any]:
+    """Download a document and run every page through a model, on a shadow thread"""
+    # Imported here since the document processor imports this module
+    from app.services.document_processor import merge_page_predictions
+    from PIL import Image, ImageSequence
+
+    response = get_s3_client().get_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_path)
+    image = Image.open(io.BytesIO(response["Body"].read()))
+
+    page_results: List[Dict[str, Any]] = [
+        inference_result_to_dict(run_inference(model_id, page.copy()))
+        for page in ImageSequence.Iterator(image)
+    ]
+    if len(page_results) == 1:
+        return page_results[0]
+    return merge_page_predictions(page_results)
+
+async def list_shadow_results(redis_client: redis.Redis, processing_type: str,
+                              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return stored shadow comparisons for a processing type, newest first"""
+    raw_entries = await redis_client.lrange(get_shadow_key(processing_type), 0, (limit or 0) - 1)
+    return [json.loads(raw) for raw in raw_entries]
+
+async def shutdown_shadow():
+    """Cancel shadow runs still in progress; they are best effort"""
+    for task in list(_shadow_tasks):
+        task.cancel()
+    if _shadow_tasks:
+        await asyncio.gather(*_shadow_tasks, return_exceptions=True)
+    if _shadow_executor is not None:
+        _shadow_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+from app.core.cluster import check_dispatch_capacity
+from app.core.config import settings
+from app.core.queue import enqueue_job
+from app.core.redis_pool import get_redis_connection
+from app.core.sharding import route_queue_name
+from app.core.streams import get_stream_job_key
+from app.services.idempotency import build_idempotency_key
+from app.services.progress import TERMINAL_STATUSES, get_status_key
+from app.utils.s3 import get_object_etag
+
+# Deletes a pending submission marker only if it still holds the given value
+_CLEAR_PENDING_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Held by the pending marker while the first submission is being enqueued
+_RESERVING = "reserving"
+_RESERVE_TIMEOUT = 5
+
+def get_submission_key(job_id: str) -> str:
+    """Return the key describing a job submitted through the API"""
+    return f"worker:submission:{job_id}"
+
+def get_document_submission_key(document_id: str) -> str:
+    """Return the key holding the ID of the latest job submitted for a document"""
+    return f"worker:submission:document:{document_id}"
+
+async def get_pending_key(job_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the key marking the queued job for a job's document version
+
+    The version is the content hash of API uploads, or the file's ETag.
+    None when duplicates are not suppressed for the job.
+    """
+    if not settings.IDEMPOTENCY_ENABLED or job_data.get("force"):
+        return None
+    try:
+        version = job_data.get("contentHash") or await get_object_etag(job_data["filePath"])
+    except Exception as e:
+        # The job reports the missing or unreadable file itself
+        logger.warning(f"Could not read the version of {job_data.get('filePath')}, not checking for duplicates: {str(e)}")
+        return None
+    key = build_idempotency_key(job_data["documentId"], version, job_data.get("processingType", "certificate"))
+    return f"{key}:pending"
+
+async def reserve_submission(redis_client: redis.Redis, pending_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Reserve the enqueue of a document version, or find the job already queued for it
+
+    A job that completed or failed no longer counts, so the document can be
+    submitted again once the earlier job is done.
+
+    Returns:
+        The status of the queued or running job for the same version, or
+        None once the caller holds the reservation and must enqueue
+    """
+    deadline = time.monotonic() + _RESERVE_TIMEOUT
+    while time.monotonic() < deadline:
+        if await redis_client.set(pending_key, _RESERVING, nx=True, ex=_RESERVE_TIMEOUT):
+            return None
+        job_id = await redis_client.get(pending_key)
+        if job_id == _RESERVING:
+            # A concurrent submission is enqueuing the same version
+            await asyncio.sleep(0.05)
+            continue
+        if job_id is None:
+            continue
+        status = await get_job_status(job_id)
+        if status is not None and status["status"] not in TERMINAL_STATUSES:
+            return status
+        await redis_client.eval(_CLEAR_PENDING_SCRIPT, 1, pending_key, job_id)
+    # The concurrent enqueue is stuck; enqueue without suppression
+    return None
+
+async def submit_job(job_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Enqueue a job for the queue listeners and remember it for status lookups
+
+    With DISPATCH_REQUIRE_CONSUMERS the job is only enqueued while a live
+    worker consumes the queue (or shard) it is routed to, and the returned
+    capacity tells the caller how busy that queue is. While a job for the
+    same document version is queued or running, its submission is returned
+    with "duplicate": true instead of enqueuing another one.
+
+    Returns:
+        The submission record, including the job ID
+
+    Raises:
+        NoConsumersError: If no live worker would pick the job up
+    """
+    redis_client = await get_redis_connection()
+    capacity = None
+    if settings.DISPATCH_REQUIRE_CONSUMERS:
+        capacity = await check_dispatch_capacity(
+            redis_client, route_queue_name(settings.DOCUMENT_QUEUE_NAME, job_data)
+        )
+
+    pending_key = await get_pending_key(job_data)
+    if pending_key:
+        existing = await reserve_submission(redis_client, pending_key)
+        if existing is not None:
+            return {**existing, "duplicate": True}
+    try:
+        job_id = await enqueue_job(redis_client, settings.DOCUMENT_QUEUE_NAME, job_data)
+    except BaseException:
+        if pending_key:
+            await redis_client.eval(_CLEAR_PENDING_SCRIPT, 1, pending_key, _RESERVING)
+        raise
+
+    submission = {
+        "jobId": job_id,
+        "documentId": job_data.get("documentId"),
+        "organizationId": job_data.get("organizationId"),
+        "processingType": job_data.get("processingType"),
+        "submittedAt": int(time.time() * 1000),
+    }
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(get_submission_key(job_id), json.dumps(submission), ex=settings.PROGRESS_STATUS_TTL)
+        pipe.set(get_document_submission_key(submission["documentId"]), job_id, ex=settings.PROGRESS_STATUS_TTL)
+        await pipe.execute()
+    if pending_key:
+        # After the submission, so a duplicate that reads the job ID can look it up
+        await redis_client.set(pending_key, job_id, ex=settings.PROGRESS_STATUS_TTL)
+    if capacity is not None:
+        return {**submission, "capacity": capacity}
+    return submission
+
+async def get_queue_job_state(redis_client: redis.Redis, job_id: str, submission: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the state the queue backend recorded for a submitted job
+
+    Bull jobs are looked up under the parent queue and, once the router has
+    moved them, under their shard queue; stream jobs under the queue they
+    were added to.
+
+    Returns:
+        {"status"} with "queued", "processing", "completed" or "failed", and
+        "error" for failed jobs
+    """
+    queue_name = route_queue_name(settings.DOCUMENT_QUEUE_NAME, submission)
+    if settings.QUEUE_BACKEND == "streams":
+        status, failed_reason = await redis_client.hmget(get_stream_job_key(queue_name, job_id), "status", "failedReason")
+        processed_by = None
+    else:
+        queue_names = [settings.DOCUMENT_QUEUE_NAME]
+        if queue_name != settings.DOCUMENT_QUEUE_NAME:
+            queue_names.append(queue_name)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for name in queue_names:
+                pipe.hmget(f"bull:{name}:{job_id}", "status", "failedReason", "processedBy")
+            hashes = await pipe.execute()
+        status, failed_reason, processed_by = next(
+            (fields for fields in hashes if any(fields)), (None, None, None)
+        )
+
+    state: Dict[str, Any] = {"status": status or ("processing" if processed_by else "queued")}
+    if state["status"] == "failed" and failed_reason:
+        state["error"] = failed_reason
+    return state
+
+async def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the status of a submitted job, or None if it is unknown or expired
+
+    The latest progress event of the document is used when it belongs to
+    this job. Otherwise, for a job that has not reported progress yet, was
+    superseded by a later submission for the document, or failed before
+    reporting anything, the state recorded by the queue backend is used.
+    """
+    redis_client = await get_redis_connection()
+    submission = await redis_client.get(get_submission_key(job_id))
+    if submission is None:
+        return None
+    submission = json.loads(submission)
+
+    latest = await redis_client.get(get_status_key(submission["documentId"]))
+    event = json.loads(latest) if latest else None
+    if event is None or str(event.get("jobId")) != job_id:
+        state = await get_queue_job_state(redis_client, job_id, submission)
+        progress = 100 if state["status"] in TERMINAL_STATUSES else 0
+        return {**submission, "stage": None, "progress": progress, **state}
+
+    status = {**submission, **event}
+    status["jobId"] = job_id
+    return status
+
+async def get_latest_job_id(document_id: str) -> Optional[str]:
+    """Return the ID of the latest job submitted through the API for a document, if any"""
+    redis_client = await get_redis_connection()
+    return await redis_client.get(get_document_submission_key(document_id))
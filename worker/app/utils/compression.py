@@ -0,0 +1,37 @@
+import gzip
+from typing import Optional
+
+def _zstd():
+    """Import zstandard only when zstd is actually used"""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd compression requires the zstandard package") from e
+    return zstandard
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Compress a body for storage with the given Content-Encoding
+
+    Args:
+        body: Bytes to compress
+        encoding: "gzip" or "zstd"
+        level: Compression level, the codec's default when None
+
+    Raises:
+        ValueError: If the encoding is not supported
+    """
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6 if level is None else level)
+    if encoding == "zstd":
+        return _zstd().ZstdCompressor(level=3 if level is None else level).compress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    """Undo compress for a body stored with the given Content-Encoding"""
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "zstd":
+        # Frames written by ZstdCompressor.compress carry their size, but streamed ones may not
+        return _zstd().ZstdDecompressor().decompressobj().decompress(body)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
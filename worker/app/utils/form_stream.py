@@ -0,0 +1,128 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import Request
+
+from app.utils.s3 import S3StreamingUpload
+
+# Largest accepted value of a non-file form field
+MAX_FIELD_SIZE = 64 * 1024
+
+class FormStreamError(ValueError):
+    """The request body is not a form this endpoint can stream"""
+
+async def stream_form_file_to_s3(
+    request: Request,
+    file_field: str,
+    build_s3_path: Callable[[Dict[str, str], str], str],
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    Parse a multipart/form-data request while piping its file straight to S3/MinIO
+
+    The body is read chunk by chunk and the file part is handed to an
+    S3StreamingUpload as it arrives. Memory use stays around one multipart
+    part regardless of the file size, and nothing is written to disk. Form
+    fields the S3 path depends on must come before the file part.
+
+    Args:
+        request: Incoming request
+        file_field: Name of the form field holding the file
+        build_s3_path: Returns the S3 path from the fields parsed so far and the file name
+
+    Returns:
+        (form fields, file info with s3Path, filename, contentType, size and sha256)
+
+    Raises:
+        FormStreamError: If the body is not multipart/form-data, has no file, or a field is too large
+    """
+    # Imported on first upload to keep it off the startup path
+    from multipart.multipart import MultipartParser, parse_options_header
+    
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise FormStreamError("Expected a multipart/form-data body")
+
+    fields: Dict[str, str] = {}
+    file_info: Dict[str, Any] = {}
+    # Parser callbacks are synchronous, so they queue events that are handled after each chunk
+    events: List[Tuple[str, Any]] = []
+    part: Dict[str, Any] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, value=bytearray(), is_file=False)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        part["headers"][bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = options.get(b"name", b"").decode()
+        if part["name"] == file_field and b"filename" in options:
+            part["is_file"] = True
+            events.append(("file_start", (
+                options[b"filename"].decode(),
+                part["headers"].get(b"content-type", b"").decode() or None,
+            )))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part["is_file"]:
+            events.append(("file_data", bytes(data[start:end])))
+            return
+        part["value"].extend(data[start:end])
+        if len(part["value"]) > MAX_FIELD_SIZE:
+            raise FormStreamError(f"Form field {part['name']} is too large")
+
+    def on_part_end():
+        if part["is_file"]:
+            events.append(("file_end", None))
+        else:
+            try:
+                fields[part["name"]] = part["value"].decode()
+            except UnicodeDecodeError:
+                raise FormStreamError(f"Form field {part['name']} is not valid UTF-8")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+
+    upload: Optional[S3StreamingUpload] = None
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, payload in events:
+                if kind == "file_start":
+                    if upload is not None:
+                        raise FormStreamError(f"Only one {file_field} file is accepted")
+                    filename, file_content_type = payload
+                    s3_path = build_s3_path(fields, filename)
+                    upload = S3StreamingUpload(s3_path, file_content_type)
+                    file_info.update(s3Path=s3_path, filename=filename, contentType=file_content_type)
+                elif kind == "file_data":
+                    await upload.write(payload)
+                else:
+                    file_info["size"], file_info["sha256"] = await upload.complete()
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if upload is not None and "sha256" not in file_info:
+            await upload.abort()
+        raise
+
+    if "sha256" not in file_info:
+        raise FormStreamError(f"Missing {file_field} file")
+    return fields, file_info
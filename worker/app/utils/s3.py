@@ -1,15 +1,23 @@
 import json
 import asyncio
-from typing import Dict, Any, Optional, Union
+import hashlib
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple, Union
 from pathlib import Path
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
 
 from app.core.config import settings
+from app.services.predictions import COMPACT_CONTENT_TYPE, decode_result, encode_result
+from app.utils.compression import compress, decompress
+
+def _client_error():
+    """Return botocore's ClientError, imported on first use like boto3"""
+    from botocore.exceptions import ClientError
+    return ClientError
 
 def get_s3_client():
     """Get a boto3 S3 client configured for MinIO/S3"""
+    # Imported on first use, boto3 is one of the slowest imports at startup
+    import boto3
     return boto3.client(
         's3',
         endpoint_url=settings.S3_ENDPOINT,
@@ -48,16 +56,176 @@ async def download_file_from_s3(s3_path: str, local_path: Union[str, Path]) -> b
         await loop.run_in_executor(None, _download)
         logger.info(f"Downloaded {s3_path} to {local_path}")
         return True
-    except ClientError as e:
+    except _client_error() as e:
         logger.error(f"Error downloading file from S3: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Unexpected error downloading file: {str(e)}")
         raise
 
+class S3StreamingUpload:
+    """
+    Upload a stream of chunks to S3/MinIO with bounded memory
+    
+    Chunks are buffered until a part is full and each part is sent with a
+    multipart upload, so at most one part is held in memory. Uploads smaller
+    than one part are sent with a single put_object. A SHA-256 of the content
+    is computed in the same pass. All boto3 calls and hashing run in the
+    executor, so the event loop is never blocked.
+    """
+    
+    def __init__(self, s3_path: str, content_type: Optional[str] = None,
+                 part_size: Optional[int] = None):
+        """
+        Args:
+            s3_path: Path in S3/MinIO to upload to
+            content_type: MIME type of the content
+            part_size: Bytes per multipart part, at least 5 MB; defaults to S3_UPLOAD_PART_SIZE
+        """
+        self.s3_path = s3_path
+        self.content_type = content_type or "application/octet-stream"
+        self.part_size = max(part_size or settings.S3_UPLOAD_PART_SIZE, 5 * 1024 * 1024)
+        self.size = 0
+        self._buffer = bytearray()
+        self._hasher = hashlib.sha256()
+        self._s3_client = None
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+    
+    async def _run(self, fn, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, fn, *args)
+    
+    def _client(self):
+        # One client per upload; boto3 clients are thread-safe and expensive to create
+        if self._s3_client is None:
+            self._s3_client = get_s3_client()
+        return self._s3_client
+    
+    def _upload_part(self, part: bytes):
+        if self._upload_id is None:
+            self._upload_id = self._client().create_multipart_upload(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=self.s3_path,
+                ContentType=self.content_type
+            )["UploadId"]
+        self._hasher.update(part)
+        part_number = len(self._parts) + 1
+        response = self._client().upload_part(
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=self.s3_path,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=part
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+    
+    def _complete(self, last_part: bytes):
+        if self._upload_id is None:
+            # Everything fit in one part
+            self._hasher.update(last_part)
+            self._client().put_object(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=self.s3_path,
+                Body=last_part,
+                ContentType=self.content_type
+            )
+            return
+        if last_part:
+            self._upload_part(last_part)
+        self._client().complete_multipart_upload(
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=self.s3_path,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts}
+        )
+    
+    async def write(self, data: bytes):
+        """Add a chunk, uploading a part once enough data is buffered"""
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            await self._run(self._upload_part, part)
+    
+    async def complete(self) -> Tuple[int, str]:
+        """
+        Finish the upload
+        
+        Returns:
+            (size in bytes, SHA-256 hex digest of the content)
+        """
+        last_part, self._buffer = bytes(self._buffer), bytearray()
+        await self._run(self._complete, last_part)
+        logger.info(f"Streamed {self.size} bytes to {self.s3_path}")
+        return self.size, self._hasher.hexdigest()
+    
+    async def abort(self):
+        """Discard the parts uploaded so far"""
+        if self._upload_id is None:
+            return
+        try:
+            await self._run(lambda: self._client().abort_multipart_upload(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=self.s3_path,
+                UploadId=self._upload_id
+            ))
+        except _client_error() as e:
+            logger.error(f"Error aborting multipart upload to {self.s3_path}: {str(e)}")
+
+async def list_s3_keys(prefix: str) -> AsyncIterator[str]:
+    """
+    Yield the keys of every object under a prefix in S3/MinIO
+    
+    Keys are listed one page (up to 1000 keys) at a time, so huge prefixes
+    are never held in memory at once.
+    """
+    loop = asyncio.get_event_loop()
+    s3_client = get_s3_client()
+    kwargs = {"Bucket": settings.S3_BUCKET_NAME, "Prefix": prefix}
+    while True:
+        response = await loop.run_in_executor(None, lambda: s3_client.list_objects_v2(**kwargs))
+        for item in response.get("Contents", []):
+            if not item["Key"].endswith("/"):
+                yield item["Key"]
+        if not response.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+async def get_object_etag(s3_path: str) -> str:
+    """
+    Get the ETag of an object in S3/MinIO without downloading it
+    
+    Args:
+        s3_path: Path to the file in S3/MinIO
+    
+    Returns:
+        The object's ETag
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        
+        def _head():
+            s3_client = get_s3_client()
+            return s3_client.head_object(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=s3_path
+            )
+        
+        response = await loop.run_in_executor(None, _head)
+        return response["ETag"].strip('"')
+    except _client_error() as e:
+        logger.error(f"Error reading object metadata from S3: {str(e)}")
+        raise
+
 async def upload_result_to_s3(result: Dict[str, Any], s3_path: str) -> bool:
     """
-    Upload a JSON result to S3/MinIO
+    Upload a result to S3/MinIO
+    
+    Results are stored as JSON, or with RESULT_FORMAT=compact as msgpack
+    with the predictions in columns, and compressed with RESULT_COMPRESSION
+    under the matching Content-Encoding.
     
     Args:
         result: The result dict to upload
@@ -67,27 +235,72 @@ async def upload_result_to_s3(result: Dict[str, Any], s3_path: str) -> bool:
         True if successful, False otherwise
     """
     try:
-        # Convert result to JSON
-        result_json = json.dumps(result)
-        
         # Upload asynchronously
         loop = asyncio.get_event_loop()
         
         def _upload():
+            # Serializing and compressing large results is CPU-bound, so it stays off the event loop
+            if settings.RESULT_FORMAT == "compact":
+                body, content_type = encode_result(result), COMPACT_CONTENT_TYPE
+            else:
+                body, content_type = json.dumps(result).encode(), 'application/json'
+            
+            extra = {}
+            if settings.RESULT_COMPRESSION != "none":
+                body = compress(body, settings.RESULT_COMPRESSION, settings.RESULT_COMPRESSION_LEVEL)
+                extra["ContentEncoding"] = settings.RESULT_COMPRESSION
+            
             s3_client = get_s3_client()
             s3_client.put_object(
                 Bucket=settings.S3_BUCKET_NAME,
                 Key=s3_path,
-                Body=result_json,
-                ContentType='application/json'
+                Body=body,
+                ContentType=content_type,
+                **extra
             )
         
         await loop.run_in_executor(None, _upload)
         logger.info(f"Uploaded result to {s3_path}")
         return True
-    except ClientError as e:
+    except _client_error() as e:
         logger.error(f"Error uploading result to S3: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Unexpected error uploading result: {str(e)}")
+        raise
+
+async def download_result_from_s3(s3_path: str) -> Dict[str, Any]:
+    """
+    Download a result from S3/MinIO, decompressing it per its Content-Encoding
+    
+    Args:
+        s3_path: Path of the result in S3/MinIO
+    
+    Returns:
+        The parsed result dict; compact results come back with a lazy rawPrediction view
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        
+        def _download():
+            s3_client = get_s3_client()
+            response = s3_client.get_object(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=s3_path
+            )
+            body = response["Body"].read()
+            if response.get("ContentEncoding"):
+                body = decompress(body, response["ContentEncoding"])
+            if response.get("ContentType") == COMPACT_CONTENT_TYPE:
+                return decode_result(body)
+            return json.loads(body)
+        
+        result = await loop.run_in_executor(None, _download)
+        logger.info(f"Downloaded result from {s3_path}")
+        return result
+    except _client_error() as e:
+        logger.error(f"Error downloading result from S3: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error downloading result: {str(e)}")
         raise
\ No newline at end of file
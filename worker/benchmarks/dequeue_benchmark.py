@@ -0,0 +1,89 @@
+"""
+Benchmark per-job dequeue overhead against a local Redis
+
+Compares the original one-job-at-a-time dequeue (RPOPLPUSH followed by a
+separate HMGET) with the batched Lua dequeue used by the Bull listener.
+
+Usage:
+    python -m benchmarks.dequeue_benchmark --jobs 5000 --batch-sizes 1 4 16 64
+"""
+import argparse
+import asyncio
+import json
+import time
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.core.queue import dequeue_bull_jobs
+
+QUEUE_NAME = "dequeue-benchmark"
+
+async def seed_jobs(redis_client: redis.Redis, count: int):
+    """Create count Bull-style jobs in the wait list"""
+    await cleanup(redis_client)
+    payload = json.dumps({"type": "process", "documentId": "bench", "organizationId": "bench",
+                          "filePath": "documents/bench.png"})
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for job_id in range(1, count + 1):
+            pipe.hset(f"bull:{QUEUE_NAME}:{job_id}", mapping={"data": payload, "timestamp": int(time.time() * 1000)})
+            pipe.lpush(f"bull:{QUEUE_NAME}:wait", job_id)
+        await pipe.execute()
+
+async def cleanup(redis_client: redis.Redis):
+    """Remove every key written by the benchmark"""
+    keys = [key async for key in redis_client.scan_iter(f"bull:{QUEUE_NAME}:*")]
+    if keys:
+        await redis_client.delete(*keys)
+
+async def dequeue_single(redis_client: redis.Redis) -> int:
+    """Drain the queue the way the listener originally did"""
+    dequeued = 0
+    while True:
+        job_id = await redis_client.rpoplpush(f"bull:{QUEUE_NAME}:wait", f"bull:{QUEUE_NAME}:active")
+        if not job_id:
+            return dequeued
+        await redis_client.hmget(f"bull:{QUEUE_NAME}:{job_id}", "data", "timestamp", "checkpoint")
+        dequeued += 1
+
+async def dequeue_batched(redis_client: redis.Redis, batch_size: int) -> int:
+    """Drain the queue with the batched Lua dequeue"""
+    dequeued = 0
+    while True:
+        jobs = await dequeue_bull_jobs(redis_client, QUEUE_NAME, batch_size)
+        if not jobs:
+            return dequeued
+        dequeued += len(jobs)
+
+async def main(job_count: int, batch_sizes):
+    redis_client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        db=settings.REDIS_DB,
+        decode_responses=True
+    )
+    try:
+        print(f"{'mode':<16}{'jobs':>8}{'total (s)':>12}{'per job (us)':>15}")
+        
+        await seed_jobs(redis_client, job_count)
+        start = time.perf_counter()
+        dequeued = await dequeue_single(redis_client)
+        elapsed = time.perf_counter() - start
+        print(f"{'rpoplpush+hmget':<16}{dequeued:>8}{elapsed:>12.3f}{elapsed / dequeued * 1e6:>15.1f}")
+        
+        for batch_size in batch_sizes:
+            await seed_jobs(redis_client, job_count)
+            start = time.perf_counter()
+            dequeued = await dequeue_batched(redis_client, batch_size)
+            elapsed = time.perf_counter() - start
+            print(f"{f'lua batch={batch_size}':<16}{dequeued:>8}{elapsed:>12.3f}{elapsed / dequeued * 1e6:>15.1f}")
+    finally:
+        await cleanup(redis_client)
+        await redis_client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=5000, help="Jobs to enqueue per run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+    asyncio.run(main(args.jobs, args.batch_sizes))
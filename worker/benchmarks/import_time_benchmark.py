@@ -0,0 +1,96 @@
+"""
+Benchmark cold-start import time of the worker service
+
+Imports app.main in fresh interpreters and reports the median wall time,
+the slowest packages under -X importtime, and any module from LAZY_MODULES
+that was loaded anyway. Exits non-zero when the median goes over
+--max-seconds, a lazy module is imported at startup, or importing the app
+changes os.environ (beyond the keys load_dotenv reads from .env), so it
+can gate CI.
+
+Usage:
+    python -m benchmarks.import_time_benchmark --runs 5 --max-seconds 1.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from app.core.preload import LAZY_MODULES
+
+# Runs in a fresh interpreter so nothing is cached from this process
+PROBE = """
+import json, os, sys, time
+environ = dict(os.environ)
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": [name for name in {lazy_modules!r} if name in sys.modules],
+    "environ": sorted(key for key in set(environ) | set(os.environ) if environ.get(key) != os.environ.get(key)),
+}}))
+"""
+
+def measure(module: str, importtime: bool = False):
+    """Import module in a fresh interpreter, returning the probe report and -X importtime output"""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []),
+               "-c", PROBE.format(module=module, lazy_modules=LAZY_MODULES)]
+    completed = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+def slowest_packages(importtime_output: str, count: int):
+    """Return the packages with the highest cumulative import time, in microseconds"""
+    packages = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # The outermost import of a package carries the cumulative time of all of it
+        package = name.strip().split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return sorted(((cumulative, package) for package, cumulative in packages.items()), reverse=True)[:count]
+
+def dotenv_keys(path: str = ".env"):
+    """Return the keys set in the .env file, which load_dotenv is expected to add to os.environ"""
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.split("=", 1)[0].strip() for line in f if "=" in line and not line.lstrip().startswith("#")}
+
+def main(module: str, runs: int, max_seconds: float, top: int) -> int:
+    reports = [measure(module)[0] for _ in range(runs)]
+    median = statistics.median(report["seconds"] for report in reports)
+    print(f"import {module}: median {median * 1000:.0f}ms over {runs} run(s) "
+          f"(min {min(r['seconds'] for r in reports) * 1000:.0f}ms, max {max(r['seconds'] for r in reports) * 1000:.0f}ms)")
+
+    _, importtime_output = measure(module, importtime=True)
+    print(f"{'cumulative ms':>14}  package")
+    for cumulative, name in slowest_packages(importtime_output, top):
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+
+    failures = []
+    if median > max_seconds:
+        failures.append(f"median import time {median:.3f}s is over {max_seconds:.3f}s")
+    loaded = sorted({name for report in reports for name in report["loaded"]})
+    if loaded:
+        failures.append(f"lazy modules imported at startup: {', '.join(loaded)}")
+    changed = sorted({key for report in reports for key in report["environ"]} - dotenv_keys())
+    if changed:
+        failures.append(f"importing changed os.environ: {', '.join(changed)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time, the median is reported")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="Largest acceptable median import time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list")
+    args = parser.parse_args()
+    sys.exit(main(args.module, args.runs, args.max_seconds, args.top))
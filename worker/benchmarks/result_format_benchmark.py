@@ -0,0 +1,101 @@
+"""
+Benchmark result size and encode/decode time, JSON vs compact
+
+Builds a synthetic dense OCR inference result and compares the current
+path (inference_result_to_dict + json.dumps) against the compact columnar
+format (CompactPredictions + msgpack), each uncompressed and with every
+RESULT_COMPRESSION codec available. Compact decode times are for the lazy
+view, before any prediction is materialized.
+
+Usage:
+    python -m benchmarks.result_format_benchmark --predictions 100 1000 10000
+"""
+import argparse
+import json
+import random
+import string
+import time
+from types import SimpleNamespace
+
+from app.services.landing_ai import inference_result_to_dict
+from app.services.predictions import CompactPredictions, decode_result, encode_result
+from app.utils.compression import compress, decompress
+
+LABELS = ["patientName", "doctorName", "issueDate", "expiryDate", "diagnosis", "word"]
+
+def build_result(count: int) -> SimpleNamespace:
+    """Build an object shaped like a LandingAI InferenceResult with count OCR predictions"""
+    rng = random.Random(count)
+    predictions = []
+    for _ in range(count):
+        x, y = rng.uniform(0, 2000), rng.uniform(0, 3000)
+        predictions.append(SimpleNamespace(
+            label=rng.choice(LABELS),
+            score=SimpleNamespace(value=rng.random()),
+            text="".join(rng.choices(string.ascii_letters, k=rng.randint(3, 12))),
+            bounding_box=SimpleNamespace(xmin=x, ymin=y, xmax=x + rng.uniform(10, 200), ymax=y + rng.uniform(10, 40)),
+        ))
+    return SimpleNamespace(
+        predictions=predictions,
+        model_id="benchmark-model",
+        image_size=SimpleNamespace(width=2000, height=3000),
+    )
+
+def available_encodings():
+    """Return the compression codecs installed here"""
+    encodings = ["gzip"]
+    try:
+        import zstandard  # noqa: F401
+        encodings.append("zstd")
+    except ImportError:
+        pass
+    return encodings
+
+def measure(fn, repeat: int) -> float:
+    """Return the best wall-clock time of fn over repeat runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main(counts, repeat: int):
+    print(f"{'predictions':>11}  {'format':<14}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+    for count in counts:
+        inference_result = build_result(count)
+        wrap = lambda prediction: {"status": "success", "extractedData": {}, "rawPrediction": prediction}
+
+        formats = {
+            "json": (
+                lambda: json.dumps(wrap(inference_result_to_dict(inference_result))).encode(),
+                json.loads,
+            ),
+            "compact": (
+                lambda: encode_result(wrap(CompactPredictions.from_result(inference_result).view())),
+                decode_result,
+            ),
+        }
+
+        rows = []
+        for name, (encode, decode) in formats.items():
+            body = encode()
+            rows.append((name, len(body), measure(encode, repeat), measure(lambda: decode(body), repeat)))
+            for encoding in available_encodings():
+                compressed = compress(body, encoding)
+                rows.append((
+                    f"{name}+{encoding}",
+                    len(compressed),
+                    measure(lambda: compress(encode(), encoding), repeat),
+                    measure(lambda: decode(decompress(compressed, encoding)), repeat),
+                ))
+        for name, size, encode_ms, decode_ms in rows:
+            print(f"{count:>11}  {name:<14}{size:>12}{encode_ms:>12.2f}{decode_ms:>12.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--predictions", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Predictions per result")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the best is reported")
+    args = parser.parse_args()
+    main(args.predictions, args.repeat)
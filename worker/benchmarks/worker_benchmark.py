@@ -0,0 +1,346 @@
+"""
+End-to-end worker throughput benchmark with local stand-ins
+
+Enqueues jobs on a Bull queue and drives them through listen_to_bull_queue
+and process_document exactly as the worker does, with LandingAI replaced
+by a mock that sleeps for a configurable latency and fails at a given rate,
+S3 by an in-memory store (or the MinIO/S3 in .env), the callback endpoint
+by a local HTTP server, and Redis by the one in .env (or fakeredis, which
+needs `pip install fakeredis[lua]` for the queue scripts).
+
+Reports jobs/s, per-stage latency percentiles, queue wait and end-to-end
+job duration, and peak memory. --json saves the report and --baseline
+compares against a saved one, exiting non-zero on a regression.
+
+Latency distributions are fixed:MS, uniform:LOW_MS,HIGH_MS or
+lognormal:MEDIAN_MS,SIGMA.
+
+Usage:
+    python -m benchmarks.worker_benchmark --jobs 200 --concurrency 8 \\
+        --inference-latency lognormal:800,0.4 --error-rate 0.01
+    python -m benchmarks.worker_benchmark --redis fake --json baseline.json
+    python -m benchmarks.worker_benchmark --redis fake --baseline baseline.json
+    python -m benchmarks.worker_benchmark --redis fake --inference replay
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+import redis.asyncio as redis
+from botocore.exceptions import ClientError
+from loguru import logger
+from PIL import Image
+
+from app.core import consumer, metrics, redis_pool
+from app.core.config import settings
+from app.core.consumer import ConsumerPool, drain_consumers, start_listener
+from app.core.dead_letter import get_dead_letter_key
+from app.core.queue import enqueue_bull_job, listen_to_bull_queue
+from app.core.redis_pool import close_redis_pool, get_redis_connection
+from app.services import landing_ai
+from app.utils import s3
+from benchmarks.result_format_benchmark import build_result
+
+QUEUE_NAME = "worker-benchmark"
+STAGES = ["claim", "download", "inference", "upload", "callback"]
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Return a sampler of latencies in seconds from a distribution spec"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        # Median in milliseconds, sigma of the underlying normal
+        return lambda rng: values[0] * rng.lognormvariate(0, values[1]) / 1000
+    raise argparse.ArgumentTypeError(f"Invalid latency distribution: {spec}")
+
+class Recorder:
+    """Stands in for a labelled histogram, keeping every sample while still feeding the real one"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def labels(self, **labels):
+        key = next(iter(labels.values()))
+        child = self.histogram.labels(**labels)
+
+        def observe(value: float):
+            self.samples[key].append(value)
+            child.observe(value)
+        return SimpleNamespace(observe=observe)
+
+class InMemoryS3:
+    """The subset of the boto3 S3 client the worker uses, backed by a dict"""
+
+    def __init__(self, latency: Callable[[random.Random], float]):
+        self.objects: Dict[str, Dict] = {}
+        self.latency = latency
+        self.rng = random.Random(1)
+
+    def _wait(self):
+        # Calls run in the executor like real boto3 calls, so blocking here is faithful
+        time.sleep(self.latency(self.rng))
+
+    def _get(self, key: str, operation: str) -> Dict:
+        self._wait()
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, operation)
+        return self.objects[key]
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, ContentType: Optional[str] = None,
+                   ContentEncoding: Optional[str] = None, **kwargs):
+        self._wait()
+        etag = hashlib.md5(Body).hexdigest()
+        self.objects[Key] = {"Body": Body, "ContentType": ContentType, "ContentEncoding": ContentEncoding, "ETag": etag}
+        return {"ETag": f'"{etag}"'}
+
+    def get_object(self, Bucket: str, Key: str):
+        obj = self._get(Key, "GetObject")
+        return {**obj, "Body": io.BytesIO(obj["Body"]), "ETag": f'"{obj["ETag"]}"'}
+
+    def head_object(self, Bucket: str, Key: str):
+        obj = self._get(Key, "HeadObject")
+        return {"ETag": f'"{obj["ETag"]}"', "ContentLength": len(obj["Body"]), "ContentType": obj["ContentType"]}
+
+    def download_file(self, Bucket: str, Key: str, Filename: str):
+        body = self._get(Key, "GetObject")["Body"]
+        with open(Filename, "wb") as f:
+            f.write(body)
+
+def mock_infer(latency: Callable[[random.Random], float], error_rate: float, predictions: int):
+    """Return a stand-in for landingai inference.infer"""
+    rng = random.Random(2)
+    result = build_result(predictions)
+
+    def infer(model_id: str, image: Image.Image):
+        # Blocks its executor thread for the sampled latency, like the real HTTP call
+        time.sleep(latency(rng))
+        if rng.random() < error_rate:
+            raise Exception("Mock LandingAI error")
+        return result
+    return infer
+
+async def start_callback_server(latency: Callable[[random.Random], float]) -> asyncio.AbstractServer:
+    """Serve 200 OK to every request, standing in for the main application's callback endpoint"""
+    rng = random.Random(3)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+                await asyncio.sleep(latency(rng))
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+def build_document(pages: int) -> bytes:
+    """Render a blank A4 page at 150 dpi, as PNG or a multi-page TIFF"""
+    page = Image.new("RGB", (1240, 1754), "white")
+    buffer = io.BytesIO()
+    if pages == 1:
+        page.save(buffer, format="PNG")
+    else:
+        page.save(buffer, format="TIFF", save_all=True, append_images=[page.copy() for _ in range(pages - 1)])
+    return buffer.getvalue()
+
+def use_fake_redis():
+    """Point the shared Redis pool at an in-process fakeredis server"""
+    import fakeredis
+    from fakeredis.aioredis import FakeConnection
+    redis_pool._pool = redis.ConnectionPool(
+        connection_class=FakeConnection,
+        server=fakeredis.FakeServer(),
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+    )
+
+async def cleanup(redis_client: redis.Redis):
+    """Remove the benchmark queue"""
+    keys = [key async for key in redis_client.scan_iter(f"bull:{QUEUE_NAME}:*")]
+    if keys:
+        await redis_client.delete(*keys)
+    await redis_client.delete(get_dead_letter_key(QUEUE_NAME))
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50, p90, p99 and max of samples, in milliseconds"""
+    if not samples:
+        return {"count": 0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    rank = lambda q: ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+    return {
+        "count": len(ordered),
+        "p50": rank(0.5) * 1000,
+        "p90": rank(0.9) * 1000,
+        "p99": rank(0.99) * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (kilobytes on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+async def run(args) -> Dict:
+    if args.redis == "fake":
+        use_fake_redis()
+    if args.s3 == "memory":
+        store = InMemoryS3(args.s3_latency)
+        s3.get_s3_client = lambda: store
+    if args.inference == "mock":
+        mock = SimpleNamespace(infer=mock_infer(args.inference_latency, args.error_rate, args.predictions))
+        landing_ai.get_inference = lambda: mock
+    else:
+        settings.LANDINGAI_MODE = args.inference
+
+    # Keep every stage, queue wait and job duration sample for percentiles
+    stages = metrics.STAGE_LATENCY = Recorder(metrics.STAGE_LATENCY)
+    jobs = metrics.JOB_DURATION = Recorder(metrics.JOB_DURATION)
+    queue_wait = consumer.QUEUE_WAIT = Recorder(consumer.QUEUE_WAIT)
+
+    server = await start_callback_server(args.callback_latency)
+    settings.API_CALLBACK_URL = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/callback"
+
+    redis_client = await get_redis_connection()
+    await cleanup(redis_client)
+    extension = "png" if args.pages == 1 else "tiff"
+    file_path = f"benchmark/document.{extension}"
+    s3.get_s3_client().put_object(Bucket=settings.S3_BUCKET_NAME, Key=file_path, Body=build_document(args.pages),
+                                  ContentType=f"image/{extension}")
+
+    run_id = f"{int(time.time())}"
+    for index in range(args.jobs):
+        await enqueue_bull_job(redis_client, QUEUE_NAME, {
+            "type": "process",
+            "documentId": f"bench-{run_id}-{index}",
+            "organizationId": "benchmark",
+            "filePath": file_path,
+            "contentType": f"image/{extension}",
+            "processingType": "certificate",
+        })
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    start_listener(listen_to_bull_queue(redis_client, QUEUE_NAME, ConsumerPool(args.concurrency, queue_name=QUEUE_NAME)))
+    try:
+        while True:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.llen(f"bull:{QUEUE_NAME}:completed")
+                pipe.llen(get_dead_letter_key(QUEUE_NAME))
+                completed, failed = await pipe.execute()
+            if completed + failed >= args.jobs:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+    finally:
+        await drain_consumers()
+        await cleanup(redis_client)
+        server.close()
+        await close_redis_pool()
+
+    report = {
+        "config": {
+            "jobs": args.jobs, "concurrency": args.concurrency, "pages": args.pages, "predictions": args.predictions,
+            "errorRate": args.error_rate, "inference": args.inference, "redis": args.redis, "s3": args.s3, "resultFormat": settings.RESULT_FORMAT,
+            "resultCompression": settings.RESULT_COMPRESSION,
+        },
+        "completed": completed,
+        "failed": failed,
+        "seconds": elapsed,
+        "jobsPerSecond": args.jobs / elapsed,
+        "stages": {stage: percentiles(stages.samples.get(stage, [])) for stage in STAGES},
+        "queueWait": percentiles(queue_wait.samples.get(QUEUE_NAME, [])),
+        "job": percentiles(jobs.samples.get("process", [])),
+        "memory": {"peakRssMb": peak_rss_mb(), "rssGrowthMb": peak_rss_mb() - rss_before},
+    }
+    if args.tracemalloc:
+        report["memory"]["tracemallocPeakMb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return report
+
+def print_report(report: Dict):
+    print(f"{report['completed']} completed, {report['failed']} failed in {report['seconds']:.2f}s "
+          f"= {report['jobsPerSecond']:.2f} jobs/s")
+    print(f"{'':<12}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [*report["stages"].items(), ("queue wait", report["queueWait"]), ("job", report["job"])]
+    for name, p in rows:
+        print(f"{name:<12}{p['count']:>8}{p['p50']:>10.1f}{p['p90']:>10.1f}{p['p99']:>10.1f}{p['max']:>10.1f}")
+    print("memory: " + ", ".join(f"{name} {value:.1f}" for name, value in report["memory"].items()))
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return the regressions of report against baseline beyond tolerance"""
+    regressions = []
+    if report["jobsPerSecond"] < baseline["jobsPerSecond"] * (1 - tolerance):
+        regressions.append(f"jobs/s {report['jobsPerSecond']:.2f} < baseline {baseline['jobsPerSecond']:.2f}")
+    for name in ["job", *STAGES]:
+        current = report["job"] if name == "job" else report["stages"][name]
+        previous = baseline["job"] if name == "job" else baseline["stages"].get(name)
+        if previous and previous["count"] and current["p99"] > previous["p99"] * (1 + tolerance):
+            regressions.append(f"{name} p99 {current['p99']:.1f}ms > baseline {previous['p99']:.1f}ms")
+    if report["memory"]["peakRssMb"] > baseline["memory"]["peakRssMb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {report['memory']['peakRssMb']:.1f}MB > baseline {baseline['memory']['peakRssMb']:.1f}MB")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=200, help="Jobs to enqueue")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY, help="Consumer slots")
+    parser.add_argument("--pages", type=int, default=1, help="Pages per document")
+    parser.add_argument("--predictions", type=int, default=200, help="Predictions per mock inference result")
+    parser.add_argument("--inference", choices=["mock", "live", "record", "replay"], default="mock",
+                        help="Mock LandingAI, or run it in this LANDINGAI_MODE")
+    parser.add_argument("--inference-latency", type=parse_latency, default=parse_latency("lognormal:500,0.4"))
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock inference calls that fail")
+    parser.add_argument("--s3-latency", type=parse_latency, default=parse_latency("fixed:5"),
+                        help="Latency of in-memory S3 calls")
+    parser.add_argument("--callback-latency", type=parse_latency, default=parse_latency("fixed:10"))
+    parser.add_argument("--redis", choices=["local", "fake"], default="local",
+                        help="The Redis in .env, or an in-process fakeredis")
+    parser.add_argument("--s3", choices=["memory", "local"], default="memory",
+                        help="In-memory stand-in, or the MinIO/S3 in .env")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the peak traced Python allocation")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Compare against a report written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed regression against the baseline")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        sys.exit(1 if regressions else 0)
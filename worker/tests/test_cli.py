@@ -0,0 +1,18 @@
+from app.cli import build_parser, get_queue_names
+from app.core.config import settings
+
+def test_dlq_reads_the_document_queue_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_SHARDS", {})
+    args = build_parser().parse_args(["dlq", "list"])
+    assert get_queue_names(args) == [settings.DOCUMENT_QUEUE_NAME]
+
+def test_dlq_reads_every_shard_queue_when_sharded(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_SHARDS", {"medical_test": {"concurrency": 2}})
+    args = build_parser().parse_args(["dlq", "stats"])
+    queue = settings.DOCUMENT_QUEUE_NAME
+    assert get_queue_names(args) == [queue, f"{queue}:medical_test", f"{queue}:default"]
+
+def test_dlq_queue_option_selects_one_queue(monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_SHARDS", {"medical_test": {"concurrency": 2}})
+    args = build_parser().parse_args(["dlq", "replay", "--queue", "document-processing:medical_test"])
+    assert get_queue_names(args) == ["document-processing:medical_test"]
@@ -0,0 +1,42 @@
+import gzip
+import zlib
+
+import pytest
+import zstandard
+
+from app.utils.compression import compress, decompress
+
+BODY = b'{"documentId": "d", "extractedData": {"name": "Jane Doe"}}' * 100
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_round_trip(encoding):
+    compressed = compress(BODY, encoding)
+    assert len(compressed) < len(BODY)
+    assert decompress(compressed, encoding) == BODY
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_empty_body_round_trips(encoding):
+    assert decompress(compress(b"", encoding), encoding) == b""
+
+@pytest.mark.parametrize("encoding,level", [("gzip", 1), ("zstd", 19)])
+def test_level_is_passed_to_the_codec(encoding, level):
+    assert decompress(compress(BODY, encoding, level), encoding) == BODY
+
+def test_gzip_is_readable_by_standard_clients():
+    assert gzip.decompress(compress(BODY, "gzip")) == BODY
+
+def test_zstd_frame_without_content_size_decodes():
+    # Frames written by a streaming compressor, e.g. another service, don't record their size
+    stream = zstandard.ZstdCompressor().compressobj()
+    frame = stream.compress(BODY) + stream.flush()
+    assert decompress(frame, "zstd") == BODY
+
+def test_unsupported_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        compress(BODY, "br")
+    with pytest.raises(ValueError):
+        decompress(BODY, "br")
+
+def test_corrupt_body_raises():
+    with pytest.raises((OSError, EOFError, zlib.error)):
+        decompress(b"not gzip", "gzip")
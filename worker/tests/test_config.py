@@ -0,0 +1,11 @@
+import os
+
+from app.core.config import Settings
+
+def test_configured_worker_id_is_suffixed_with_the_process_id(monkeypatch):
+    monkeypatch.setenv("WORKER_ID", "node-a")
+    assert Settings().WORKER_ID == f"node-a-{os.getpid()}"
+
+def test_worker_id_defaults_to_host_and_process_id(monkeypatch):
+    monkeypatch.delenv("WORKER_ID", raising=False)
+    assert Settings().WORKER_ID.endswith(f"-{os.getpid()}")
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from app.core.dead_letter import build_dead_letter_entry, get_dead_letter_key, list_dead_letters
+from app.core.job_context import JobContext, set_job_context
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis to read a dead-letter list"""
+
+    def __init__(self, lists):
+        self.lists = lists
+
+    async def lrange(self, key, start, end):
+        values = self.lists.get(key, [])
+        return values[start:] if end == -1 else values[start:end + 1]
+
+def make_entry(job_id, error_class="ConnectError", stage="inference", organization_id="org-1",
+               processing_type=None, failed_at=1_700_000_000):
+    data = {"documentId": f"doc-{job_id}", "organizationId": organization_id}
+    if processing_type:
+        data["processingType"] = processing_type
+    return {
+        "jobId": job_id,
+        "queue": "document-processing",
+        "data": data,
+        "errorClass": error_class,
+        "stage": stage,
+        "failedAt": failed_at * 1000,
+    }
+
+def list_matching(entries, **filters):
+    raw = [json.dumps(entry) for entry in entries]
+    redis_client = FakeRedis({get_dead_letter_key("document-processing"): raw})
+    matches = asyncio.run(list_dead_letters(redis_client, "document-processing", **filters))
+    return [entry["jobId"] for _, entry in matches]
+
+ENTRIES = [
+    make_entry("1"),
+    make_entry("2", error_class="TimeoutError", stage="download", failed_at=1_700_000_100),
+    make_entry("3", organization_id="org-2", processing_type="medical_test", failed_at=1_700_000_200),
+    make_entry("4", stage="callback", failed_at=1_700_000_300),
+]
+
+def test_no_filters_returns_everything_in_list_order():
+    assert list_matching(ENTRIES) == ["1", "2", "3", "4"]
+
+def test_filters_by_error_class_and_stage():
+    assert list_matching(ENTRIES, error_class="ConnectError") == ["1", "3", "4"]
+    assert list_matching(ENTRIES, error_class="ConnectError", stage="inference") == ["1", "3"]
+
+def test_filters_by_organization():
+    assert list_matching(ENTRIES, organization_id="org-2") == ["3"]
+
+def test_processing_type_defaults_to_certificate():
+    assert list_matching(ENTRIES, processing_type="certificate") == ["1", "2", "4"]
+    assert list_matching(ENTRIES, processing_type="medical_test") == ["3"]
+
+def test_time_window_includes_since_and_excludes_until():
+    assert list_matching(ENTRIES, since=1_700_000_100, until=1_700_000_300) == ["2", "3"]
+
+def test_limit_stops_after_enough_matches():
+    assert list_matching(ENTRIES, stage="inference", limit=1) == ["1"]
+
+def test_raw_value_is_returned_for_removal():
+    raw = json.dumps(ENTRIES[0])
+    redis_client = FakeRedis({get_dead_letter_key("q"): [raw]})
+    assert asyncio.run(list_dead_letters(redis_client, "q")) == [(raw, ENTRIES[0])]
+
+def test_entry_takes_stage_from_job_context_and_splits_checkpoint():
+    set_job_context(JobContext(job_id="7", stage="upload", started_at=1_700_000_000))
+    try:
+        entry = build_dead_letter_entry(
+            "q", "7", {"documentId": "d", "checkpoint": {"stage": "inference"}},
+            ValueError("bad"), attempts=3, enqueued_at=1_699_999_999,
+        )
+    finally:
+        set_job_context(None)
+    assert entry["stage"] == "upload"
+    assert entry["data"] == {"documentId": "d"}
+    assert entry["checkpoint"] == {"stage": "inference"}
+    assert entry["errorClass"] == "ValueError"
+    assert entry["error"] == "bad"
+    assert entry["attempts"] == 3
+    assert entry["enqueuedAt"] == 1_699_999_999_000
+    assert entry["startedAt"] == 1_700_000_000_000
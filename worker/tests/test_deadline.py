@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.deadline import (
+    DeadlineExceededError,
+    StageTimeoutError,
+    compute_deadline,
+    get_stage_budget,
+    stage_budget,
+)
+from app.core.job_context import JobContext, set_job_context
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_TIMEOUT_SECONDS", 300.0)
+    monkeypatch.setattr(settings, "STAGE_BUDGETS", {"download": 0.1, "inference": 0.6})
+    yield
+    set_job_context(None)
+
+def start_job(timeout, remaining=None):
+    """Bind a job given timeout seconds with remaining seconds left (all of them by default)"""
+    context = JobContext(job_id="1", deadline=time.monotonic() + (timeout if remaining is None else remaining),
+                         timeout=timeout)
+    set_job_context(context)
+    return context
+
+def test_no_budget_outside_of_a_job():
+    assert get_stage_budget("inference") is None
+
+def test_budget_is_a_share_of_the_jobs_own_timeout():
+    start_job(timeout=20)
+    assert get_stage_budget("inference") == pytest.approx(12)
+    assert get_stage_budget("download") == pytest.approx(2)
+
+def test_budget_is_capped_by_the_time_left():
+    start_job(timeout=100, remaining=5)
+    assert get_stage_budget("inference") == pytest.approx(5, abs=0.1)
+
+def test_stage_without_a_share_gets_the_time_left():
+    start_job(timeout=100, remaining=40)
+    assert get_stage_budget("callback") == pytest.approx(40, abs=0.1)
+
+def test_timeout_defaults_to_the_deadline_when_the_context_is_built():
+    set_job_context(JobContext(deadline=time.monotonic() + 50))
+    assert get_stage_budget("inference") == pytest.approx(30, abs=0.1)
+
+def test_falls_back_to_job_timeout_seconds_without_a_timeout():
+    context = start_job(timeout=1000)
+    context.timeout = None
+    assert get_stage_budget("inference") == pytest.approx(180)
+
+def test_compute_deadline_uses_the_earlier_of_timeout_and_deadline():
+    now = time.monotonic()
+    assert compute_deadline({}) - now == pytest.approx(300, abs=0.1)
+    assert compute_deadline({"timeoutSeconds": 30}) - now == pytest.approx(30, abs=0.1)
+    deadline = (time.time() + 10) * 1000
+    assert compute_deadline({"timeoutSeconds": 30, "deadline": deadline}) - now == pytest.approx(10, abs=0.1)
+
+def test_stage_budget_rejects_a_stage_after_the_deadline():
+    start_job(timeout=10, remaining=-1)
+
+    async def run():
+        async with stage_budget("inference"):
+            pass
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run())
+
+def test_stage_budget_raises_when_the_stage_overruns():
+    start_job(timeout=0.5)
+
+    async def run():
+        async with stage_budget("download"):
+            await asyncio.sleep(1)
+
+    with pytest.raises(StageTimeoutError) as excinfo:
+        asyncio.run(run())
+    assert excinfo.value.stage == "download"
+    assert excinfo.value.budget == pytest.approx(0.05)
+
+def test_timeouts_raised_by_the_stage_itself_are_not_budget_failures():
+    start_job(timeout=100)
+
+    async def run():
+        async with stage_budget("inference"):
+            raise TimeoutError("upstream")
+
+    with pytest.raises(TimeoutError) as excinfo:
+        asyncio.run(run())
+    assert not isinstance(excinfo.value, StageTimeoutError)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api.api_v1.endpoints import documents
+from app.core.config import settings
+from app.services.progress import get_status_key
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+class FakeSubscriber:
+    """Delivers the given events once subscribed"""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def subscribe(self, document_id):
+        queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(json.dumps(event))
+        return queue
+
+    async def unsubscribe(self, document_id, queue):
+        pass
+
+class FakeRedis:
+    def __init__(self, values):
+        self.values = values
+
+    async def get(self, key):
+        return self.values.get(key)
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(settings, "SSE_KEEPALIVE_INTERVAL", 0.01)
+
+    def run(latest=None, events=(), statuses=None, latest_job_id=None, job_id=None, limit=10):
+        statuses = statuses or {}
+        values = {get_status_key("doc-1"): json.dumps(latest)} if latest else {}
+
+        async def get_redis_connection():
+            return FakeRedis(values)
+
+        async def get_job_status(watched_job_id):
+            status = statuses.get(watched_job_id)
+            return status() if callable(status) else status
+
+        async def get_latest_job_id(document_id):
+            return latest_job_id
+
+        monkeypatch.setattr(documents, "get_redis_connection", get_redis_connection)
+        monkeypatch.setattr(documents, "progress_subscriber", FakeSubscriber(events))
+        monkeypatch.setattr(documents, "get_job_status", get_job_status)
+        monkeypatch.setattr(documents, "get_latest_job_id", get_latest_job_id)
+
+        async def collect():
+            response = await documents.stream_document_status("doc-1", FakeRequest(), job_id)
+            messages = []
+            async for message in response.body_iterator:
+                messages.append(message)
+                if len(messages) >= limit:
+                    break
+            return messages
+
+        return asyncio.run(collect())
+    return run
+
+def event(job_id, status):
+    return {"documentId": "doc-1", "jobId": job_id, "status": status}
+
+def data(messages):
+    return [json.loads(m.split("data: ", 1)[1]) for m in messages if m.startswith("event:")]
+
+def test_terminal_status_of_an_earlier_job_does_not_end_the_stream(stream):
+    messages = stream(
+        events=[event("1", "completed"), event("2", "processing"), event("2", "completed")],
+        statuses={"2": {"jobId": "2", "status": "queued"}},
+        latest_job_id="2",
+    )
+    assert [(e["jobId"], e["status"]) for e in data(messages)] == [
+        ("2", "queued"), ("1", "completed"), ("2", "processing"), ("2", "completed"),
+    ]
+
+def test_stream_ends_at_once_for_a_finished_job(stream):
+    messages = stream(statuses={"2": {"jobId": "2", "status": "failed"}}, job_id="2")
+    assert [e["status"] for e in data(messages)] == ["failed"]
+
+def test_job_that_fails_without_an_event_ends_the_stream(stream):
+    checks = iter([{"jobId": "2", "status": "queued"}] * 3 + [{"jobId": "2", "status": "failed"}])
+    messages = stream(statuses={"2": lambda: next(checks)}, latest_job_id="2")
+    assert data(messages)[-1]["status"] == "failed"
+    assert ": keep-alive\n\n" in messages
+
+def test_without_a_known_job_any_terminal_event_ends_the_stream(stream):
+    messages = stream(latest=event("7", "completed"))
+    assert [e["jobId"] for e in data(messages)] == ["7"]
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.api.api_v1.endpoints.documents import build_upload_path
+from app.utils import form_stream
+from app.utils.form_stream import MAX_FIELD_SIZE, FormStreamError, stream_form_file_to_s3
+
+BOUNDARY = "test-boundary"
+
+class FakeUpload:
+    """Stands in for S3StreamingUpload, keeping the uploaded content in memory"""
+    uploads = []
+
+    def __init__(self, s3_path, content_type=None):
+        self.s3_path = s3_path
+        self.content_type = content_type
+        self.content = bytearray()
+        self.completed = False
+        self.aborted = False
+        FakeUpload.uploads.append(self)
+
+    async def write(self, data):
+        self.content.extend(data)
+
+    async def complete(self):
+        self.completed = True
+        return len(self.content), hashlib.sha256(self.content).hexdigest()
+
+    async def abort(self):
+        self.aborted = True
+
+class FakeRequest:
+    """Request whose body arrives in small chunks, as it would off the network"""
+
+    def __init__(self, body, content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                 chunk_size=7, error=None):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+        self.error = error
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            if self.error and start >= len(self.body) // 2:
+                raise self.error
+            yield self.body[start:start + self.chunk_size]
+
+def field(name, value):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n').encode()
+
+def file_part(name, filename, content, content_type="application/pdf"):
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode() + content + b"\r\n"
+
+def form(*parts):
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 4
+
+@pytest.fixture(autouse=True)
+def fake_upload(monkeypatch):
+    FakeUpload.uploads = []
+    monkeypatch.setattr(form_stream, "S3StreamingUpload", FakeUpload)
+
+def stream(request):
+    return asyncio.run(stream_form_file_to_s3(request, "document", build_upload_path))
+
+def test_file_is_streamed_to_the_path_built_from_preceding_fields():
+    fields, info = stream(FakeRequest(form(
+        field("document_id", "doc-1"),
+        field("organization_id", "org-1"),
+        file_part("document", "scan.pdf", CONTENT),
+        field("processing_type", "medical_test"),
+    )))
+    assert fields == {"document_id": "doc-1", "organization_id": "org-1", "processing_type": "medical_test"}
+    assert info == {
+        "s3Path": "documents/org-1/doc-1/scan.pdf",
+        "filename": "scan.pdf",
+        "contentType": "application/pdf",
+        "size": len(CONTENT),
+        "sha256": hashlib.sha256(CONTENT).hexdigest(),
+    }
+    [upload] = FakeUpload.uploads
+    assert bytes(upload.content) == CONTENT
+    assert upload.completed
+
+def test_path_only_keeps_the_file_name():
+    _, info = stream(FakeRequest(form(
+        field("document_id", "doc-1"),
+        field("organization_id", "org-1"),
+        file_part("document", "../../etc/scan.pdf", CONTENT),
+    )))
+    assert info["s3Path"] == "documents/org-1/doc-1/scan.pdf"
+
+def test_fields_sent_after_the_file_are_too_late_for_the_path():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(form(
+            field("document_id", "doc-1"),
+            file_part("document", "scan.pdf", CONTENT),
+            field("organization_id", "org-1"),
+        )))
+    assert FakeUpload.uploads == []
+
+def test_non_multipart_body_is_rejected():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(b'{"document_id": "doc-1"}', content_type="application/json"))
+
+def test_missing_file_is_rejected():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(form(field("document_id", "doc-1"), field("organization_id", "org-1"))))
+
+def test_file_in_another_field_is_not_taken_for_the_document():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(form(
+            field("document_id", "doc-1"),
+            field("organization_id", "org-1"),
+            file_part("attachment", "scan.pdf", CONTENT),
+        )))
+
+def test_oversized_field_is_rejected():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(form(field("document_id", "x" * (MAX_FIELD_SIZE + 1))), chunk_size=4096))
+
+def test_second_file_is_rejected():
+    with pytest.raises(FormStreamError):
+        stream(FakeRequest(form(
+            field("document_id", "doc-1"),
+            field("organization_id", "org-1"),
+            file_part("document", "a.pdf", CONTENT),
+            file_part("document", "b.pdf", CONTENT),
+        )))
+
+def test_upload_is_aborted_when_the_body_breaks_off():
+    body = form(
+        field("document_id", "doc-1"),
+        field("organization_id", "org-1"),
+        file_part("document", "scan.pdf", CONTENT * 4),
+    )
+    with pytest.raises(ConnectionResetError):
+        stream(FakeRequest(body, error=ConnectionResetError("client went away")))
+    [upload] = FakeUpload.uploads
+    assert upload.aborted
+    assert not upload.completed
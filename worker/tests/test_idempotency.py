@@ -0,0 +1,25 @@
+import asyncio
+
+from app.services import idempotency
+from app.services.idempotency import complete_claim
+
+class BrokenRedis:
+    async def set(self, *args, **kwargs):
+        raise ConnectionError("Redis went away")
+
+def test_completing_a_claim_never_fails_the_job(monkeypatch):
+    async def get_redis_connection():
+        return BrokenRedis()
+
+    monkeypatch.setattr(idempotency, "get_redis_connection", get_redis_connection)
+
+    async def complete():
+        flight = asyncio.get_running_loop().create_future()
+        idempotency._local_flights["key"] = flight
+        await complete_claim("key", {"jobId": "1", "resultPath": "results/r.json"})
+        return flight
+
+    flight = asyncio.run(complete())
+    # Local duplicates still get the result
+    assert flight.result() == {"jobId": "1", "resultPath": "results/r.json"}
+    assert "key" not in idempotency._local_flights
@@ -0,0 +1,60 @@
+from collections import Counter
+
+import pytest
+
+from app.services import model_routing
+from app.services.model_routing import parse_routing_table, select_model
+
+TABLE = {
+    "certificate": "cert-v1",
+    "medical_test": [
+        {"modelId": "test-v1", "weight": 3},
+        {"modelId": "test-v2", "weight": 1},
+    ],
+}
+
+@pytest.fixture
+def routing_table(monkeypatch):
+    monkeypatch.setattr(model_routing, "_routing_table", parse_routing_table(TABLE))
+
+def test_model_id_shorthand_becomes_a_single_route():
+    table = parse_routing_table(TABLE)
+    assert table["certificate"] == [("cert-v1", 1.0)]
+    assert table["medical_test"] == [("test-v1", 3.0), ("test-v2", 1.0)]
+
+def test_weight_defaults_to_one():
+    table = parse_routing_table({"certificate": [{"modelId": "a"}, {"modelId": "b", "weight": 0}]})
+    assert table["certificate"] == [("a", 1.0), ("b", 0.0)]
+
+@pytest.mark.parametrize("raw", [
+    {},
+    [],
+    {"medical_test": "test-v1"},  # No default processing type
+    {"certificate": []},
+    {"certificate": ["cert-v1"]},
+    {"certificate": [{"weight": 1}]},
+    {"certificate": [{"modelId": "a", "weight": -1}]},
+    {"certificate": [{"modelId": "a", "weight": 0}]},
+])
+def test_malformed_tables_are_rejected(raw):
+    with pytest.raises(ValueError):
+        parse_routing_table(raw)
+
+def test_unknown_processing_type_uses_the_default_routes(routing_table):
+    assert select_model("fitness_declaration") == "cert-v1"
+
+def test_routing_key_pins_a_document_to_one_model(routing_table):
+    picks = {select_model("medical_test", "document-42") for _ in range(20)}
+    assert len(picks) == 1
+
+def test_routing_keys_split_traffic_by_weight(routing_table):
+    picks = Counter(select_model("medical_test", f"document-{i}") for i in range(4000))
+    assert set(picks) == {"test-v1", "test-v2"}
+    assert picks["test-v1"] / 4000 == pytest.approx(0.75, abs=0.04)
+
+def test_zero_weight_routes_get_no_traffic(monkeypatch):
+    monkeypatch.setattr(model_routing, "_routing_table", parse_routing_table({
+        "certificate": [{"modelId": "live", "weight": 1}, {"modelId": "off", "weight": 0}],
+    }))
+    assert {select_model("certificate", f"document-{i}") for i in range(200)} == {"live"}
+    assert model_routing.get_routed_model_ids() == ["live"]
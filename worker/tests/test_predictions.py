@@ -0,0 +1,103 @@
+from array import array
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.predictions import (
+    CompactPredictions,
+    PredictionsView,
+    decode_result,
+    encode_result,
+)
+
+def make_prediction(label, score=None, text=None, box=None):
+    return SimpleNamespace(
+        label=label,
+        score=SimpleNamespace(value=score) if score is not None else None,
+        text=text,
+        bounding_box=SimpleNamespace(xmin=box[0], ymin=box[1], xmax=box[2], ymax=box[3]) if box else None,
+    )
+
+def make_result(*predictions):
+    return SimpleNamespace(
+        predictions=list(predictions),
+        model_id="model-1",
+        image_size=SimpleNamespace(width=800, height=600),
+    )
+
+RESULT = make_result(
+    make_prediction("patient_name", 0.5, "Jane Doe", (1, 2, 3, 4)),
+    make_prediction("signature", 0.25),
+)
+
+def test_from_result_matches_the_dict_layout():
+    compact = CompactPredictions.from_result(RESULT)
+    assert compact.to_dict() == {
+        "predictions": [
+            {
+                "label": "patient_name",
+                "score": 0.5,
+                "boundingBox": {"xmin": 1.0, "ymin": 2.0, "xmax": 3.0, "ymax": 4.0},
+                "text": "Jane Doe",
+            },
+            {"label": "signature", "score": 0.25, "boundingBox": None, "text": None},
+        ],
+        "ocrText": "patient_name: Jane Doe",
+        "modelId": "model-1",
+        "imageSize": {"width": 800, "height": 600},
+    }
+
+def test_empty_result_only_has_predictions():
+    assert CompactPredictions.from_result(make_result()).to_dict() == {"predictions": []}
+    assert CompactPredictions.from_result(None).to_dict() == {"predictions": []}
+
+def test_missing_score_round_trips_as_none():
+    compact = CompactPredictions.from_result(make_result(make_prediction("stamp")))
+    restored = CompactPredictions.from_columns(compact.to_columns())
+    assert restored.prediction(0)["score"] is None
+
+def test_columns_round_trip():
+    compact = CompactPredictions.from_result(RESULT)
+    assert CompactPredictions.from_columns(compact.to_columns()).to_dict() == compact.to_dict()
+
+def test_merge_records_the_page_of_each_prediction():
+    pages = [
+        CompactPredictions.from_result(RESULT),
+        CompactPredictions.from_result(make_result(make_prediction("date", 0.75, "2024-05-01"))),
+    ]
+    merged = CompactPredictions.merge(pages)
+    restored = CompactPredictions.from_columns(merged.to_columns())
+    assert [p["page"] for p in restored.to_dict()["predictions"]] == [1, 1, 2]
+    assert restored.to_dict()["pages"] == 2
+    assert restored.ocr_text == "patient_name: Jane Doe\ndate: 2024-05-01"
+    assert restored.to_dict() == merged.to_dict()
+
+def test_unknown_version_is_rejected():
+    columns = CompactPredictions.from_result(RESULT).to_columns()
+    columns["version"] = 99
+    with pytest.raises(ValueError):
+        CompactPredictions.from_columns(columns)
+
+def test_view_reads_like_the_dict_layout():
+    compact = CompactPredictions.from_result(RESULT)
+    view = compact.view()
+    assert list(view) == list(compact.to_dict())
+    assert list(view["predictions"]) == compact.to_dict()["predictions"]
+    assert view["predictions"][-1]["label"] == "signature"
+    assert view["predictions"][0:1] == compact.to_dict()["predictions"][0:1]
+    with pytest.raises(IndexError):
+        view["predictions"][2]
+    with pytest.raises(KeyError):
+        view["pages"]
+
+def test_encoded_result_decodes_to_a_lazy_view():
+    compact = CompactPredictions.from_result(RESULT)
+    result = {"documentId": "d", "extractedData": {"name": "Jane Doe"}, "rawPrediction": compact.view()}
+    decoded = decode_result(encode_result(result))
+    assert isinstance(decoded["rawPrediction"], PredictionsView)
+    assert decoded["rawPrediction"].compact.to_dict() == compact.to_dict()
+    assert decoded["extractedData"] == {"name": "Jane Doe"}
+
+def test_plain_dict_prediction_is_left_alone():
+    result = {"rawPrediction": {"predictions": []}, "scores": array("f", [1.0]).tobytes()}
+    assert decode_result(encode_result(result)) == result
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.core.job_context import JobContext, set_job_context
+from app.services import progress
+from app.services.progress import get_status_key, report_progress
+
+class FakePipeline:
+    """Records the keys a pipeline writes"""
+
+    def __init__(self, writes):
+        self.writes = writes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def hset(self, key, field, value):
+        self.writes[key] = {field: value}
+
+    def set(self, key, value, ex=None):
+        self.writes[key] = value
+
+    def publish(self, channel, message):
+        pass
+
+    async def execute(self):
+        return []
+
+class FakeRedis:
+    def __init__(self):
+        self.writes = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.writes)
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = FakeRedis()
+
+    async def get_redis_connection():
+        return client
+
+    monkeypatch.setattr(progress, "get_redis_connection", get_redis_connection)
+    yield client
+    set_job_context(None)
+
+def report(job_id):
+    set_job_context(JobContext(document_id="doc-1", job_id=job_id, queue_name="document-processing"))
+    asyncio.run(report_progress("inference", 40))
+
+def test_bull_job_progress_is_written_to_its_job_hash(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_BACKEND", "bull")
+    report("42")
+    assert redis_client.writes["bull:document-processing:42"] == {"progress": 40}
+    assert json.loads(redis_client.writes[get_status_key("doc-1")])["jobId"] == "42"
+
+def test_stream_job_creates_no_bull_key(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "QUEUE_BACKEND", "streams")
+    report("1700000000000-0")
+    assert not [key for key in redis_client.writes if key.startswith("bull:")]
+    assert json.loads(redis_client.writes[get_status_key("doc-1")])["progress"] == 40
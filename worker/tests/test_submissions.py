@@ -0,0 +1,183 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.streams import get_stream_job_key
+from app.services import submissions
+from app.services.progress import get_status_key
+
+class FakePipeline:
+    """Queues calls and runs them against the FakeRedis on execute"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for submissions"""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value)
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def hmget(self, key, *fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def eval(self, script, numkeys, key, value):
+        # Only the compare-and-delete script is used
+        if self.values.get(key) == value:
+            del self.values[key]
+            return 1
+        return 0
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = FakeRedis()
+    enqueued = []
+
+    async def get_redis_connection():
+        return client
+
+    async def enqueue_job(redis_client, queue_name, job_data):
+        enqueued.append(job_data)
+        return str(len(enqueued))
+
+    monkeypatch.setattr(submissions, "get_redis_connection", get_redis_connection)
+    monkeypatch.setattr(submissions, "enqueue_job", enqueue_job)
+    monkeypatch.setattr(submissions.settings, "DISPATCH_REQUIRE_CONSUMERS", False)
+    monkeypatch.setattr(submissions.settings, "IDEMPOTENCY_ENABLED", True)
+    monkeypatch.setattr(submissions.settings, "QUEUE_BACKEND", "bull")
+    monkeypatch.setattr(submissions.settings, "QUEUE_SHARDS", {})
+    client.enqueued = enqueued
+    return client
+
+def job(**overrides):
+    return {"documentId": "doc-1", "organizationId": "org-1", "filePath": "documents/org-1/doc-1/scan.pdf",
+            "contentHash": "abc", "processingType": "certificate", **overrides}
+
+def test_duplicate_submission_returns_the_queued_job(redis_client):
+    first = asyncio.run(submissions.submit_job(job()))
+    second = asyncio.run(submissions.submit_job(job()))
+    assert len(redis_client.enqueued) == 1
+    assert second["jobId"] == first["jobId"]
+    assert second["duplicate"] is True
+    assert second["status"] == "queued"
+
+def test_other_versions_and_forced_jobs_are_enqueued(redis_client):
+    asyncio.run(submissions.submit_job(job()))
+    asyncio.run(submissions.submit_job(job(contentHash="def")))
+    asyncio.run(submissions.submit_job(job(processingType="medical_test")))
+    asyncio.run(submissions.submit_job(job(force=True)))
+    assert len(redis_client.enqueued) == 4
+
+def test_concurrent_duplicates_enqueue_once(redis_client):
+    async def submit_twice():
+        return await asyncio.gather(submissions.submit_job(job()), submissions.submit_job(job()))
+
+    first, second = asyncio.run(submit_twice())
+    assert len(redis_client.enqueued) == 1
+    assert first["jobId"] == second["jobId"]
+
+def test_finished_job_no_longer_suppresses_submissions(redis_client, monkeypatch):
+    first = asyncio.run(submissions.submit_job(job()))
+    real_get_job_status = submissions.get_job_status
+
+    async def get_job_status(job_id):
+        status = await real_get_job_status(job_id)
+        return {**status, "status": "failed"} if job_id == first["jobId"] else status
+
+    monkeypatch.setattr(submissions, "get_job_status", get_job_status)
+    second = asyncio.run(submissions.submit_job(job()))
+    assert len(redis_client.enqueued) == 2
+    assert second["jobId"] != first["jobId"]
+    assert "duplicate" not in second
+
+def test_failed_enqueue_releases_the_reservation(redis_client, monkeypatch):
+    async def enqueue_job(redis_client, queue_name, job_data):
+        raise ConnectionError("Redis went away")
+
+    monkeypatch.setattr(submissions, "enqueue_job", enqueue_job)
+    with pytest.raises(ConnectionError):
+        asyncio.run(submissions.submit_job(job()))
+    assert not [key for key in redis_client.values if key.endswith(":pending")]
+
+def publish(redis_client, job_id, status, stage="callback"):
+    redis_client.values[get_status_key("doc-1")] = json.dumps(
+        {"documentId": "doc-1", "jobId": job_id, "status": status, "stage": stage, "progress": 90}
+    )
+
+def status_of(job_id):
+    return asyncio.run(submissions.get_job_status(job_id))
+
+def test_job_without_progress_is_queued(redis_client):
+    job_id = asyncio.run(submissions.submit_job(job()))["jobId"]
+    assert status_of(job_id)["status"] == "queued"
+
+def test_latest_event_of_the_job_is_used(redis_client):
+    job_id = asyncio.run(submissions.submit_job(job()))["jobId"]
+    publish(redis_client, job_id, "processing")
+    assert status_of(job_id)["stage"] == "callback"
+    assert status_of(job_id)["progress"] == 90
+
+def test_superseded_job_reports_its_queue_state(redis_client):
+    first = asyncio.run(submissions.submit_job(job(contentHash="v1")))["jobId"]
+    second = asyncio.run(submissions.submit_job(job(contentHash="v2")))["jobId"]
+    redis_client.hashes[f"bull:document-processing:{first}"] = {"status": "completed"}
+    publish(redis_client, second, "processing")
+    assert status_of(first)["status"] == "completed"
+    assert status_of(first)["progress"] == 100
+    assert status_of(second)["status"] == "processing"
+
+def test_job_that_failed_before_reporting_progress_is_failed(redis_client):
+    job_id = asyncio.run(submissions.submit_job(job()))["jobId"]
+    redis_client.hashes[f"bull:document-processing:{job_id}"] = {"status": "failed", "failedReason": "bad data"}
+    status = status_of(job_id)
+    assert status["status"] == "failed"
+    assert status["error"] == "bad data"
+
+def test_running_job_is_processing(redis_client):
+    job_id = asyncio.run(submissions.submit_job(job()))["jobId"]
+    redis_client.hashes[f"bull:document-processing:{job_id}"] = {"processedBy": "worker-1"}
+    assert status_of(job_id)["status"] == "processing"
+
+def test_routed_bull_job_is_found_in_its_shard_queue(redis_client, monkeypatch):
+    monkeypatch.setattr(submissions.settings, "QUEUE_SHARDS", {"medical_test": {"concurrency": 1}})
+    job_id = asyncio.run(submissions.submit_job(job(processingType="medical_test")))["jobId"]
+    redis_client.hashes[f"bull:document-processing:medical_test:{job_id}"] = {"status": "failed"}
+    assert status_of(job_id)["status"] == "failed"
+
+def test_stream_job_state_is_read_from_its_status_hash(redis_client, monkeypatch):
+    monkeypatch.setattr(submissions.settings, "QUEUE_BACKEND", "streams")
+    job_id = asyncio.run(submissions.submit_job(job()))["jobId"]
+    redis_client.hashes[get_stream_job_key("document-processing", job_id)] = {"status": "completed"}
+    assert status_of(job_id)["status"] == "completed"
+
+def test_latest_job_of_a_document_is_remembered(redis_client):
+    asyncio.run(submissions.submit_job(job(contentHash="v1")))
+    second = asyncio.run(submissions.submit_job(job(contentHash="v2")))["jobId"]
+    assert asyncio.run(submissions.get_latest_job_id("doc-1")) == second